@@ -0,0 +1,279 @@
+import asyncio
+import json
+import os
+import time
+
+from tqdm.asyncio import tqdm_asyncio
+
+from collection_io import save_collection
+from http_clients import create_async_openai_client
+from llm_cache import cached_chat_completion_async
+from quiz_prompts import (
+    QUIZ_MODEL, QUIZ_TEMPERATURE, QUIZ_RESPONSE_FORMAT, QUIZ_BATCH_RESPONSE_FORMAT,
+    build_quiz_prompt, parse_quiz_response, build_batch_quiz_prompt, parse_batch_quiz_response,
+    quiz_problems, repair_fields, build_quiz_repair_prompt, quiz_repair_response_format, apply_quiz_repair
+)
+
+class TokenBucket:
+    """
+    令牌桶限流器
+    
+    平均每秒最多发出rate个请求，允许最多capacity个请求的突发。
+    """
+    
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+    
+    async def acquire(self):
+        """获取一个令牌，令牌不足时等待"""
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+async def repair_quiz_async(client, artifact, quiz, semaphore, limiter=None, cache=None):
+    """
+    异步检查问答题，不合格时请模型只重新生成有问题的字段
+    
+    Returns:
+        合格或修复成功的问答题，修复失败时返回None
+    """
+    problems = quiz_problems(quiz)
+    if not problems:
+        return quiz
+    
+    fields = repair_fields(problems)
+    async with semaphore:
+        if limiter:
+            await limiter.acquire()
+        
+        try:
+            result_text = await cached_chat_completion_async(
+                client,
+                cache,
+                QUIZ_MODEL,
+                build_quiz_repair_prompt(artifact, quiz, fields),
+                QUIZ_TEMPERATURE,
+                validate=lambda text: apply_quiz_repair(quiz, text, fields),
+                pipeline="quiz-repair",
+                response_format=quiz_repair_response_format(fields)
+            )
+            return apply_quiz_repair(quiz, result_text, fields)
+        except Exception as e:
+            print(f"修复藏品 '{artifact['name']}' 的问答题（{', '.join(problems)}）失败: {e}")
+            return None
+
+async def repair_quizzes_async(client, artifact, quizzes, semaphore, limiter=None, cache=None):
+    """修复一件藏品的问答题，返回修复成功和原本合格的问答题"""
+    repaired = [await repair_quiz_async(client, artifact, quiz, semaphore, limiter, cache) for quiz in quizzes]
+    return [quiz for quiz in repaired if quiz is not None]
+
+async def generate_quiz_async(client, artifact, semaphore, limiter=None, cache=None, journal=None):
+    """异步为单个藏品生成问答题，失败时返回空列表；提供journal时成功的结果立即写入日志"""
+    if journal is not None and artifact in journal:
+        return journal.get(artifact)
+    
+    prompt = build_quiz_prompt(artifact)
+    
+    # 缓存命中时不占用并发和限速配额
+    if cache is not None:
+        cached = cache.get(QUIZ_MODEL, QUIZ_TEMPERATURE, prompt, {"response_format": QUIZ_RESPONSE_FORMAT})
+        if cached is not None:
+            quizzes = await repair_quizzes_async(
+                client, artifact, parse_quiz_response(cached, artifact), semaphore, limiter, cache
+            )
+            if journal is not None and quizzes:
+                journal.record(artifact, quizzes)
+            return quizzes
+    
+    async with semaphore:
+        if limiter:
+            await limiter.acquire()
+        
+        try:
+            result_text = await cached_chat_completion_async(
+                client,
+                cache,
+                QUIZ_MODEL,
+                prompt,
+                QUIZ_TEMPERATURE,
+                validate=lambda text: parse_quiz_response(text, artifact),
+                pipeline="quiz",
+                response_format=QUIZ_RESPONSE_FORMAT
+            )
+            quizzes = parse_quiz_response(result_text, artifact)
+        except json.JSONDecodeError as e:
+            print(f"藏品 '{artifact['name']}' 的响应JSON解析错误: {e}")
+            return []
+        except Exception as e:
+            print(f"生成藏品 '{artifact['name']}' 的问答题时出错: {e}")
+            return []
+    
+    # 修复请求自行占用并发配额，在释放本次配额后进行
+    quizzes = await repair_quizzes_async(client, artifact, quizzes, semaphore, limiter, cache)
+    if journal is not None and quizzes:
+        journal.record(artifact, quizzes)
+    return quizzes
+
+async def generate_quiz_batch_async(client, artifacts, semaphore, limiter=None, cache=None, journal=None):
+    """
+    异步用一次请求为一批藏品生成问答题，返回按藏品顺序排列的问答题列表的列表
+    
+    批量结果中缺失或不合格的藏品改为单独请求。
+    """
+    pending = [artifact for artifact in artifacts if not (journal is not None and artifact in journal)]
+    quizzes_by_id = {}
+    partial = {}
+    if len(pending) > 1:
+        async with semaphore:
+            if limiter:
+                await limiter.acquire()
+            
+            try:
+                result_text = await cached_chat_completion_async(
+                    client,
+                    cache,
+                    QUIZ_MODEL,
+                    build_batch_quiz_prompt(pending),
+                    QUIZ_TEMPERATURE,
+                    validate=lambda text: parse_batch_quiz_response(text, pending),
+                    pipeline="quiz-batch",
+                    response_format=QUIZ_BATCH_RESPONSE_FORMAT
+                )
+                quizzes_by_id = parse_batch_quiz_response(result_text, pending, partial)
+            except Exception as e:
+                print(f"批量生成 {len(pending)} 件藏品的问答题时出错: {e}")
+    
+    # 部分字段不合格的藏品先尝试修复，修复失败的再单独请求
+    artifacts_by_id = {artifact["id"]: artifact for artifact in pending}
+    for artifact_id, quizzes in partial.items():
+        repaired = [
+            await repair_quiz_async(client, artifacts_by_id[artifact_id], quiz, semaphore, limiter, cache)
+            for quiz in quizzes
+        ]
+        if all(quiz is not None for quiz in repaired):
+            quizzes_by_id[artifact_id] = repaired
+    
+    for artifact in pending:
+        quizzes = quizzes_by_id.get(artifact["id"])
+        if quizzes and journal is not None:
+            journal.record(artifact, quizzes)
+    
+    # 日志中已有的藏品和单独请求的藏品都由generate_quiz_async处理
+    return [
+        quizzes_by_id[artifact["id"]] if artifact["id"] in quizzes_by_id
+        else await generate_quiz_async(client, artifact, semaphore, limiter, cache, journal)
+        for artifact in artifacts
+    ]
+
+async def generate_quizzes_async(artifacts, client, concurrency=8, rate_limit=None, cache=None, journal=None,
+                                 batch_size=1):
+    """
+    并发为多个藏品生成问答题
+    
+    Args:
+        artifacts: 藏品数据列表
+        client: openai.AsyncOpenAI客户端
+        concurrency: 同时进行的最大请求数
+        rate_limit: 每秒最多发出的请求数，为None时不限速
+        cache: LLMResponseCache，为None时不使用缓存
+        journal: QuizJournal，日志中已有的藏品直接使用记录的结果
+        batch_size: 每次请求包含的藏品数，大于1时使用批量提示词
+    
+    Returns:
+        问答题列表，按藏品顺序排列
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = TokenBucket(rate_limit) if rate_limit else None
+    
+    artifacts = [artifact for artifact in artifacts if artifact["description"]]
+    if batch_size > 1:
+        tasks = [
+            generate_quiz_batch_async(client, artifacts[i:i + batch_size], semaphore, limiter, cache, journal)
+            for i in range(0, len(artifacts), batch_size)
+        ]
+    else:
+        tasks = [
+            generate_quiz_async(client, artifact, semaphore, limiter, cache, journal)
+            for artifact in artifacts
+        ]
+    # gather按提交顺序返回结果，因此输出顺序与藏品顺序一致
+    results = await tqdm_asyncio.gather(*tasks, desc="生成问答题")
+    if batch_size > 1:
+        results = [quizzes for batch_results in results for quizzes in batch_results]
+    return [quiz for quizzes in results for quiz in quizzes]
+
+def generate_quiz_data_async(collection_data, output_file, api_key=None, base_url=None,
+                             concurrency=8, rate_limit=None, limit=None, cache=None, journal=None,
+                             batch_size=1, rules=None):
+    """
+    使用异步OpenAI客户端并发生成问答题数据
+    
+    输出与 generate_quiz_data(use_ai=True) 相同结构的问答题文件。
+    base_url可以指向本地的OpenAI兼容服务，用于测试。
+    提供rules（QuizRuleEngine）时分层生成：规则题通过质量检查的藏品不调用大模型。
+    """
+    print(f"正在并发生成问答题数据（并发数: {concurrency}，限速: {rate_limit or '不限'} 次/秒）...")
+    
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        print("未提供OpenAI API密钥，无法生成AI问答题")
+        return {"quizzes": []}
+    
+    artifacts_to_process = collection_data["artifacts"]
+    if limit and limit > 0 and limit < len(artifacts_to_process):
+        artifacts_to_process = artifacts_to_process[:limit]
+        print(f"限制处理前 {limit} 件藏品")
+    
+    resumed = journal.count(artifacts_to_process) if journal is not None else 0
+    if resumed:
+        print(f"从日志恢复了 {resumed} 件藏品的问答题，跳过这些藏品")
+    
+    # 规则题覆盖所有不在日志中的藏品，只有交给大模型的藏品需要介绍
+    rule_results = {}
+    if rules is not None:
+        for artifact in artifacts_to_process:
+            if not (journal is not None and artifact in journal):
+                quizzes, passed = rules.generate(artifact)
+                if passed:
+                    rule_results[artifact["id"]] = quizzes
+    ai_artifacts = [artifact for artifact in artifacts_to_process if artifact["id"] not in rule_results]
+    
+    async def run():
+        client = create_async_openai_client(api_key, base_url)
+        try:
+            return await generate_quizzes_async(ai_artifacts, client, concurrency, rate_limit, cache, journal, batch_size)
+        finally:
+            await client.close()
+    
+    quizzes = asyncio.run(run())
+    if rule_results:
+        # 按藏品顺序合并规则题和大模型生成的题目
+        ai_quizzes = {}
+        for quiz in quizzes:
+            ai_quizzes.setdefault(quiz["artifactId"], []).append(quiz)
+        quizzes = [
+            quiz for artifact in artifacts_to_process
+            for quiz in rule_results.get(artifact["id"]) or ai_quizzes.get(artifact["id"], [])
+        ]
+    
+    quiz_data = {
+        "quizzes": quizzes
+    }
+    save_collection(quiz_data, output_file, "quizzes")
+    
+    print(f"问答题生成完成，已保存到: {output_file}")
+    print(f"总共生成了 {len(quizzes)} 道题目")
+    
+    return quiz_data
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "zodiac"))
+from collection_io import load_collection
+from http_clients import configure_http_pool, create_async_openai_client, get_openai_client
+from mock_openai_server import MockOptions, start_mock_server
+
+PIPELINES = ["quiz", "quiz-async", "zodiac"]
+
+def synthetic_artifacts(count):
+    """生成用于压测的模拟藏品数据，部分藏品描述中包含生肖动物"""
+    animals = ["龙", "虎", "马", "鹤", "莲", "云"]
+    return [
+        {
+            "id": str(i + 1),
+            "name": f"模拟藏品{i + 1}",
+            "fullName": f"清 模拟藏品{i + 1}",
+            "period": "清",
+            "description": f"此器为{animals[i % len(animals)]}纹装饰的模拟藏品，用于压测问答题和生肖分析流程。" * 3,
+            "dimensions": "高12.5厘米 口径8厘米",
+        }
+        for i in range(count)
+    ]
+
+def percentile(values, pct):
+    """最近秩法计算百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+def fetch_server_stats(base_url):
+    """读取模拟服务的统计信息，非模拟服务时返回None"""
+    stats_url = base_url.rstrip("/").rsplit("/v1", 1)[0] + "/stats"
+    try:
+        with urllib.request.urlopen(stats_url, timeout=5) as response:
+            return json.loads(response.read())
+    except Exception:
+        return None
+
+def _run_threaded(func, artifacts, concurrency):
+    """用线程池并发执行同步的单藏品函数，返回 [(耗时, 是否成功)]"""
+    def timed(artifact):
+        start = time.perf_counter()
+        ok = func(artifact)
+        return time.perf_counter() - start, ok
+    
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(timed, artifacts))
+
+def run_quiz(artifacts, concurrency, base_url, api_key):
+    from process_collection_data import generate_quiz_with_ai
+    return _run_threaded(
+        lambda artifact: bool(generate_quiz_with_ai(artifact, api_key, base_url=base_url)), artifacts, concurrency
+    )
+
+def run_quiz_async(artifacts, concurrency, base_url, api_key):
+    from async_quiz_generator import generate_quiz_async
+    
+    async def run():
+        client = create_async_openai_client(api_key, base_url)
+        semaphore = asyncio.Semaphore(concurrency)
+        # 在外层限制并发并开始计时，与线程池流程一样不把排队时间计入延迟
+        slots = asyncio.Semaphore(concurrency)
+        
+        async def timed(artifact):
+            async with slots:
+                start = time.perf_counter()
+                quizzes = await generate_quiz_async(client, artifact, semaphore)
+                return time.perf_counter() - start, bool(quizzes)
+        
+        try:
+            return await asyncio.gather(*(timed(artifact) for artifact in artifacts))
+        finally:
+            await client.close()
+    
+    return asyncio.run(run())
+
+def run_zodiac(artifacts, concurrency, base_url, api_key):
+    from analyze_zodiac_artifacts import analyze_artifact_with_gpt
+    client = get_openai_client(api_key, base_url)
+    
+    def analyze(artifact):
+        result = analyze_artifact_with_gpt(artifact, client)
+        return not str(result.get("reasoning", "")).startswith("分析失败")
+    
+    return _run_threaded(analyze, artifacts, concurrency)
+
+RUNNERS = {
+    "quiz": run_quiz,
+    "quiz-async": run_quiz_async,
+    "zodiac": run_zodiac,
+}
+
+def benchmark_pipeline(name, artifacts, concurrency, base_url, api_key, verbose=False):
+    """
+    压测一个处理流程
+    
+    Returns:
+        包含吞吐量、延迟百分位数、重试次数和失败数的字典
+    """
+    before = fetch_server_stats(base_url)
+    start = time.perf_counter()
+    if verbose:
+        results = RUNNERS[name](artifacts, concurrency, base_url, api_key)
+    else:
+        # 各流程会逐条打印进度，压测时屏蔽这些输出
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = RUNNERS[name](artifacts, concurrency, base_url, api_key)
+    elapsed = time.perf_counter() - start
+    after = fetch_server_stats(base_url)
+    
+    latencies = [latency for latency, _ in results]
+    report = {
+        "pipeline": name,
+        "artifacts": len(artifacts),
+        "concurrency": concurrency,
+        "elapsedSeconds": round(elapsed, 3),
+        "artifactsPerSecond": round(len(artifacts) / elapsed, 2) if elapsed else 0.0,
+        "latencyP50": round(percentile(latencies, 50), 3),
+        "latencyP99": round(percentile(latencies, 99), 3),
+        "failures": sum(1 for _, ok in results if not ok),
+        "retries": None,
+    }
+    if before is not None and after is not None:
+        # 模拟服务注入的每个429/500错误都会触发客户端的一次重试
+        report["retries"] = (after["rateLimited"] - before["rateLimited"]) + (after["errors"] - before["errors"])
+        report["httpRequests"] = after["requests"] - before["requests"]
+    return report
+
+def print_report(reports):
+    print(f"{'流程':<12}{'藏品数':>8}{'并发':>6}{'藏品/秒':>10}{'p50(秒)':>10}{'p99(秒)':>10}{'重试':>8}{'失败':>8}")
+    for report in reports:
+        retries = "-" if report["retries"] is None else report["retries"]
+        print(
+            f"{report['pipeline']:<12}{report['artifacts']:>8}{report['concurrency']:>6}"
+            f"{report['artifactsPerSecond']:>10}{report['latencyP50']:>10}{report['latencyP99']:>10}"
+            f"{retries:>8}{report['failures']:>8}"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description="AI处理流程吞吐量压测")
+    parser.add_argument("--pipelines", nargs="+", choices=PIPELINES, default=PIPELINES, help="要压测的流程")
+    parser.add_argument("--input", help="藏品数据文件，默认使用模拟藏品")
+    parser.add_argument("--count", type=int, default=50, help="压测的藏品数量")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发请求数")
+    parser.add_argument("--base-url", help="已有的OpenAI兼容服务地址，默认在本进程内启动模拟服务")
+    parser.add_argument("--api-key", default="mock-key", help="API密钥，使用模拟服务时可以任意填写")
+    parser.add_argument("--latency", type=float, default=0.2, help="模拟服务的平均延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.05, help="模拟服务延迟的随机波动范围（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模拟服务返回500错误的概率")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="模拟服务返回429错误的概率")
+    parser.add_argument("--retry-after", type=float, default=0.5, help="模拟服务429响应中Retry-After头的秒数")
+    parser.add_argument("--seed", type=int, default=0, help="模拟服务的随机数种子")
+    parser.add_argument("--output", help="将压测结果保存为JSON文件")
+    parser.add_argument("--verbose", action="store_true", help="显示各流程的逐条输出")
+    
+    args = parser.parse_args()
+    # 连接池至少能容纳全部并发请求
+    configure_http_pool(max_connections=max(args.concurrency, 1) * 2, max_keepalive=max(args.concurrency, 1))
+    
+    if args.input:
+        artifacts = load_collection(args.input, "artifacts")["artifacts"]
+        artifacts = [artifact for artifact in artifacts if artifact.get("description")][:args.count]
+    else:
+        artifacts = synthetic_artifacts(args.count)
+    
+    server = None
+    base_url = args.base_url
+    if not base_url:
+        options = MockOptions(
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            rate_limit_rate=args.rate_limit_rate,
+            retry_after=args.retry_after,
+            seed=args.seed
+        )
+        server, base_url = start_mock_server(options=options)
+        print(f"已启动模拟服务: {base_url}")
+    
+    try:
+        reports = []
+        for name in args.pipelines:
+            print(f"正在压测 {name} 流程（{len(artifacts)} 件藏品，并发 {args.concurrency}）...")
+            reports.append(benchmark_pipeline(name, artifacts, args.concurrency, base_url, args.api_key, args.verbose))
+    finally:
+        if server is not None:
+            server.shutdown()
+    
+    print_report(reports)
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"reports": reports}, f, ensure_ascii=False, indent=2)
+        print(f"压测结果已保存到: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+class CatalogIndex:
+    """
+    藏品和测验的内存索引
+    
+    索引只建立一次：藏品ID到藏品、名称到藏品ID、藏品ID到测验，以及重复名称、没有测验的藏品、
+    没有对应藏品的测验和有多个测验的藏品。之后通过本对象添加、改名或删除时增量更新，
+    各项完整性检查都是直接查询，可以在每次修改后验证，不必重新遍历全部数据。
+    
+    Args:
+        artifacts_data: {"artifacts": [...]}，添加和删除时直接修改其中的列表
+        quizzes_data: {"quizzes": [...]}，添加和删除时直接修改其中的列表
+    """
+    
+    def __init__(self, artifacts_data, quizzes_data):
+        self.artifacts = artifacts_data['artifacts']
+        self.quizzes = quizzes_data['quizzes']
+        self.by_id = {}
+        # 名称到藏品ID；以下集合都用值为None的字典表示，保持添加顺序，每次运行的输出相同
+        self.ids_by_name = {}
+        self.quizzes_by_artifact = {}
+        self.duplicate_names = set()
+        self.artifacts_without_quiz = {}
+        self.quizzes_without_artifact = {}
+        self.artifacts_with_multiple_quizzes = {}
+        
+        for artifact in self.artifacts:
+            self._index_artifact(artifact)
+        for quiz in self.quizzes:
+            self._index_quiz(quiz)
+    
+    def _index_artifact(self, artifact):
+        artifact_id = artifact['id']
+        if artifact_id in self.by_id:
+            raise ValueError(f"藏品ID重复: {artifact_id}")
+        self.by_id[artifact_id] = artifact
+        self._add_name(artifact['name'], artifact_id)
+        if artifact_id in self.quizzes_by_artifact:
+            self.quizzes_without_artifact.pop(artifact_id, None)
+        else:
+            self.artifacts_without_quiz[artifact_id] = None
+    
+    def _index_quiz(self, quiz):
+        artifact_id = quiz['artifactId']
+        quizzes = self.quizzes_by_artifact.setdefault(artifact_id, [])
+        quizzes.append(quiz)
+        if len(quizzes) == 1:
+            if artifact_id in self.by_id:
+                self.artifacts_without_quiz.pop(artifact_id, None)
+            else:
+                self.quizzes_without_artifact[artifact_id] = None
+        elif len(quizzes) == 2:
+            self.artifacts_with_multiple_quizzes[artifact_id] = None
+    
+    def _add_name(self, name, artifact_id):
+        ids = self.ids_by_name.setdefault(name, {})
+        ids[artifact_id] = None
+        if len(ids) > 1:
+            self.duplicate_names.add(name)
+    
+    def _remove_name(self, name, artifact_id):
+        ids = self.ids_by_name[name]
+        del ids[artifact_id]
+        if len(ids) < 2:
+            self.duplicate_names.discard(name)
+        if not ids:
+            del self.ids_by_name[name]
+    
+    @staticmethod
+    def _remove_item(items, item):
+        """从列表中删除指定的对象（按对象本身而不是按值比较）"""
+        for i, other in enumerate(items):
+            if other is item:
+                del items[i]
+                return
+    
+    def add_artifact(self, artifact):
+        """添加藏品"""
+        self._index_artifact(artifact)
+        self.artifacts.append(artifact)
+    
+    def rename_artifact(self, artifact_id, new_name):
+        """修改藏品名称，返回原名称"""
+        artifact = self.by_id[artifact_id]
+        old_name = artifact['name']
+        self._remove_name(old_name, artifact_id)
+        artifact['name'] = new_name
+        self._add_name(new_name, artifact_id)
+        return old_name
+    
+    def remove_artifact(self, artifact_id, remove_quizzes=False):
+        """
+        删除藏品
+        
+        Args:
+            artifact_id: 藏品ID
+            remove_quizzes: 是否同时删除其测验；不删除时这些测验成为没有对应藏品的测验
+        
+        Returns:
+            删除的藏品
+        """
+        artifact = self.by_id.pop(artifact_id)
+        self._remove_name(artifact['name'], artifact_id)
+        self.artifacts_without_quiz.pop(artifact_id, None)
+        self._remove_item(self.artifacts, artifact)
+        if remove_quizzes:
+            for quiz in list(self.quizzes_by_artifact.get(artifact_id, [])):
+                self.remove_quiz(quiz)
+        elif artifact_id in self.quizzes_by_artifact:
+            self.quizzes_without_artifact[artifact_id] = None
+        return artifact
+    
+    def add_quiz(self, quiz):
+        """添加测验"""
+        self._index_quiz(quiz)
+        self.quizzes.append(quiz)
+    
+    def remove_quiz(self, quiz):
+        """删除测验（传入测验对象本身）"""
+        artifact_id = quiz['artifactId']
+        quizzes = self.quizzes_by_artifact[artifact_id]
+        self._remove_item(quizzes, quiz)
+        self._remove_item(self.quizzes, quiz)
+        if len(quizzes) == 1:
+            self.artifacts_with_multiple_quizzes.pop(artifact_id, None)
+        elif not quizzes:
+            del self.quizzes_by_artifact[artifact_id]
+            if artifact_id in self.by_id:
+                self.artifacts_without_quiz[artifact_id] = None
+            else:
+                self.quizzes_without_artifact.pop(artifact_id, None)
+    
+    def ids_with_name(self, name):
+        """使用该名称的藏品ID列表"""
+        return list(self.ids_by_name.get(name, ()))
+    
+    def quiz_count(self, artifact_id):
+        """藏品的测验数量"""
+        return len(self.quizzes_by_artifact.get(artifact_id, ()))
+    
+    def duplicates(self):
+        """返回 {重复名称: [藏品ID, ...]}，按名称第一次出现的顺序排列"""
+        if not self.duplicate_names:
+            return {}
+        return {name: list(ids) for name, ids in self.ids_by_name.items() if name in self.duplicate_names}
+    
+    def is_valid(self):
+        """每个藏品都有测验、每个测验都有对应藏品，并且藏品名称互不相同"""
+        return not (self.artifacts_without_quiz or self.quizzes_without_artifact or self.duplicate_names)
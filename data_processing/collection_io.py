@@ -0,0 +1,80 @@
+import json
+from pathlib import Path
+
+from stream_io import is_ndjson, iter_ndjson, write_ndjson
+
+# 列式中间格式的文件后缀
+PARQUET_SUFFIXES = {".parquet"}
+ARROW_SUFFIXES = {".arrow", ".feather"}
+
+# 各中间格式对应的文件后缀，用于命令行的 --format 参数
+FORMAT_SUFFIXES = {
+    "json": ".json",
+    "parquet": ".parquet",
+    "arrow": ".arrow",
+}
+
+def _require_pyarrow():
+    """导入pyarrow，未安装时给出明确提示"""
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa: F401
+        import pyarrow.feather  # noqa: F401
+    except ImportError:
+        raise ImportError("读写Parquet/Arrow中间文件需要安装pyarrow: pip install pyarrow")
+    return pyarrow
+
+def is_columnar(path):
+    """判断文件是否为Parquet/Arrow列式格式"""
+    suffix = Path(path).suffix.lower()
+    return suffix in PARQUET_SUFFIXES or suffix in ARROW_SUFFIXES
+
+def with_format(path, fmt):
+    """将文件路径的后缀替换为指定中间格式的后缀"""
+    return Path(path).with_suffix(FORMAT_SUFFIXES[fmt])
+
+def _records_to_table(records):
+    """将记录列表转换为Arrow表，列为所有记录字段的并集（按首次出现的顺序）"""
+    pa = _require_pyarrow()
+    columns = {}
+    for record in records:
+        for key in record:
+            columns.setdefault(key, None)
+    return pa.table({key: [record.get(key) for record in records] for key in columns})
+
+def read_table(path, memory_map=True):
+    """读取Parquet/Arrow文件为Arrow表，默认使用内存映射"""
+    pa = _require_pyarrow()
+    if Path(path).suffix.lower() in PARQUET_SUFFIXES:
+        return pa.parquet.read_table(path, memory_map=memory_map)
+    return pa.feather.read_table(path, memory_map=memory_map)
+
+def load_collection(path, key):
+    """
+    按文件后缀读取 {key: [...]} 结构的数据
+    
+    支持 .json、.ndjson/.jsonl、.parquet 和 .arrow/.feather 文件，
+    返回值的结构与直接 json.load 一个JSON文件相同。
+    """
+    if is_columnar(path):
+        return {key: read_table(path).to_pylist()}
+    if is_ndjson(path):
+        return {key: list(iter_ndjson(path))}
+    
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_collection(data, path, key):
+    """按文件后缀保存 {key: [...]} 结构的数据，JSON格式与原有输出保持一致"""
+    suffix = Path(path).suffix.lower()
+    if suffix in PARQUET_SUFFIXES:
+        pa = _require_pyarrow()
+        pa.parquet.write_table(_records_to_table(data[key]), path)
+    elif suffix in ARROW_SUFFIXES:
+        pa = _require_pyarrow()
+        pa.feather.write_feather(_records_to_table(data[key]), path, compression="uncompressed")
+    elif is_ndjson(path):
+        write_ndjson(data[key], path)
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
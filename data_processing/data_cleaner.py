@@ -3,10 +3,10 @@ import json
 import os
 from pathlib import Path
 from typing import List, Dict, Any
-import requests
 from PIL import Image
 from io import BytesIO
 from tqdm import tqdm
+from http_clients import get_http_client
 
 class MuseumDataCleaner:
     def __init__(self, input_dir: str = "raw_data", output_dir: str = "cleaned_data"):
@@ -125,7 +125,8 @@ class MuseumDataCleaner:
         if not url:
             return ""
         try:
-            response = requests.head(url)
+            # 使用共享连接池，逐条验证时复用同一图片服务器的连接
+            response = get_http_client().head(url)
             if response.status_code == 200:
                 return url
             return ""
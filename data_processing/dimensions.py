@@ -0,0 +1,124 @@
+import bisect
+import json
+import re
+
+import pandas as pd
+
+# 尺寸字段与尺寸信息中对应关键词的映射
+# 关键词后必须紧跟数字（允许空格和"约"），例如"横长"只会匹配长度而不会匹配宽度
+DIMENSION_KEYWORDS = {
+    "lengthCm": "长|纵",
+    "widthCm": "宽|横",
+    "heightCm": "高",
+    "diameterCm": "径",
+}
+
+DIMENSION_PATTERNS = {
+    field: re.compile(rf"(?:{keywords})\s*约?\s*(\d+(?:\.\d+)?)\s*(厘米|公分|毫米|cm|mm|米)?", re.IGNORECASE)
+    for field, keywords in DIMENSION_KEYWORDS.items()
+}
+
+# 换算为厘米的系数，未写单位时按厘米处理
+UNIT_TO_CM = {
+    "": 1.0,
+    "厘米": 1.0,
+    "公分": 1.0,
+    "cm": 1.0,
+    "毫米": 0.1,
+    "mm": 0.1,
+    "米": 100.0,
+}
+
+SIZE_FIELDS = list(DIMENSION_KEYWORDS)
+
+def _normalize(texts):
+    """统一全角小数点，便于正则匹配"""
+    return texts.str.replace("．", ".", regex=False)
+
+def parse_dimensions(texts):
+    """
+    批量解析尺寸信息文本
+    
+    Args:
+        texts: 尺寸信息文本的pandas Series
+    
+    Returns:
+        与texts同索引的DataFrame，包含lengthCm、widthCm、heightCm、diameterCm四列数值（厘米），
+        未找到的尺寸为NaN。每种尺寸取文本中第一次出现的值。
+    """
+    texts = _normalize(texts.fillna("").astype(str))
+    sizes = pd.DataFrame(index=texts.index)
+    for field, pattern in DIMENSION_PATTERNS.items():
+        matches = texts.str.extract(pattern)
+        values = pd.to_numeric(matches[0], errors="coerce")
+        factors = matches[1].fillna("").str.lower().map(UNIT_TO_CM).fillna(1.0)
+        sizes[field] = (values * factors).round(2)
+    return sizes
+
+def parse_dimension_text(text):
+    """解析单条尺寸信息文本，返回 {尺寸字段: 数值或None}"""
+    sizes = parse_dimensions(pd.Series([text]))
+    return {field: (None if pd.isna(value) else float(value)) for field, value in sizes.iloc[0].items()}
+
+def artifact_sizes(artifact):
+    """返回藏品的数值尺寸，优先使用入库时已解析的字段，旧数据则现场解析尺寸文本"""
+    if any(field in artifact for field in SIZE_FIELDS):
+        return {field: artifact.get(field) for field in SIZE_FIELDS}
+    return parse_dimension_text(artifact.get("dimensions", ""))
+
+# 生成名称时使用的尺寸中文标签
+SIZE_LABELS = {
+    "lengthCm": "长",
+    "widthCm": "宽",
+    "heightCm": "高",
+    "diameterCm": "径",
+}
+
+def format_size_label(sizes, max_parts=2):
+    """将数值尺寸格式化为简短的中文描述，例如"长32.7厘米 宽14.7厘米" """
+    parts = [
+        f"{SIZE_LABELS[field]}{value:g}厘米"
+        for field, value in sizes.items()
+        if value is not None
+    ]
+    return " ".join(parts[:max_parts])
+
+def build_size_index(artifacts):
+    """
+    构建按尺寸排序的索引
+    
+    Returns:
+        {尺寸字段: {"values": [数值, ...], "ids": [藏品ID, ...]}}，按数值升序排列
+    """
+    entries = {field: [] for field in SIZE_FIELDS}
+    for artifact in artifacts:
+        sizes = artifact_sizes(artifact)
+        for field in SIZE_FIELDS:
+            if sizes[field] is not None:
+                entries[field].append((sizes[field], artifact["id"]))
+    
+    index = {}
+    for field, pairs in entries.items():
+        pairs.sort()
+        index[field] = {
+            "values": [value for value, _ in pairs],
+            "ids": [artifact_id for _, artifact_id in pairs],
+        }
+    return index
+
+def save_size_index(index, output_file):
+    """保存尺寸索引"""
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False)
+
+def load_size_index(input_file):
+    """读取尺寸索引"""
+    with open(input_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def find_in_size_range(index, field, low=None, high=None):
+    """使用二分查找返回尺寸在 [low, high] 区间内的藏品ID列表"""
+    values = index[field]["values"]
+    start = 0 if low is None else bisect.bisect_left(values, low)
+    end = len(values) if high is None else bisect.bisect_right(values, high)
+    return index[field]["ids"][start:end]
@@ -1,65 +1,219 @@
+import asyncio
+import email.utils
+import hashlib
 import json
 import os
-import requests
+from collections import Counter
 from pathlib import Path
 import argparse
+from urllib.parse import urlsplit
 from tqdm import tqdm
-import concurrent.futures
-import time
-import random
+from http_clients import add_http_pool_arguments, configure_http_pool, configure_http_pool_from_args, create_async_http_client
+from rate_limiter import THROTTLE_STATUS_CODES, backoff_delay, rate_limit_summary
 
-def download_image(url, save_path, retries=3, timeout=30, delay=1):
+# 请求图片时使用的浏览器User-Agent，部分图片服务器拒绝默认的客户端标识
+DOWNLOAD_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# 同一图片服务器的默认最大并发连接数，与浏览器的习惯相同
+DEFAULT_PER_HOST = 6
+
+# 流式写入时每次读取的字节数
+CHUNK_SIZE = 64 * 1024
+
+# 下载清单的默认文件名，保存在图片目录中
+DEFAULT_MANIFEST_NAME = "download_manifest.json"
+
+class DownloadManifest:
+    """
+    图片下载清单
+    
+    记录每个图片文件的URL、ETag、Last-Modified、大小和sha256。再次运行时对已下载的图片发送条件请求
+    （If-None-Match / If-Modified-Since），服务器返回304时只需一次往返、不传输图片内容；
+    返回200时重新下载，内容的sha256没有变化时保留原文件。
+    
+    Args:
+        manifest_file: 清单文件路径
+    """
+    
+    def __init__(self, manifest_file):
+        self.manifest_file = Path(manifest_file)
+        self.images = {}
+        if self.manifest_file.exists():
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                self.images = json.load(f).get("images", {})
+    
+    def conditional_headers(self, url, save_path):
+        """
+        返回重新请求已下载图片时使用的条件请求头，文件不存在时返回None
+        
+        清单中没有记录（例如之前没有使用清单下载）的文件，以文件的修改时间作为If-Modified-Since。
+        """
+        if not os.path.exists(save_path):
+            return None
+        entry = self.images.get(os.path.basename(save_path))
+        if entry and entry["url"] == url and entry["size"] == os.path.getsize(save_path):
+            headers = {}
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("lastModified"):
+                headers["If-Modified-Since"] = entry["lastModified"]
+            if headers:
+                return headers
+        return {"If-Modified-Since": email.utils.formatdate(os.path.getmtime(save_path), usegmt=True)}
+    
+    def record(self, url, save_path, response, sha256=None):
+        """记录下载结果；304响应沿用文件已有的大小和sha256，只更新服务器返回的校验信息"""
+        filename = os.path.basename(save_path)
+        entry = self.images.get(filename, {})
+        if sha256 is None:
+            sha256 = entry.get("sha256") if entry.get("url") == url else None
+            if sha256 is None:
+                sha256 = file_sha256(save_path)
+        self.images[filename] = {
+            "url": url,
+            "etag": response.headers.get("ETag") or entry.get("etag"),
+            "lastModified": response.headers.get("Last-Modified") or entry.get("lastModified"),
+            "size": os.path.getsize(save_path),
+            "sha256": sha256,
+        }
+    
+    def sha256(self, save_path):
+        entry = self.images.get(os.path.basename(save_path))
+        return entry.get("sha256") if entry else None
+    
+    def save(self):
+        self.manifest_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.manifest_file, 'w', encoding='utf-8') as f:
+            json.dump({"images": self.images}, f, ensure_ascii=False, indent=2)
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+async def download_image_async(client, url, save_path, host_semaphore, retries=3, timeout=30, delay=1, manifest=None):
     """
     下载图片并保存到指定路径
     
+    响应内容边下载边写入临时文件，完整下载后再改名为目标文件，中断的下载不会留下不完整的图片。
+    
     Args:
+        client: httpx.AsyncClient，同一服务器的长连接在各下载任务间复用
         url: 图片URL
         save_path: 保存路径
+        host_semaphore: 图片所在服务器的并发限制
         retries: 重试次数
         timeout: 超时时间（秒）
-        delay: 请求间隔（秒）
+        delay: 第一次重试前的等待时间（秒），之后指数增长
+        manifest: DownloadManifest，为None时已存在的文件直接跳过，不检查是否有更新
     
     Returns:
-        bool: 是否下载成功
+        str: "downloaded"（新下载）、"updated"（内容有变化，已更新）、"not_modified"（服务器返回304或内容相同）、
+        "skipped"（文件已存在）或 "failed"
     """
     if not url:
-        return False
+        return "failed"
     
     # 确保保存路径的目录存在
     save_dir = os.path.dirname(save_path)
     if not os.path.exists(save_dir):
         os.makedirs(save_dir, exist_ok=True)
     
-    # 如果文件已存在，跳过下载
-    if os.path.exists(save_path):
-        return True
-    
-    # 添加随机延迟，避免过快请求
-    time.sleep(delay + random.uniform(0, 1))
+    # 没有下载清单时，如果文件已存在，跳过下载
+    if manifest is None and os.path.exists(save_path):
+        return "skipped"
     
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
+    headers = dict(DOWNLOAD_HEADERS)
+    conditional_headers = manifest.conditional_headers(url, save_path) if manifest is not None else None
+    if conditional_headers:
+        headers.update(conditional_headers)
     
+    temp_path = f"{save_path}.part"
     for attempt in range(retries):
         try:
-            response = requests.get(url, headers=headers, timeout=timeout, stream=True)
-            if response.status_code == 200:
-                with open(save_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)
-                return True
-            else:
-                print(f"下载失败 ({response.status_code}): {url}")
-                time.sleep(delay * (attempt + 1))  # 增加重试间隔
+            # 客户端按服务器自适应限速：正常时全速，遇到429/503后按Retry-After暂停再逐步恢复
+            async with host_semaphore:
+                async with client.stream("GET", url, headers=headers, timeout=timeout, follow_redirects=True) as response:
+                    if response.status_code == 304 and conditional_headers is not None:
+                        manifest.record(url, save_path, response)
+                        return "not_modified"
+                    if response.status_code == 200:
+                        digest = hashlib.sha256()
+                        with open(temp_path, 'wb') as f:
+                            async for chunk in response.aiter_bytes(chunk_size=CHUNK_SIZE):
+                                f.write(chunk)
+                                digest.update(chunk)
+                        sha256 = digest.hexdigest()
+                        # 服务器不支持条件请求时，内容相同的图片保留原文件
+                        unchanged = conditional_headers is not None and sha256 == (
+                            manifest.sha256(save_path) or file_sha256(save_path)
+                        )
+                        if unchanged:
+                            os.remove(temp_path)
+                        else:
+                            os.replace(temp_path, save_path)
+                        if manifest is not None:
+                            manifest.record(url, save_path, response, sha256)
+                        if unchanged:
+                            return "not_modified"
+                        return "updated" if conditional_headers is not None else "downloaded"
+            print(f"下载失败 ({response.status_code}): {url}")
+            # 限流时由限速器按Retry-After等待，其他错误指数退避后重试
+            if response.status_code not in THROTTLE_STATUS_CODES and attempt < retries - 1:
+                await asyncio.sleep(backoff_delay(attempt, delay))
         except Exception as e:
             print(f"下载异常 ({attempt+1}/{retries}): {url} - {str(e)}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
             if attempt < retries - 1:
-                time.sleep(delay * (attempt + 1))  # 增加重试间隔
+                await asyncio.sleep(backoff_delay(attempt, delay))
+    
+    return "failed"
+
+async def download_images_async(images_to_download, max_workers=16, per_host=DEFAULT_PER_HOST, manifest=None):
+    """
+    并发下载图片
+    
+    Args:
+        images_to_download: [(图片URL, 保存路径)]
+        max_workers: 同时进行的最大下载数（也是连接池大小）
+        per_host: 同一图片服务器的最大并发下载数
+        manifest: DownloadManifest，提供时对已下载的图片发送条件请求
+    
+    Returns:
+        {下载结果: 图片数}，下载结果见 download_image_async
+    """
+    semaphore = asyncio.Semaphore(max_workers)
+    host_semaphores = {}
+    counts = Counter()
+    
+    async def download(client, url, path, progress):
+        host = urlsplit(url).hostname or ""
+        if host not in host_semaphores:
+            host_semaphores[host] = asyncio.Semaphore(per_host)
+        async with semaphore:
+            try:
+                status = await download_image_async(client, url, path, host_semaphores[host], manifest=manifest)
+            except Exception as e:
+                print(f"任务异常: {url} - {str(e)}")
+                status = "failed"
+        counts[status] += 1
+        progress.update(1)
     
-    return False
+    client = create_async_http_client()
+    try:
+        with tqdm(total=len(images_to_download), desc="下载进度") as progress:
+            await asyncio.gather(*(download(client, url, path, progress) for url, path in images_to_download))
+    finally:
+        await client.aclose()
+    return counts
 
-def process_artifacts_images(artifacts_file, output_dir, max_workers=5):
+def process_artifacts_images(artifacts_file, output_dir, max_workers=16, per_host=DEFAULT_PER_HOST,
+                             manifest_file=None, use_manifest=True):
     """
     处理藏品数据中的图片并下载
     
@@ -67,6 +221,9 @@ def process_artifacts_images(artifacts_file, output_dir, max_workers=5):
         artifacts_file: 藏品JSON文件路径
         output_dir: 图片保存目录
         max_workers: 最大并发下载数
+        per_host: 同一图片服务器的最大并发下载数
+        manifest_file: 下载清单路径，默认为图片目录中的download_manifest.json
+        use_manifest: 是否使用下载清单；不使用时已存在的图片直接跳过
     """
     # 读取藏品数据
     with open(artifacts_file, 'r', encoding='utf-8') as f:
@@ -76,8 +233,8 @@ def process_artifacts_images(artifacts_file, output_dir, max_workers=5):
     images_dir = Path(output_dir)
     images_dir.mkdir(exist_ok=True, parents=True)
     
-    # 提取需要下载的图片URL
-    images_to_download = []
+    # 提取需要下载的图片URL，多件藏品使用同一张图片时只下载一次
+    images_to_download = {}
     for artifact in artifacts_data.get("artifacts", []):
         if artifact.get("image"):
             # 从URL中提取文件名
@@ -92,38 +249,30 @@ def process_artifacts_images(artifacts_file, output_dir, max_workers=5):
             save_path = images_dir / filename
             
             # 更新藏品数据中的本地图片路径
-            artifact["localImage"] = str(images_dir.name / filename)
+            artifact["localImage"] = f"{images_dir.name}/{filename}"
             
             # 添加到下载列表
-            images_to_download.append((image_url, str(save_path)))
+            images_to_download.setdefault(str(save_path), image_url)
     
     # 并发下载图片
     print(f"开始下载 {len(images_to_download)} 张图片...")
     
-    success_count = 0
-    failed_count = 0
-    
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # 提交所有下载任务
-        future_to_url = {
-            executor.submit(download_image, url, path): url 
-            for url, path in images_to_download
-        }
-        
-        # 处理任务结果
-        for future in tqdm(concurrent.futures.as_completed(future_to_url), total=len(images_to_download), desc="下载进度"):
-            url = future_to_url[future]
-            try:
-                success = future.result()
-                if success:
-                    success_count += 1
-                else:
-                    failed_count += 1
-            except Exception as e:
-                print(f"任务异常: {url} - {str(e)}")
-                failed_count += 1
+    manifest = DownloadManifest(manifest_file or images_dir / DEFAULT_MANIFEST_NAME) if use_manifest else None
+    try:
+        counts = asyncio.run(download_images_async(
+            [(url, path) for path, url in images_to_download.items()], max_workers, per_host, manifest
+        ))
+    finally:
+        # 中断时也保存已完成的记录
+        if manifest is not None:
+            manifest.save()
     
-    print(f"下载完成！成功: {success_count}, 失败: {failed_count}")
+    print(f"下载完成！成功: {sum(counts.values()) - counts['failed']}, 失败: {counts['failed']}")
+    if manifest is not None:
+        print(f"其中新下载 {counts['downloaded']} 张，已更新 {counts['updated']} 张，未变化 {counts['not_modified']} 张")
+        print(f"下载清单已保存到: {manifest.manifest_file}")
+    if rate_limit_summary():
+        print(rate_limit_summary())
     
     # 更新藏品数据中的本地图片路径
     updated_artifacts_file = Path(artifacts_file).with_suffix(".updated.json")
@@ -139,15 +288,26 @@ def main():
     parser = argparse.ArgumentParser(description="下载藏品图片")
     parser.add_argument("--artifacts-file", required=True, help="藏品JSON文件路径")
     parser.add_argument("--output-dir", default="museum_images", help="图片保存目录")
-    parser.add_argument("--max-workers", type=int, default=5, help="最大并发下载数")
+    parser.add_argument("--max-workers", type=int, default=16, help="最大并发下载数")
+    parser.add_argument("--per-host", type=int, default=DEFAULT_PER_HOST, help="同一图片服务器的最大并发下载数")
+    parser.add_argument("--manifest", help=f"下载清单路径，默认为图片目录中的{DEFAULT_MANIFEST_NAME}")
+    parser.add_argument("--no-manifest", action="store_true", help="不使用下载清单，已存在的图片直接跳过、不检查更新")
+    add_http_pool_arguments(parser)
     
     args = parser.parse_args()
     
+    # 连接池至少能容纳全部并发下载
+    configure_http_pool(max_connections=args.max_workers, max_keepalive=args.max_workers)
+    configure_http_pool_from_args(args)
+    
     # 处理藏品图片
     process_artifacts_images(
         args.artifacts_file,
         args.output_dir,
-        args.max_workers
+        args.max_workers,
+        args.per_host,
+        args.manifest,
+        not args.no_manifest
     )
 
 if __name__ == "__main__":
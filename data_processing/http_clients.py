@@ -0,0 +1,114 @@
+import importlib.util
+import os
+import threading
+
+import httpx
+import openai
+
+from llm_metrics import note_http_response, note_http_response_async
+from rate_limiter import note_rate_limit, note_rate_limit_async, wait_for_rate_limit, wait_for_rate_limit_async
+
+# 连接池默认大小，可通过环境变量或 configure_http_pool 修改
+DEFAULT_MAX_CONNECTIONS = int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "32"))
+DEFAULT_MAX_KEEPALIVE = int(os.getenv("HTTP_POOL_MAX_KEEPALIVE", "16"))
+DEFAULT_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "60"))
+
+# 安装了h2（pip install 'httpx[http2]'）时启用HTTP/2
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+_settings = {
+    "max_connections": DEFAULT_MAX_CONNECTIONS,
+    "max_keepalive": DEFAULT_MAX_KEEPALIVE,
+    "timeout": DEFAULT_TIMEOUT,
+    "http2": HTTP2_AVAILABLE,
+}
+_lock = threading.Lock()
+_http_client = None
+_openai_clients = {}
+
+def configure_http_pool(max_connections=None, max_keepalive=None, timeout=None, http2=None):
+    """
+    修改共享连接池的参数，需要在第一次使用共享客户端之前调用
+    
+    Args:
+        max_connections: 最大连接数
+        max_keepalive: 保持空闲长连接的最大数量
+        timeout: 请求超时时间（秒）
+        http2: 是否启用HTTP/2，未安装h2时忽略
+    """
+    with _lock:
+        if max_connections is not None:
+            _settings["max_connections"] = max_connections
+            _settings["max_keepalive"] = min(_settings["max_keepalive"], max_connections)
+        if max_keepalive is not None:
+            _settings["max_keepalive"] = max_keepalive
+        if timeout is not None:
+            _settings["timeout"] = timeout
+        if http2 is not None:
+            _settings["http2"] = http2 and HTTP2_AVAILABLE
+
+def _client_options():
+    return {
+        "limits": httpx.Limits(
+            max_connections=_settings["max_connections"],
+            max_keepalive_connections=_settings["max_keepalive"]
+        ),
+        "timeout": _settings["timeout"],
+        "http2": _settings["http2"],
+    }
+
+def get_http_client():
+    """
+    返回进程内共享的httpx客户端（线程安全，复用长连接）
+    
+    请求按目标主机自适应限速：正常时全速发送，遇到429/503后按Retry-After或指数退避暂停再逐步恢复。
+    """
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            _http_client = httpx.Client(
+                follow_redirects=False,
+                event_hooks={"request": [wait_for_rate_limit], "response": [note_http_response, note_rate_limit]},
+                **_client_options()
+            )
+        return _http_client
+
+def create_async_http_client():
+    """创建使用相同连接池参数的httpx异步客户端，异步客户端不能跨事件循环共享"""
+    return httpx.AsyncClient(
+        follow_redirects=False,
+        event_hooks={
+            "request": [wait_for_rate_limit_async],
+            "response": [note_http_response_async, note_rate_limit_async]
+        },
+        **_client_options()
+    )
+
+def get_openai_client(api_key=None, base_url=None):
+    """
+    返回共享连接池的OpenAI客户端，相同的api_key和base_url复用同一个客户端
+    
+    api_key和base_url为None时与openai库一样从OPENAI_API_KEY、OPENAI_BASE_URL环境变量读取。
+    """
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    base_url = base_url or os.getenv("OPENAI_BASE_URL")
+    key = (api_key, base_url)
+    client = _openai_clients.get(key)
+    if client is None:
+        client = openai.OpenAI(api_key=api_key, base_url=base_url, http_client=get_http_client())
+        with _lock:
+            client = _openai_clients.setdefault(key, client)
+    return client
+
+def create_async_openai_client(api_key=None, base_url=None):
+    """创建使用连接池参数的异步OpenAI客户端，用完后调用 await client.close()"""
+    return openai.AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=create_async_http_client())
+
+def add_http_pool_arguments(parser):
+    """为命令行添加连接池相关参数"""
+    parser.add_argument("--pool-size", type=int, help=f"HTTP连接池最大连接数，默认为{DEFAULT_MAX_CONNECTIONS}")
+    parser.add_argument("--no-http2", action="store_true", help="不使用HTTP/2")
+
+def configure_http_pool_from_args(args):
+    """根据命令行参数配置连接池"""
+    configure_http_pool(max_connections=args.pool_size, http2=False if args.no_http2 else None)
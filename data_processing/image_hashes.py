@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+from tqdm import tqdm
+
+# 参与计算感知哈希的图片格式
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp"}
+
+# 索引文件的默认文件名，保存在图片目录中
+DEFAULT_INDEX_NAME = "image_hashes.json"
+
+# dHash和pHash都不超过该汉明距离（共64位）时视为同一张图片
+DEFAULT_MAX_DISTANCE = 8
+
+# pHash先缩小到32×32再做二维DCT，取左上角8×8的低频分量
+_PHASH_SIZE = 32
+_DCT_MATRIX = np.array([
+    [np.cos(np.pi * (2 * x + 1) * u / (2 * _PHASH_SIZE)) for x in range(_PHASH_SIZE)]
+    for u in range(_PHASH_SIZE)
+])
+
+def _bits_to_int(bits):
+    value = 0
+    for bit in bits.flatten():
+        value = (value << 1) | int(bit)
+    return value
+
+def dhash(image, size=8):
+    """差值哈希：缩小为(size+1)×size的灰度图，比较每行相邻像素的明暗"""
+    pixels = np.asarray(image.convert("L").resize((size + 1, size), Image.LANCZOS), dtype=np.int16)
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+def phash(image, size=8):
+    """感知哈希：缩小为32×32的灰度图做DCT，低频分量与其中位数比较"""
+    pixels = np.asarray(image.convert("L").resize((_PHASH_SIZE, _PHASH_SIZE), Image.LANCZOS), dtype=np.float64)
+    low = (_DCT_MATRIX @ pixels @ _DCT_MATRIX.T)[:size, :size]
+    # 直流分量只反映整体亮度，不参与计算中位数
+    return _bits_to_int(low > np.median(low.flatten()[1:]))
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+def hash_image_file(path):
+    """
+    计算一个图片文件的感知哈希，在进程池中执行
+    
+    Returns:
+        (路径, {"dhash", "phash"})，无法读取的图片返回 (路径, None)
+    """
+    try:
+        with Image.open(path) as image:
+            return path, {"dhash": f"{dhash(image):016x}", "phash": f"{phash(image):016x}"}
+    except Exception:
+        return path, None
+
+# 每个字节中1的个数，用于批量计算汉明距离
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def popcount(values):
+    """uint64数组中每个元素的1的个数"""
+    return _POPCOUNT_TABLE[values.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+def multi_index_pairs(values, max_distance, chunks=5):
+    """
+    多索引哈希：找出汉明距离不超过max_distance的所有哈希对
+    
+    64位哈希切分为chunks段。两个哈希距离不超过d时，按抽屉原理至少有一段的距离不超过 d // chunks，
+    因此只需对每一段、每个翻转不超过该位数的掩码，在排好序的段值中二分查找取值相同的候选，
+    再用完整哈希验证。距离8时切分为5段（12~13位）、每段最多翻转1位，共5×14次批量查找，不需要两两比较。
+    
+    Args:
+        values: 64位哈希值列表
+        max_distance: 最大汉明距离
+        chunks: 切分的段数
+    
+    Returns:
+        [(i, j, 距离)]，i < j 为values中的下标
+    """
+    values = np.array(values, dtype=np.uint64)
+    count = len(values)
+    radius = max_distance // chunks
+    # 各段的起始位和位数，64位不能整除时前面的段多1位
+    widths = [64 // chunks + (1 if i < 64 % chunks else 0) for i in range(chunks)]
+    starts = [sum(widths[:i]) for i in range(chunks)]
+    
+    found = {}
+    for start, width in zip(starts, widths):
+        chunk = ((values >> np.uint64(start)) & np.uint64((1 << width) - 1)).astype(np.int64)
+        order = np.argsort(chunk, kind="stable")
+        sorted_chunk = chunk[order]
+        masks = [mask for mask in range(1 << width) if bin(mask).count("1") <= radius]
+        for mask in masks:
+            keys = chunk ^ mask
+            left = np.searchsorted(sorted_chunk, keys, "left")
+            matches = np.searchsorted(sorted_chunk, keys, "right") - left
+            total = int(matches.sum())
+            if not total:
+                continue
+            # 展开为 (查询下标, 候选下标) 对
+            queries = np.repeat(np.arange(count), matches)
+            offsets = np.arange(total) - np.repeat(np.cumsum(matches) - matches, matches)
+            candidates = order[np.repeat(left, matches) + offsets]
+            keep = queries < candidates
+            queries, candidates = queries[keep], candidates[keep]
+            distances = popcount(values[queries] ^ values[candidates])
+            close = distances <= max_distance
+            for i, j, distance in zip(queries[close].tolist(), candidates[close].tolist(), distances[close].tolist()):
+                found[(i, j)] = distance
+    return [(i, j, distance) for (i, j), distance in sorted(found.items())]
+
+def image_filename(artifact):
+    """藏品图片在图片目录中的文件名：优先使用本地图片路径，其次使用URL中的文件名"""
+    local_image = artifact.get("localImage")
+    if local_image and "/" in local_image:
+        return local_image.split("/")[-1]
+    image_url = artifact.get("image") or ""
+    if "/" in image_url:
+        return image_url.split("/")[-1]
+    return f"artifact_{artifact.get('id', 'unknown')}.jpg"
+
+class ImageHashIndex:
+    """
+    图片目录的感知哈希索引
+    
+    索引保存为JSON文件，记录每个图片文件的大小、修改时间、dHash和pHash，
+    以及重复图片到同一个保留文件的映射。再次更新时只计算新增或变化的文件。
+    
+    Args:
+        index_file: 索引文件路径
+    """
+    
+    def __init__(self, index_file):
+        self.index_file = Path(index_file)
+        self.images = {}
+        self.duplicates = {}
+        if self.index_file.exists():
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.images = data.get("images", {})
+            self.duplicates = data.get("duplicates", {})
+    
+    def update(self, images_dir, max_workers=None):
+        """
+        计算图片目录中新增或变化文件的感知哈希，删除已不存在的文件
+        
+        Returns:
+            重新计算的文件数
+        """
+        images_dir = Path(images_dir)
+        current = {}
+        for path in images_dir.iterdir():
+            if path.suffix.lower() in IMAGE_SUFFIXES and path.is_file():
+                stat = path.stat()
+                current[path.name] = (stat.st_size, int(stat.st_mtime))
+        
+        self.images = {name: entry for name, entry in self.images.items() if name in current}
+        changed = [
+            name for name, (size, mtime) in current.items()
+            if name not in self.images or (self.images[name]["size"], self.images[name]["mtime"]) != (size, mtime)
+        ]
+        
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            paths = [str(images_dir / name) for name in changed]
+            results = executor.map(hash_image_file, paths, chunksize=max(1, len(paths) // 64))
+            for path, hashes in tqdm(results, total=len(paths), desc="计算图片哈希"):
+                name = os.path.basename(path)
+                if hashes is None:
+                    print(f"无法读取图片: {path}")
+                    self.images.pop(name, None)
+                    continue
+                size, mtime = current[name]
+                self.images[name] = {"size": size, "mtime": mtime, **hashes}
+        return len(changed)
+    
+    def find_duplicates(self, max_distance=DEFAULT_MAX_DISTANCE):
+        """
+        查找近似相同的图片，每组保留文件最大（通常分辨率或画质最高）的一个文件
+        
+        用pHash的多索引哈希查找候选，dHash同样不超过max_distance时才视为重复。
+        按文件从大到小依次作为保留文件，只把与保留文件本身相似、尚未分组的文件归入该组，
+        不会因为A与B、B与C相似就把相差很远的A和C合并。
+        
+        Returns:
+            {重复文件名: 保留的文件名}，同时保存在self.duplicates中
+        """
+        names = sorted(self.images, key=lambda name: (-self.images[name]["size"], name))
+        hashes = [(int(self.images[name]["phash"], 16), int(self.images[name]["dhash"], 16)) for name in names]
+        pairs = multi_index_pairs([phash_value for phash_value, _ in hashes], max_distance)
+        
+        neighbors = {}
+        for i, j, _ in pairs:
+            if hamming(hashes[i][1], hashes[j][1]) <= max_distance:
+                neighbors.setdefault(i, []).append(j)
+                neighbors.setdefault(j, []).append(i)
+        
+        self.duplicates = {}
+        grouped = set()
+        for i, keep in enumerate(names):
+            if i in grouped:
+                continue
+            grouped.add(i)
+            for j in neighbors.get(i, ()):
+                if j not in grouped:
+                    grouped.add(j)
+                    self.duplicates[names[j]] = keep
+        return self.duplicates
+    
+    def canonical(self, filename):
+        """返回图片对应的保留文件名，不是重复图片时返回原文件名"""
+        return self.duplicates.get(filename, filename)
+    
+    def save(self):
+        self.index_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.index_file, 'w', encoding='utf-8') as f:
+            json.dump({"images": self.images, "duplicates": self.duplicates}, f, ensure_ascii=False, indent=2)
+
+def link_duplicate_images(artifacts, index):
+    """
+    将使用重复图片的藏品的localImage指向保留的文件
+    
+    Returns:
+        修改的藏品数
+    """
+    linked = 0
+    for artifact in artifacts:
+        if not artifact.get("localImage"):
+            continue
+        filename = artifact["localImage"].split("/")[-1]
+        canonical = index.canonical(filename)
+        if canonical != filename:
+            artifact["localImage"] = artifact["localImage"][:-len(filename)] + canonical
+            linked += 1
+    return linked
+
+def main():
+    parser = argparse.ArgumentParser(description="计算已下载图片的感知哈希，查找不同URL或文件名下的相同图片")
+    parser.add_argument("--images-dir", default="museum_images", help="图片目录")
+    parser.add_argument("--index", help=f"哈希索引文件路径，默认为图片目录中的{DEFAULT_INDEX_NAME}")
+    parser.add_argument("--max-distance", type=int, default=DEFAULT_MAX_DISTANCE,
+                        help="dHash和pHash都不超过该汉明距离（共64位）时视为同一张图片")
+    parser.add_argument("--workers", type=int, help="计算哈希的最大进程数，默认为CPU核数")
+    parser.add_argument("--examples", type=int, default=10, help="打印的重复图片组数")
+    args = parser.parse_args()
+    
+    index = ImageHashIndex(args.index or Path(args.images_dir) / DEFAULT_INDEX_NAME)
+    changed = index.update(args.images_dir, args.workers)
+    print(f"索引中共 {len(index.images)} 张图片，本次计算了 {changed} 张")
+    
+    duplicates = index.find_duplicates(args.max_distance)
+    groups = {}
+    for name, canonical in duplicates.items():
+        groups.setdefault(canonical, []).append(name)
+    print(f"找到 {len(groups)} 组重复图片，共 {len(duplicates)} 个重复文件")
+    for canonical, names in list(groups.items())[:args.examples]:
+        print(f"  {canonical} ← {', '.join(names)}")
+    
+    index.save()
+    print(f"哈希索引已保存到: {index.index_file}")
+
+if __name__ == "__main__":
+    main()
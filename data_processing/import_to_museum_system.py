@@ -4,16 +4,20 @@ import shutil
 from pathlib import Path
 import argparse
 from tqdm import tqdm
+from collection_io import load_collection
+from image_hashes import ImageHashIndex, image_filename, link_duplicate_images
 
 class MuseumDataImporter:
-    def __init__(self, museum_root_dir):
+    def __init__(self, museum_root_dir, image_index=None):
         """
         初始化导入器
         
         Args:
             museum_root_dir: 博物馆交互系统的根目录
+            image_index: 图片哈希索引（ImageHashIndex），提供时相同的图片只保存一份
         """
         self.museum_root_dir = Path(museum_root_dir)
+        self.image_index = image_index
         
         # 确认系统目录
         self.pre_visit_dir = self.museum_root_dir / "app" / "pre-visit"
@@ -46,13 +50,17 @@ class MuseumDataImporter:
         导入藏品数据到系统
         
         Args:
-            artifacts_json_file: 处理后的藏品JSON文件路径
+            artifacts_json_file: 处理后的藏品文件路径（JSON或Parquet/Arrow中间文件）
         """
         print(f"开始导入藏品数据: {artifacts_json_file}")
         
-        # 读取藏品数据
-        with open(artifacts_json_file, 'r', encoding='utf-8') as f:
-            artifacts_data = json.load(f)
+        # 读取藏品数据，导入到系统时统一输出为JSON
+        artifacts_data = load_collection(artifacts_json_file, "artifacts")
+        
+        # 使用相同图片的藏品指向同一个图片文件
+        if self.image_index is not None:
+            linked = link_duplicate_images(artifacts_data["artifacts"], self.image_index)
+            print(f"{linked} 件藏品的图片与其他藏品相同，已指向同一个图片文件")
             
         # 1. 准备藏品数据目录
         artifacts_data_dir = self.public_dir / "data"
@@ -94,13 +102,12 @@ class MuseumDataImporter:
         导入问答题数据到系统
         
         Args:
-            quizzes_json_file: 处理后的问答题JSON文件路径
+            quizzes_json_file: 处理后的问答题文件路径（JSON或Parquet/Arrow中间文件）
         """
         print(f"开始导入问答题数据: {quizzes_json_file}")
         
-        # 读取问答题数据
-        with open(quizzes_json_file, 'r', encoding='utf-8') as f:
-            quizzes_data = json.load(f)
+        # 读取问答题数据，导入到系统时统一输出为JSON
+        quizzes_data = load_collection(quizzes_json_file, "quizzes")
             
         # 准备问答题数据目录
         quizzes_data_dir = self.public_dir / "data"
@@ -128,34 +135,28 @@ class MuseumDataImporter:
         
         # 创建一个映射以跟踪已处理的图片
         image_url_to_filename = {}
+        stored_filenames = set()
         
         print("开始复制藏品图片...")
         for artifact in tqdm(artifacts, desc="复制图片"):
             if not artifact["image"]:
                 continue
                 
-            # 从URL中提取文件名
             image_url = artifact["image"]
             
-            # 使用本地图片路径中的文件名（如果有）
-            if artifact["localImage"] and "/" in artifact["localImage"]:
-                filename = artifact["localImage"].split("/")[-1]
-            else:
-                # 否则从URL中提取文件名
-                if "/" in image_url:
-                    filename = image_url.split("/")[-1]
-                else:
-                    # 如果无法从URL提取文件名，使用藏品ID作为文件名
-                    extension = ".jpg"  # 默认扩展名
-                    filename = f"artifact_{artifact['id']}{extension}"
+            # 优先使用本地图片路径中的文件名，其次从URL中提取
+            filename = image_filename(artifact)
+            if self.image_index is not None:
+                # 不同URL或文件名下的相同图片使用同一个文件
+                filename = self.image_index.canonical(filename)
             
-            # 检查文件名是否已存在于映射中
-            if image_url in image_url_to_filename:
-                # 如果URL已处理过，跳过
+            # 检查URL或图片文件是否已处理过
+            if image_url in image_url_to_filename or filename in stored_filenames:
                 continue
                 
             # 将URL添加到映射
             image_url_to_filename[image_url] = filename
+            stored_filenames.add(filename)
                 
             # 假设现在我们只有URL而没有实际的图片文件
             # 在实际情况中，您需要:
@@ -169,7 +170,7 @@ class MuseumDataImporter:
                     f.write(f"图片占位符: {image_url}\n")
                     f.write("实际部署时，请下载真实图片或复制本地图片")
                     
-        print(f"已处理 {len(image_url_to_filename)} 张图片")
+        print(f"已处理 {len(stored_filenames)} 张图片")
         
     def update_system_config(self, artifacts_data, quizzes_data):
         """
@@ -241,13 +242,15 @@ def main():
     # 解析命令行参数
     parser = argparse.ArgumentParser(description="将处理后的数据导入到博物馆交互系统")
     parser.add_argument("--museum-dir", required=True, help="博物馆交互系统的根目录")
-    parser.add_argument("--artifacts-file", required=True, help="处理后的藏品JSON文件路径")
-    parser.add_argument("--quizzes-file", required=True, help="处理后的问答题JSON文件路径")
+    parser.add_argument("--artifacts-file", required=True, help="处理后的藏品文件路径（JSON/Parquet/Arrow）")
+    parser.add_argument("--quizzes-file", required=True, help="处理后的问答题文件路径（JSON/Parquet/Arrow）")
+    parser.add_argument("--image-index", help="image_hashes.py生成的图片哈希索引，提供时相同的图片只保存一份")
     
     args = parser.parse_args()
     
     # 创建导入器
-    importer = MuseumDataImporter(args.museum_dir)
+    image_index = ImageHashIndex(args.image_index) if args.image_index else None
+    importer = MuseumDataImporter(args.museum_dir, image_index)
     
     # 导入数据
     artifacts_data = importer.import_artifacts(args.artifacts_file)
@@ -0,0 +1,179 @@
+import json
+import shutil
+import time
+import uuid
+from pathlib import Path
+
+from llm_metrics import track_llm_call
+from stream_io import iter_ndjson, write_ndjson
+
+CHAT_COMPLETIONS_ENDPOINT = "/v1/chat/completions"
+
+# 批量任务的结束状态
+FINISHED_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+def build_chat_request(custom_id, model, prompt, temperature, **kwargs):
+    """构建批量请求文件中的一行（OpenAI Batch API格式）"""
+    body = {
+        "model": model,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": temperature,
+        **kwargs
+    }
+    return {"custom_id": str(custom_id), "method": "POST", "url": CHAT_COMPLETIONS_ENDPOINT, "body": body}
+
+class OpenAIBatchBackend:
+    """
+    使用OpenAI Batch API执行批量任务
+    
+    任务异步执行，通常在24小时内完成，费用约为逐条调用的一半。需要openai>=1.18。
+    """
+    
+    def __init__(self, client):
+        if not hasattr(client, "batches"):
+            raise RuntimeError("当前openai库不支持Batch API，请升级: pip install 'openai>=1.18'")
+        self.client = client
+    
+    def submit(self, requests_file):
+        """上传请求文件并创建批量任务，返回任务ID"""
+        with open(requests_file, 'rb') as f:
+            batch_file = self.client.files.create(file=f, purpose="batch")
+        job = self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint=CHAT_COMPLETIONS_ENDPOINT,
+            completion_window="24h"
+        )
+        return job.id
+    
+    def status(self, job_id):
+        """返回任务状态"""
+        return self.client.batches.retrieve(job_id).status
+    
+    def download(self, job_id, results_file):
+        """下载任务结果（包括失败请求的错误信息）到results_file"""
+        job = self.client.batches.retrieve(job_id)
+        with open(results_file, 'w', encoding='utf-8') as f:
+            for file_id in (job.output_file_id, job.error_file_id):
+                if file_id:
+                    f.write(self.client.files.content(file_id).text)
+
+class LocalBatchBackend:
+    """
+    基于本地文件的批量任务后端，用于测试和本地OpenAI兼容服务
+    
+    任务保存在job_dir/<任务ID>/目录下，第一次查询状态时用client逐条执行请求，
+    结果文件格式与OpenAI Batch API相同。
+    """
+    
+    def __init__(self, job_dir, client):
+        self.job_dir = Path(job_dir)
+        self.client = client
+    
+    def _job_path(self, job_id):
+        return self.job_dir / job_id
+    
+    def _set_status(self, job_id, status):
+        with open(self._job_path(job_id) / "status.json", 'w', encoding='utf-8') as f:
+            json.dump({"id": job_id, "status": status}, f)
+    
+    def submit(self, requests_file):
+        job_id = f"local_batch_{uuid.uuid4().hex[:12]}"
+        job_path = self._job_path(job_id)
+        job_path.mkdir(parents=True)
+        shutil.copy(requests_file, job_path / "input.jsonl")
+        self._set_status(job_id, "validating")
+        return job_id
+    
+    def _run(self, job_id):
+        """逐条执行请求并写入结果文件"""
+        job_path = self._job_path(job_id)
+        self._set_status(job_id, "in_progress")
+        
+        def results():
+            for request in iter_ndjson(job_path / "input.jsonl"):
+                line = {"id": f"batch_req_{uuid.uuid4().hex[:12]}", "custom_id": request["custom_id"]}
+                try:
+                    with track_llm_call("batch-local", request["body"]["model"]) as call:
+                        response = self.client.chat.completions.create(**request["body"])
+                        call.set_usage(response.usage)
+                    line["response"] = {"status_code": 200, "body": response.model_dump()}
+                    line["error"] = None
+                except Exception as e:
+                    line["response"] = None
+                    line["error"] = {"code": type(e).__name__, "message": str(e)}
+                yield line
+        
+        write_ndjson(results(), job_path / "output.jsonl")
+        self._set_status(job_id, "completed")
+    
+    def status(self, job_id):
+        with open(self._job_path(job_id) / "status.json", 'r', encoding='utf-8') as f:
+            status = json.load(f)["status"]
+        if status not in FINISHED_STATUSES:
+            self._run(job_id)
+            status = "completed"
+        return status
+    
+    def download(self, job_id, results_file):
+        shutil.copy(self._job_path(job_id) / "output.jsonl", results_file)
+
+def run_batch_job(backend, requests_file, results_file, poll_interval=30):
+    """
+    提交批量任务并轮询直到结束，结果下载到results_file
+    
+    Raises:
+        RuntimeError: 任务失败、过期或被取消
+    """
+    job_id = backend.submit(requests_file)
+    print(f"已提交批量任务: {job_id}")
+    
+    while True:
+        status = backend.status(job_id)
+        if status in FINISHED_STATUSES:
+            break
+        print(f"批量任务 {job_id} 状态: {status}，{poll_interval} 秒后再次查询")
+        time.sleep(poll_interval)
+    
+    if status != "completed":
+        raise RuntimeError(f"批量任务 {job_id} 未完成，状态: {status}")
+    
+    backend.download(job_id, results_file)
+    print(f"批量任务 {job_id} 已完成，结果保存到: {results_file}")
+    return job_id
+
+def read_batch_results(results_file):
+    """
+    读取批量任务结果
+    
+    Returns:
+        {custom_id: (响应文本, 错误信息)}，成功时错误信息为None，失败时响应文本为None
+    """
+    results = {}
+    for line in iter_ndjson(results_file):
+        response = line.get("response") or {}
+        if response.get("status_code") == 200:
+            content = response["body"]["choices"][0]["message"]["content"]
+            results[line["custom_id"]] = (content, None)
+        else:
+            error = line.get("error") or response.get("body", {}).get("error")
+            results[line["custom_id"]] = (None, str(error))
+    return results
+
+def write_batch_requests(requests, requests_file):
+    """写入批量请求文件，返回请求数"""
+    Path(requests_file).parent.mkdir(parents=True, exist_ok=True)
+    return write_ndjson(requests, requests_file)
+
+def add_batch_job_arguments(parser):
+    """为命令行添加批量任务相关参数"""
+    parser.add_argument("--batch-job", action="store_true", help="以离线批量任务方式调用大模型，而不是逐条调用")
+    parser.add_argument("--batch-backend", choices=["openai", "local"], default="openai",
+                        help="批量任务后端：openai为OpenAI Batch API，local为本地逐条执行（用于测试）")
+    parser.add_argument("--batch-dir", help="批量请求和结果文件的保存目录")
+    parser.add_argument("--poll-interval", type=float, default=30, help="查询批量任务状态的间隔（秒）")
+
+def backend_from_args(args, client, batch_dir):
+    """根据命令行参数创建批量任务后端"""
+    if args.batch_backend == "local":
+        return LocalBatchBackend(Path(batch_dir) / "jobs", client)
+    return OpenAIBatchBackend(client)
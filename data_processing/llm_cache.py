@@ -0,0 +1,195 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from llm_metrics import failure_reason, track_llm_call
+
+# 默认缓存文件位置，可通过环境变量LLM_CACHE_PATH修改
+DEFAULT_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".cache/llm_responses.sqlite3")
+
+class LLMResponseCache:
+    """
+    基于SQLite的大模型响应缓存
+    
+    以模型、温度、提示词（及response_format等额外参数）的哈希为键保存响应文本，
+    相同的请求再次运行时直接返回缓存结果，不再调用API。
+    """
+    
+    def __init__(self, db_path=DEFAULT_CACHE_PATH, ttl=None, max_entries=None):
+        """
+        初始化缓存
+        
+        Args:
+            db_path: SQLite数据库文件路径
+            ttl: 缓存有效期（秒），为None时永不过期
+            max_entries: 最多保存的条目数，超出时淘汰最久未使用的条目
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON responses (last_used_at)")
+        self._conn.commit()
+    
+    @staticmethod
+    def make_key(model, temperature, prompt, extra=None):
+        """计算缓存键：模型、温度、提示词和额外参数的SHA-256哈希"""
+        payload = json.dumps(
+            {"model": model, "temperature": temperature, "prompt": prompt, "extra": extra},
+            ensure_ascii=False,
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def get(self, model, temperature, prompt, extra=None):
+        """查找缓存的响应文本，未命中或已过期时返回None"""
+        key = self.make_key(model, temperature, prompt, extra)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.ttl is not None and now - row[1] > self.ttl):
+                self.misses += 1
+                return None
+            
+            self._conn.execute("UPDATE responses SET last_used_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+    
+    def set(self, model, temperature, prompt, response, extra=None):
+        """保存响应文本，必要时淘汰最久未使用的条目"""
+        key = self.make_key(model, temperature, prompt, extra)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created_at, last_used_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now)
+            )
+            if self.max_entries is not None:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM responses ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+            self._conn.commit()
+    
+    def purge_expired(self):
+        """删除所有过期条目，返回删除的条目数"""
+        if self.ttl is None:
+            return 0
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,))
+            self._conn.commit()
+            return cursor.rowcount
+    
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+    
+    def summary(self):
+        """返回缓存命中情况的简短说明"""
+        return f"LLM缓存命中 {self.hits} 次，未命中 {self.misses} 次"
+
+def check_response(call, validate, result_text):
+    """用validate检查响应文本，不合格时记为本次调用的失败原因并返回False"""
+    if validate is None:
+        return True
+    try:
+        validate(result_text)
+    except Exception as e:
+        call.status = failure_reason(e)
+        call.error = str(e)[:200]
+        return False
+    return True
+
+def cached_chat_completion(client, cache, model, prompt, temperature, validate=None, pipeline=None, **kwargs):
+    """
+    调用chat completions接口并返回响应文本，优先使用缓存
+    
+    kwargs中的额外参数（如response_format）会参与缓存键的计算。
+    提供validate时，只有validate(响应文本)不抛出异常的响应才会写入缓存，
+    避免把无法解析的响应缓存下来；不合格的响应仍然返回给调用方，由调用方记录原始文本并处理解析错误。
+    每次实际的API调用都会以pipeline为标签记录到 llm_metrics.default_metrics。
+    """
+    extra = kwargs or None
+    if cache is not None:
+        cached = cache.get(model, temperature, prompt, extra)
+        if cached is not None:
+            return cached
+    
+    with track_llm_call(pipeline, model) as call:
+        response = client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature,
+            **kwargs
+        )
+        call.set_usage(response.usage)
+        result_text = response.choices[0].message.content
+        valid = check_response(call, validate, result_text)
+    
+    if cache is not None and valid:
+        cache.set(model, temperature, prompt, result_text, extra)
+    return result_text
+
+async def cached_chat_completion_async(client, cache, model, prompt, temperature, validate=None, pipeline=None,
+                                       **kwargs):
+    """cached_chat_completion 的异步版本，client为openai.AsyncOpenAI"""
+    extra = kwargs or None
+    if cache is not None:
+        cached = cache.get(model, temperature, prompt, extra)
+        if cached is not None:
+            return cached
+    
+    with track_llm_call(pipeline, model) as call:
+        response = await client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature,
+            **kwargs
+        )
+        call.set_usage(response.usage)
+        result_text = response.choices[0].message.content
+        valid = check_response(call, validate, result_text)
+    
+    if cache is not None and valid:
+        cache.set(model, temperature, prompt, result_text, extra)
+    return result_text
+
+def add_cache_arguments(parser):
+    """为命令行添加缓存相关参数"""
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="LLM响应缓存文件路径")
+    parser.add_argument("--no-cache", action="store_true", help="不使用LLM响应缓存")
+    parser.add_argument("--cache-ttl", type=float, help="缓存有效期（秒），默认永不过期")
+    parser.add_argument("--cache-max-entries", type=int, help="缓存最多保存的条目数")
+
+def cache_from_args(args):
+    """根据命令行参数创建缓存，--no-cache时返回None"""
+    if args.no_cache:
+        return None
+    return LLMResponseCache(args.cache, ttl=args.cache_ttl, max_entries=args.cache_max_entries)
@@ -0,0 +1,249 @@
+import contextvars
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# 延迟直方图的分桶上限（秒）
+LATENCY_BUCKETS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+# 各模型每百万token的价格（美元）：(输入, 输出)，用于估算费用
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+
+# 会被openai客户端自动重试的HTTP状态码
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+# 当前正在进行的调用，HTTP层的响应钩子据此统计重试次数
+_current_call = contextvars.ContextVar("llm_current_call", default=None)
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    """按模型价格估算一次调用的费用（美元），未知模型返回0"""
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+def failure_reason(error):
+    """将异常归类为简短的失败原因"""
+    if isinstance(error, (json.JSONDecodeError, ValueError, KeyError)):
+        return "invalid_response"
+    return type(error).__name__
+
+class LLMCall:
+    """一次大模型调用的记录"""
+    
+    def __init__(self, pipeline, model):
+        self.pipeline = pipeline
+        self.model = model
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.retries = 0
+        self.status = "ok"
+        self.error = None
+        self.started_at = time.time()
+        self.latency = 0.0
+    
+    def set_usage(self, usage):
+        """记录响应中的token用量"""
+        if usage is not None:
+            self.prompt_tokens = usage.prompt_tokens or 0
+            self.completion_tokens = usage.completion_tokens or 0
+    
+    def to_dict(self):
+        return {
+            "startedAt": round(self.started_at, 3),
+            "pipeline": self.pipeline,
+            "model": self.model,
+            "latencySeconds": round(self.latency, 4),
+            "promptTokens": self.prompt_tokens,
+            "completionTokens": self.completion_tokens,
+            "costUsd": round(estimate_cost(self.model, self.prompt_tokens, self.completion_tokens), 6),
+            "retries": self.retries,
+            "status": self.status,
+            "error": self.error,
+        }
+
+class LLMMetrics:
+    """
+    大模型调用指标收集器（线程安全）
+    
+    按（流程, 模型）汇总调用次数、延迟直方图、token用量、估算费用、重试次数和失败原因，
+    可以导出为JSON或Prometheus文本格式。
+    """
+    
+    def __init__(self, keep_calls=True):
+        """
+        Args:
+            keep_calls: 是否保存每次调用的明细
+        """
+        self.keep_calls = keep_calls
+        self.calls = []
+        self.aggregates = {}
+        self._lock = threading.Lock()
+    
+    def _aggregate(self, pipeline, model):
+        key = (pipeline, model)
+        if key not in self.aggregates:
+            self.aggregates[key] = {
+                "calls": 0,
+                "failures": {},
+                "retries": 0,
+                "promptTokens": 0,
+                "completionTokens": 0,
+                "costUsd": 0.0,
+                "latencySum": 0.0,
+                "latencyBuckets": [0] * len(LATENCY_BUCKETS),
+            }
+        return self.aggregates[key]
+    
+    def record(self, call):
+        """记录一次调用"""
+        with self._lock:
+            if self.keep_calls:
+                self.calls.append(call)
+            aggregate = self._aggregate(call.pipeline, call.model)
+            aggregate["calls"] += 1
+            aggregate["retries"] += call.retries
+            aggregate["promptTokens"] += call.prompt_tokens
+            aggregate["completionTokens"] += call.completion_tokens
+            aggregate["costUsd"] += estimate_cost(call.model, call.prompt_tokens, call.completion_tokens)
+            aggregate["latencySum"] += call.latency
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if call.latency <= bound:
+                    aggregate["latencyBuckets"][i] += 1
+            if call.status != "ok":
+                aggregate["failures"][call.status] = aggregate["failures"].get(call.status, 0) + 1
+    
+    def to_json(self):
+        """返回可以直接json.dump的指标数据"""
+        with self._lock:
+            aggregates = [
+                {
+                    "pipeline": pipeline,
+                    "model": model,
+                    "calls": data["calls"],
+                    "failures": dict(data["failures"]),
+                    "retries": data["retries"],
+                    "promptTokens": data["promptTokens"],
+                    "completionTokens": data["completionTokens"],
+                    "costUsd": round(data["costUsd"], 6),
+                    "latencySumSeconds": round(data["latencySum"], 4),
+                    "latencyHistogram": {
+                        str(bound): count for bound, count in zip(LATENCY_BUCKETS, data["latencyBuckets"])
+                    },
+                }
+                for (pipeline, model), data in self.aggregates.items()
+            ]
+            calls = [call.to_dict() for call in self.calls]
+        return {"aggregates": aggregates, "calls": calls}
+    
+    def to_prometheus(self):
+        """返回Prometheus文本格式的指标"""
+        lines = [
+            "# HELP llm_calls_total Number of LLM API calls.",
+            "# TYPE llm_calls_total counter",
+        ]
+        histogram, tokens, cost, retries, failures = [], [], [], [], []
+        with self._lock:
+            for (pipeline, model), data in self.aggregates.items():
+                labels = f'pipeline="{pipeline}",model="{model}"'
+                lines.append(f"llm_calls_total{{{labels}}} {data['calls']}")
+                for bound, count in zip(LATENCY_BUCKETS, data["latencyBuckets"]):
+                    histogram.append(f'llm_call_latency_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                histogram.append(f'llm_call_latency_seconds_bucket{{{labels},le="+Inf"}} {data["calls"]}')
+                histogram.append(f"llm_call_latency_seconds_sum{{{labels}}} {data['latencySum']:.6f}")
+                histogram.append(f"llm_call_latency_seconds_count{{{labels}}} {data['calls']}")
+                tokens.append(f'llm_tokens_total{{{labels},type="prompt"}} {data["promptTokens"]}')
+                tokens.append(f'llm_tokens_total{{{labels},type="completion"}} {data["completionTokens"]}')
+                cost.append(f"llm_estimated_cost_usd_total{{{labels}}} {data['costUsd']:.6f}")
+                retries.append(f"llm_retries_total{{{labels}}} {data['retries']}")
+                for reason, count in data["failures"].items():
+                    failures.append(f'llm_failures_total{{{labels},reason="{reason}"}} {count}')
+        
+        lines += ["# HELP llm_call_latency_seconds LLM API call latency.", "# TYPE llm_call_latency_seconds histogram"]
+        lines += histogram
+        lines += ["# HELP llm_tokens_total Tokens used by LLM API calls.", "# TYPE llm_tokens_total counter"]
+        lines += tokens
+        lines += ["# HELP llm_estimated_cost_usd_total Estimated LLM cost in USD.", "# TYPE llm_estimated_cost_usd_total counter"]
+        lines += cost
+        lines += ["# HELP llm_retries_total HTTP retries made by the OpenAI client.", "# TYPE llm_retries_total counter"]
+        lines += retries
+        lines += ["# HELP llm_failures_total Failed LLM API calls by reason.", "# TYPE llm_failures_total counter"]
+        lines += failures
+        return "\n".join(lines) + "\n"
+    
+    def summary(self):
+        """返回调用情况的简短说明"""
+        with self._lock:
+            calls = sum(data["calls"] for data in self.aggregates.values())
+            if not calls:
+                return "本次运行没有调用大模型API"
+            latency = sum(data["latencySum"] for data in self.aggregates.values())
+            tokens = sum(data["promptTokens"] + data["completionTokens"] for data in self.aggregates.values())
+            cost = sum(data["costUsd"] for data in self.aggregates.values())
+            retries = sum(data["retries"] for data in self.aggregates.values())
+            failures = sum(sum(data["failures"].values()) for data in self.aggregates.values())
+        return (
+            f"大模型调用 {calls} 次，平均延迟 {latency / calls:.2f} 秒，共 {tokens} 个token，"
+            f"估算费用 ${cost:.4f}，重试 {retries} 次，失败 {failures} 次"
+        )
+
+# 进程内默认的指标收集器，cached_chat_completion的每次API调用都会记录到这里
+default_metrics = LLMMetrics()
+
+@contextmanager
+def track_llm_call(pipeline, model, metrics=None):
+    """
+    统计一次大模型调用，用法：
+        
+        with track_llm_call("quiz", model) as call:
+            response = client.chat.completions.create(...)
+            call.set_usage(response.usage)
+    
+    代码块抛出的异常会记录为失败原因后继续向外抛出。
+    """
+    call = LLMCall(pipeline or "unknown", model)
+    token = _current_call.set(call)
+    start = time.perf_counter()
+    try:
+        yield call
+    except Exception as e:
+        call.status = failure_reason(e)
+        call.error = str(e)[:200]
+        # 最后一次错误响应之后不再重试
+        if getattr(e, "status_code", None) and call.retries:
+            call.retries -= 1
+        raise
+    finally:
+        call.latency = time.perf_counter() - start
+        _current_call.reset(token)
+        (metrics or default_metrics).record(call)
+
+def note_http_response(response):
+    """HTTP响应钩子：调用进行中收到可重试的错误响应时，记为一次重试"""
+    call = _current_call.get()
+    if call is not None and (response.status_code in RETRYABLE_STATUS_CODES or response.status_code >= 500):
+        call.retries += 1
+
+async def note_http_response_async(response):
+    """note_http_response 的异步版本，用于httpx.AsyncClient"""
+    note_http_response(response)
+
+def add_metrics_arguments(parser):
+    """为命令行添加指标导出参数"""
+    parser.add_argument("--metrics-json", help="将大模型调用指标（含每次调用明细）导出为JSON文件")
+    parser.add_argument("--metrics-prom", help="将大模型调用指标导出为Prometheus文本格式文件")
+
+def export_metrics_from_args(args, metrics=None):
+    """根据命令行参数导出指标并打印汇总"""
+    metrics = metrics or default_metrics
+    if args.metrics_json:
+        with open(args.metrics_json, 'w', encoding='utf-8') as f:
+            json.dump(metrics.to_json(), f, ensure_ascii=False, indent=2)
+        print(f"大模型调用指标已保存到: {args.metrics_json}")
+    if args.metrics_prom:
+        with open(args.metrics_prom, 'w', encoding='utf-8') as f:
+            f.write(metrics.to_prometheus())
+        print(f"Prometheus指标已保存到: {args.metrics_prom}")
+    print(metrics.summary())
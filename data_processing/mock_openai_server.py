@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 批量提示词中藏品编号的格式，见 quiz_prompts.build_batch_quiz_prompt
+BATCH_ARTIFACT_PATTERN = re.compile(r"【藏品 ([^】]+)】")
+
+# 生肖分析响应使用的关键词，只取每个生肖最常见的写法
+ZODIAC_HINTS = {
+    'rat': '鼠', 'ox': '牛', 'tiger': '虎', 'rabbit': '兔', 'dragon': '龙', 'snake': '蛇',
+    'horse': '马', 'goat': '羊', 'monkey': '猴', 'rooster': '鸡', 'dog': '狗', 'pig': '猪'
+}
+
+class MockOptions:
+    """
+    模拟服务的行为参数
+    
+    Args:
+        latency: 每个请求的平均延迟（秒）
+        jitter: 延迟的随机波动范围（秒），实际延迟在 latency ± jitter 之间
+        error_rate: 返回500错误的概率
+        rate_limit_rate: 返回429错误的概率
+        retry_after: 429响应中Retry-After头的秒数
+        invalid_rate: 问答题缺少解释的概率，用于测试修复流程
+        seed: 随机数种子，便于复现
+    """
+    
+    def __init__(self, latency=0.2, jitter=0.05, error_rate=0.0, rate_limit_rate=0.0, retry_after=1.0,
+                 invalid_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.invalid_rate = invalid_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "completed": 0, "errors": 0, "rateLimited": 0, "invalidQuizzes": 0, "promptChars": 0}
+    
+    def draw(self):
+        """抽取本次请求的延迟和是否注入错误"""
+        with self.lock:
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+            roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            return delay, 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return delay, 500
+        return delay, 200
+    
+    def draw_invalid(self):
+        """抽取本道问答题是否注入不合格的字段"""
+        with self.lock:
+            invalid = self.random.random() < self.invalid_rate
+            if invalid:
+                self.stats["invalidQuizzes"] += 1
+        return invalid
+    
+    def count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] += amount
+
+def _mock_quiz(artifact_id, invalid=False):
+    return {
+        "question": f"关于藏品{artifact_id}的模拟问题",
+        "options": [{"id": option_id, "text": f"模拟选项{option_id.upper()}"} for option_id in "abcd"],
+        "correctAnswer": "a",
+        "explanation": "" if invalid else "这是模拟服务生成的解释。"
+    }
+
+def mock_completion_content(prompt, response_format=None, options=None):
+    """根据提示词类型（或修复请求的JSON Schema）生成与真实响应结构相同的模拟内容"""
+    options = options or MockOptions()
+    schema = (response_format or {}).get("json_schema", {})
+    if schema.get("name") == "quiz_repair":
+        return {field: _mock_quiz("")[field] for field in schema["schema"]["required"]}
+    
+    artifact_ids = [artifact_id for artifact_id in BATCH_ARTIFACT_PATTERN.findall(prompt) if artifact_id != "ID"]
+    if artifact_ids:
+        return {
+            "results": {
+                artifact_id: {"quizzes": [_mock_quiz(artifact_id, options.draw_invalid())]} for artifact_id in artifact_ids
+            }
+        }
+    
+    if "十二生肖" in prompt:
+        info = prompt.split("藏品信息:", 1)[-1].split("请仅考虑", 1)[0]
+        related = [zodiac for zodiac, hint in ZODIAC_HINTS.items() if hint in info]
+        return {"related_zodiacs": related, "confidence": 0.9 if related else 0.2, "reasoning": "模拟分析结果"}
+    
+    return {"quizzes": [_mock_quiz("", options.draw_invalid())]}
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    """OpenAI兼容接口的模拟实现，支持 /v1/chat/completions、/v1/models 和 /stats"""
+    
+    protocol_version = "HTTP/1.1"
+    options = None
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model", "owned_by": "mock"}]})
+        elif self.path.rstrip("/") == "/stats":
+            with self.options.lock:
+                self._send_json(200, dict(self.options.stats))
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+    
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        
+        options = self.options
+        options.count("requests")
+        delay, status = options.draw()
+        time.sleep(delay)
+        
+        if status == 429:
+            options.count("rateLimited")
+            self._send_json(
+                429,
+                {"error": {"message": "Rate limit reached (mock)", "type": "requests", "code": "rate_limit_exceeded"}},
+                {"Retry-After": str(options.retry_after)}
+            )
+            return
+        if status == 500:
+            options.count("errors")
+            self._send_json(500, {"error": {"message": "Internal server error (mock)", "type": "server_error"}})
+            return
+        
+        prompt = "".join(message.get("content", "") for message in body.get("messages", []))
+        content = json.dumps(
+            mock_completion_content(prompt, body.get("response_format"), options), ensure_ascii=False
+        )
+        options.count("completed")
+        options.count("promptChars", len(prompt))
+        self._send_json(200, {
+            "id": f"chatcmpl-mock-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o-mini"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": len(prompt),
+                "completion_tokens": len(content),
+                "total_tokens": len(prompt) + len(content)
+            }
+        })
+
+def create_mock_server(host="127.0.0.1", port=0, options=None):
+    """创建使用指定行为参数的模拟服务，port为0时自动选择空闲端口"""
+    handler = type("BoundMockOpenAIHandler", (MockOpenAIHandler,), {"options": options or MockOptions()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def start_mock_server(host="127.0.0.1", port=0, options=None):
+    """
+    在后台线程启动模拟服务
+    
+    Returns:
+        (server, base_url)，用完后调用 server.shutdown()
+    """
+    server = create_mock_server(host, port, options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+def main():
+    parser = argparse.ArgumentParser(description="本地OpenAI兼容模拟服务，用于测试和压测AI处理流程")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8000, help="监听端口")
+    parser.add_argument("--latency", type=float, default=0.2, help="每个请求的平均延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.05, help="延迟的随机波动范围（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回500错误的概率")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="返回429错误的概率")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="429响应中Retry-After头的秒数")
+    parser.add_argument("--invalid-rate", type=float, default=0.0, help="问答题缺少解释的概率，用于测试修复流程")
+    parser.add_argument("--seed", type=int, help="随机数种子")
+    
+    args = parser.parse_args()
+    
+    options = MockOptions(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        invalid_rate=args.invalid_rate,
+        seed=args.seed
+    )
+    server = create_mock_server(args.host, args.port, options)
+    print(f"模拟OpenAI服务已启动: http://{args.host}:{args.port}/v1 （使用 OPENAI_BASE_URL 或 --base-url 指向该地址）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("模拟服务已停止")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+import bisect
+import json
+import re
+from collections import Counter
+
+from dimensions import artifact_sizes, format_size_label
+
+# 导出数据中未填写名称的藏品，名称为表头文字
+PLACEHOLDER_NAME = "名称"
+
+# 从描述开头提取的区分特征：3到8个字、以逗号/句号/分号结尾的短语
+_FEATURE_PATTERN = re.compile(r'([^，。；\s]{3,8})[，。；]')
+
+def description_feature(artifact):
+    """从描述的前50个字中提取第一个区分特征，没有时返回空字符串"""
+    description = artifact.get("description") or ""
+    features = _FEATURE_PATTERN.findall(description[:50])
+    return features[0] if features else ""
+
+class NameDeduplicator:
+    """
+    藏品重名修复引擎
+    
+    名称索引只建立一次，之后每次改名都增量更新索引，所有改名记录在审计日志中。
+    修复分为三轮，与依次运行 fix_duplicate_artifacts.py 和 fix_remaining_duplicates.py 的结果相同：
+    
+    1. 占位名称“名称”改为全称；重名藏品（第一件除外）按时期、尺寸或编号区分
+    2. 仍然重名的藏品按描述特征、尺寸、展厅位置或编号区分
+    3. 最后仍然重名的藏品添加“ #编号”
+    
+    每轮开始时确定重名分组，本轮中的改名不影响本轮的分组；分组按第一件藏品在目录中的顺序处理。
+    
+    Args:
+        artifacts: 藏品列表，直接修改其中的name字段
+        verbose: 是否打印每次改名
+        catalog: 可选的CatalogIndex，改名时同步更新
+    """
+    
+    def __init__(self, artifacts, verbose=True, catalog=None):
+        self.artifacts = artifacts
+        self.verbose = verbose
+        self.catalog = catalog
+        self.audit = []
+        self.index = {}
+        self.duplicates = set()
+        for position, artifact in enumerate(artifacts):
+            self._insert(artifact["name"], position)
+    
+    def _insert(self, name, position):
+        positions = self.index.setdefault(name, [])
+        bisect.insort(positions, position)
+        if len(positions) > 1:
+            self.duplicates.add(name)
+    
+    def _remove(self, name, position):
+        positions = self.index[name]
+        positions.remove(position)
+        if len(positions) < 2:
+            self.duplicates.discard(name)
+        if not positions:
+            del self.index[name]
+    
+    def duplicate_groups(self):
+        """
+        返回当前的重名分组
+        
+        Returns:
+            [(名称, [藏品在目录中的位置, ...])]，按每组第一件藏品的位置排序
+        """
+        groups = [(name, list(self.index[name])) for name in self.duplicates]
+        groups.sort(key=lambda group: group[1][0])
+        return groups
+    
+    def rename(self, position, new_name, stage, strategy):
+        """修改藏品名称，更新索引并记录审计日志"""
+        artifact = self.artifacts[position]
+        old_name = artifact["name"]
+        self._remove(old_name, position)
+        if self.catalog is not None:
+            self.catalog.rename_artifact(artifact["id"], new_name)
+        else:
+            artifact["name"] = new_name
+        self._insert(new_name, position)
+        self.audit.append({
+            "id": artifact["id"],
+            "oldName": old_name,
+            "newName": new_name,
+            "stage": stage,
+            "strategy": strategy,
+        })
+        if self.verbose:
+            print(f"修复: ID {artifact['id']} 将'{old_name}'更改为 '{new_name}'")
+    
+    def fix_by_period(self):
+        """第一轮：占位名称改为全称，重名藏品按时期、尺寸或编号区分"""
+        # 分组在修复占位名称之前确定，改为全称的藏品不参与本轮的区分
+        groups = self.duplicate_groups()
+        
+        for position in list(self.index.get(PLACEHOLDER_NAME, [])):
+            full_name = self.artifacts[position].get("fullName")
+            if full_name:
+                self.rename(position, full_name.replace('【', '').replace('】', ''), 1, "fullName")
+        
+        for name, positions in groups:
+            if name == PLACEHOLDER_NAME:
+                continue
+            for i, position in enumerate(positions[1:], start=1):
+                artifact = self.artifacts[position]
+                period = artifact.get("period", "")
+                size_label = format_size_label(artifact_sizes(artifact))
+                
+                if period and period in artifact["name"]:
+                    # 名称中已包含朝代时添加编号
+                    new_name, strategy = f"{artifact['name']}{i+1}", "number"
+                elif period:
+                    new_name, strategy = f"{artifact['name']}（{period}）", "period"
+                elif size_label:
+                    new_name, strategy = f"{artifact['name']}（{size_label}）", "dimension"
+                else:
+                    new_name, strategy = f"{artifact['name']}{i+1}", "number"
+                self.rename(position, new_name, 1, strategy)
+    
+    def fix_by_features(self):
+        """第二轮：仍然重名的藏品按描述特征、尺寸、展厅位置或编号区分"""
+        for name, positions in self.duplicate_groups():
+            for i, position in enumerate(positions[1:], start=1):
+                artifact = self.artifacts[position]
+                location = artifact.get("location", "")
+                
+                unique_info, strategy = description_feature(artifact), "description"
+                if not unique_info:
+                    unique_info, strategy = format_size_label(artifact_sizes(artifact), max_parts=1), "dimension"
+                if not unique_info and location:
+                    unique_info, strategy = (location.split('馆')[-1] if '馆' in location else location), "location"
+                if not unique_info:
+                    unique_info, strategy = f"编号{i+1}", "number"
+                self.rename(position, f"{name}（{unique_info}）", 2, strategy)
+    
+    def fix_by_number(self):
+        """第三轮：最后仍然重名的藏品添加编号"""
+        for name, positions in self.duplicate_groups():
+            for i, position in enumerate(positions[1:], start=1):
+                self.rename(position, f"{name} #{i+1}", 3, "numeric")
+    
+    def run(self):
+        """依次执行三轮修复，返回仍然重名的名称数"""
+        self.fix_by_period()
+        self.fix_by_features()
+        self.fix_by_number()
+        return len(self.duplicates)
+    
+    def summary(self):
+        """返回各修复方式的改名次数"""
+        counts = Counter(entry["strategy"] for entry in self.audit)
+        details = "，".join(f"{strategy} {count} 件" for strategy, count in counts.most_common())
+        return f"共修改 {len(self.audit)} 件藏品的名称" + (f"（{details}）" if details else "")
+    
+    def save_audit(self, path):
+        """将审计日志保存为JSON文件"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"renames": self.audit}, f, ensure_ascii=False, indent=2)
+
+def _trie_pattern(node):
+    """将字典树转换为正则表达式，同一前缀的名称共用分支，可选的后缀贪婪匹配，因此总是匹配最长的名称"""
+    branches = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    return f"(?:{body})?" if "" in node else body
+
+def names_pattern(names):
+    """
+    将一组名称编译为一个正则表达式
+    
+    名称先合并为字典树，共同前缀只比较一次，比逐个尝试每个名称的普通分支快得多。
+    """
+    trie = {}
+    for name in names:
+        node = trie
+        for char in name:
+            node = node.setdefault(char, {})
+        node[""] = {}
+    return re.compile(_trie_pattern(trie))
+
+class NameRewriter:
+    """
+    测验文本中藏品名称引用的批量替换
+    
+    替换范围与原来逐个名称替换时相同：问题中用《》括起、与藏品当前名称不同的名称视为旧名称，
+    问题中的《旧名称》改为《当前名称》，选项和解释中出现的旧名称改为当前名称。
+    旧名称直接从测验文本中得到，因此之前各轮（包括单独运行fix_duplicate_artifacts.py时）的改名都会被更新。
+    
+    问题中的书名号一次扫描全部替换；一道测验有多个旧名称时选项和解释使用一个按前缀合并的正则表达式，
+    每段文本线性扫描一次，每个位置匹配最长的名称，只有一个旧名称时（最常见的情况）直接使用字符串替换。
+    扫描前先将文本中已有的当前名称替换为占位字符，当前名称包含旧名称时
+    （如“青铜鼎”改为“青铜鼎（商）”）不会被重复替换。
+    
+    Args:
+        names: {藏品ID: 当前名称}
+    """
+    
+    # 当前名称的占位字符，不会出现在测验文本中
+    PLACEHOLDER = "\x00"
+    
+    # 问题中用书名号括起的藏品名称
+    BRACKETED_NAME_PATTERN = re.compile(r'《([^》]+)》')
+    
+    def __init__(self, names):
+        self.names = names
+        # 多个旧名称的组合远少于测验数，每种组合只编译一次
+        self._patterns = {}
+    
+    def _rename(self, name, old_names):
+        """返回 (当前名称, 唯一的旧名称或正则表达式的替换字符串, 正则表达式或None)"""
+        if len(old_names) == 1:
+            return name, next(iter(old_names)), None
+        if old_names not in self._patterns:
+            self._patterns[old_names] = names_pattern(old_names)
+        # 替换字符串中的反斜杠需要转义
+        return name, name.replace("\\", "\\\\"), self._patterns[old_names]
+    
+    def _rewrite(self, text, rename):
+        name, target, pattern = rename
+        if not text or (pattern is None and target not in text):
+            return text, 0
+        protected = name in text
+        if protected:
+            text = text.replace(name, self.PLACEHOLDER)
+        if pattern is None:
+            count = text.count(target)
+            text = text.replace(target, name)
+        else:
+            text, count = pattern.subn(target, text)
+        if protected:
+            text = text.replace(self.PLACEHOLDER, name)
+        return text, count
+    
+    def rewrite_quiz(self, quiz):
+        """替换测验的问题、选项和解释中的旧名称，直接修改quiz，返回替换的处数"""
+        name = self.names.get(quiz.get("artifactId"))
+        question = quiz.get("question") or ""
+        if name is None or "《" not in question:
+            return 0
+        old_names = frozenset(
+            old_name for old_name in self.BRACKETED_NAME_PATTERN.findall(question) if old_name != name
+        )
+        if not old_names:
+            return 0
+        
+        quiz["question"], count = self.BRACKETED_NAME_PATTERN.subn(f"《{name}》".replace("\\", "\\\\"), question)
+        # 本来就是当前名称的书名号不计入替换处数
+        count -= question.count(f"《{name}》")
+        
+        rename = self._rename(name, old_names)
+        for option in quiz.get("options", []):
+            option["text"], option_count = self._rewrite(option.get("text"), rename)
+            count += option_count
+        if "explanation" in quiz:
+            quiz["explanation"], explanation_count = self._rewrite(quiz["explanation"], rename)
+            count += explanation_count
+        return count
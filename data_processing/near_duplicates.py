@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import re
+import time
+from collections import defaultdict
+
+import numpy as np
+from tqdm import tqdm
+
+from collection_io import load_collection
+
+# 参与比较的字段及其编号，不同字段的片段互不相同
+SHINGLE_FIELDS = ("name", "description", "dimensions")
+
+# 小于2^32的最大素数，MinHash的哈希函数为 (a*x + b) mod PRIME
+PRIME = np.uint64(4294967291)
+
+# 乘以该常数后取高32位，将n-gram的编码打散到32位
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+# 比较前去掉空白和常见标点，避免“，”和“,”之类的差异影响相似度
+_IGNORED_PATTERN = re.compile(r"[\s，。、；：！？“”‘’（）《》【】,.;:!?()\[\]\"'·-]")
+
+# 每个字符的Unicode码位最多21位，n-gram编码为一个64位整数，因此n最大为3
+MAX_NGRAM = 3
+
+def normalize_text(text):
+    return _IGNORED_PATTERN.sub("", str(text or ""))
+
+def shingle_hashes(artifact, ngram=2):
+    """
+    将藏品的名称、描述和尺寸切分为字符n-gram，返回去重后的32位哈希值
+    
+    中文没有空格分词，相邻的2~3个字作为片段效果较好；短于n的字段整体作为一个片段。
+    """
+    values = []
+    for field_number, field in enumerate(SHINGLE_FIELDS):
+        text = normalize_text(artifact.get(field))
+        if not text:
+            continue
+        codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        width = min(ngram, len(codes))
+        count = len(codes) - width + 1
+        encoded = np.zeros(count, dtype=np.uint64)
+        for offset in range(width):
+            encoded = (encoded << np.uint64(21)) | codes[offset:offset + count]
+        # 加上字段编号后打散，名称和描述中相同的片段视为不同的片段
+        values.append(((encoded * np.uint64(MAX_NGRAM + 1) + np.uint64(field_number)) * _MIX) >> np.uint64(32))
+    if not values:
+        return np.zeros(0, dtype=np.uint64)
+    return np.unique(np.concatenate(values) % PRIME)
+
+class MinHasher:
+    """
+    MinHash签名计算器
+    
+    两个片段集合的签名中相同位置取值相等的比例是其Jaccard相似度的无偏估计。
+    
+    Args:
+        num_perm: 签名长度（哈希函数个数），越大估计越准确
+        seed: 生成哈希函数参数的随机数种子
+    """
+    
+    def __init__(self, num_perm=128, seed=1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.a = rng.randint(1, int(PRIME), size=num_perm, dtype=np.uint64)[:, None]
+        self.b = rng.randint(0, int(PRIME), size=num_perm, dtype=np.uint64)[:, None]
+    
+    def signature(self, hashes):
+        """返回片段哈希集合的MinHash签名，a、x都小于2^32，乘积不会溢出"""
+        return ((self.a * hashes.astype(np.uint64)[None, :] + self.b) % PRIME).min(axis=1).astype(np.uint32)
+
+def jaccard(hashes_a, hashes_b):
+    """两个已排序去重的片段哈希数组的Jaccard相似度"""
+    intersection = len(np.intersect1d(hashes_a, hashes_b, assume_unique=True))
+    return intersection / (len(hashes_a) + len(hashes_b) - intersection)
+
+def lsh_params(num_perm, threshold):
+    """
+    选择LSH的分段数和每段行数
+    
+    签名分为bands段、每段rows行，任意一段完全相同的两件藏品成为候选对。
+    相似度为s的两件藏品成为候选的概率为 1-(1-s^rows)^bands，在 (1/bands)^(1/rows) 附近陡增，
+    选择该拐点最接近且不高于阈值的参数，宁可多一些候选对也不漏掉相似的藏品。
+    
+    Returns:
+        (bands, rows)
+    """
+    options = [(num_perm // rows, rows) for rows in range(1, num_perm + 1) if num_perm % rows == 0]
+    below = [option for option in options if (1 / option[0]) ** (1 / option[1]) <= threshold]
+    return min(below or options, key=lambda option: abs(threshold - (1 / option[0]) ** (1 / option[1])))
+
+class _UnionFind:
+    def __init__(self, size):
+        self.parent = list(range(size))
+    
+    def find(self, i):
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+    
+    def union(self, i, j):
+        root_i, root_j = self.find(i), self.find(j)
+        if root_i != root_j:
+            self.parent[max(root_i, root_j)] = min(root_i, root_j)
+
+def find_near_duplicates(artifacts, threshold=0.8, num_perm=128, ngram=2, seed=1):
+    """
+    用MinHash和LSH分段查找近似重复的藏品
+    
+    只比较LSH分段相同的候选对，不需要两两比较全部藏品；候选对再用片段集合计算精确的Jaccard相似度，
+    报告的相似度不受MinHash估计误差影响。签名完全相同的藏品先合并为一组，只用其中一件参与分段，
+    避免大量相同文本产生平方级的候选对。
+    
+    Args:
+        artifacts: 藏品列表
+        threshold: Jaccard相似度不低于该值的两件藏品视为近似重复
+        num_perm: MinHash签名长度
+        ngram: 字符n-gram的长度（1~3）
+        seed: MinHash哈希函数的随机数种子
+    
+    Returns:
+        (聚类列表, 统计信息)。每个聚类为 {"ids", "names", "pairs": [{"ids": [a, b], "similarity"}]}，
+        按藏品数从多到少排列
+    """
+    if not 1 <= ngram <= MAX_NGRAM:
+        raise ValueError(f"ngram必须在1到{MAX_NGRAM}之间")
+    minhasher = MinHasher(num_perm, seed)
+    bands, rows = lsh_params(num_perm, threshold)
+    
+    # 计算签名，没有任何文本的藏品不参与比较；片段哈希以32位保存，用于验证候选对
+    positions = []
+    shingles = []
+    signatures = []
+    for position, artifact in enumerate(tqdm(artifacts, desc="计算MinHash签名")):
+        hashes = shingle_hashes(artifact, ngram)
+        if len(hashes):
+            positions.append(position)
+            shingles.append(hashes.astype(np.uint32))
+            signatures.append(minhasher.signature(hashes))
+    signatures = np.array(signatures, dtype=np.uint32).reshape(len(signatures), num_perm)
+    
+    # 签名完全相同的藏品合并，只用第一件参与分段
+    pairs = {}
+    representatives = {}
+    for row, signature in enumerate(signatures):
+        key = signature.tobytes()
+        if key in representatives:
+            similarity = jaccard(shingles[representatives[key]], shingles[row])
+            if similarity >= threshold:
+                pairs[(representatives[key], row)] = similarity
+        else:
+            representatives[key] = row
+    unique_rows = np.array(sorted(representatives.values()), dtype=np.int64)
+    
+    # LSH分段：任意一段相同的藏品成为候选对
+    candidates = set()
+    for band in range(bands):
+        buckets = defaultdict(list)
+        band_values = signatures[unique_rows, band * rows:(band + 1) * rows]
+        for row, values in zip(unique_rows, band_values):
+            buckets[values.tobytes()].append(row)
+        for members in buckets.values():
+            for i in range(len(members)):
+                for j in range(i + 1, len(members)):
+                    candidates.add((members[i], members[j]))
+    
+    # 用片段集合计算候选对的精确相似度
+    for i, j in sorted(candidates):
+        similarity = jaccard(shingles[i], shingles[j])
+        if similarity >= threshold:
+            pairs[(i, j)] = similarity
+    
+    # 相似的藏品对连成聚类
+    union_find = _UnionFind(len(signatures))
+    for i, j in pairs:
+        union_find.union(i, j)
+    cluster_pairs = defaultdict(list)
+    for (i, j), similarity in pairs.items():
+        cluster_pairs[union_find.find(i)].append((i, j, similarity))
+    
+    clusters = []
+    for members_pairs in cluster_pairs.values():
+        rows_in_cluster = sorted({row for i, j, _ in members_pairs for row in (i, j)})
+        members = [artifacts[positions[row]] for row in rows_in_cluster]
+        clusters.append({
+            "ids": [artifact["id"] for artifact in members],
+            "names": [artifact["name"] for artifact in members],
+            "pairs": [
+                {"ids": [artifacts[positions[i]]["id"], artifacts[positions[j]]["id"]], "similarity": round(similarity, 4)}
+                for i, j, similarity in sorted(members_pairs, key=lambda pair: -pair[2])
+            ],
+        })
+    clusters.sort(key=lambda cluster: (-len(cluster["ids"]), -cluster["pairs"][0]["similarity"]))
+    
+    stats = {
+        "artifacts": len(artifacts),
+        "compared": len(signatures),
+        "bands": bands,
+        "rows": rows,
+        "candidatePairs": len(candidates),
+        "similarPairs": len(pairs),
+        "clusters": len(clusters),
+    }
+    return clusters, stats
+
+def main():
+    parser = argparse.ArgumentParser(description="用MinHash/LSH查找名称或描述略有不同的重复藏品")
+    parser.add_argument("--input", default="cleaned_data/artifacts.json", help="藏品文件路径（JSON/NDJSON/Parquet/Arrow）")
+    parser.add_argument("--output", help="将聚类结果保存为JSON文件")
+    parser.add_argument("--threshold", type=float, default=0.8, help="视为近似重复的最低Jaccard相似度")
+    parser.add_argument("--num-perm", type=int, default=128, help="MinHash签名长度")
+    parser.add_argument("--ngram", type=int, default=2, help="字符n-gram的长度（1~3）")
+    parser.add_argument("--examples", type=int, default=10, help="打印的聚类数量")
+    args = parser.parse_args()
+    
+    artifacts = load_collection(args.input, "artifacts")["artifacts"]
+    print(f"已读取 {len(artifacts)} 件藏品: {args.input}")
+    
+    start = time.perf_counter()
+    clusters, stats = find_near_duplicates(artifacts, args.threshold, args.num_perm, args.ngram)
+    elapsed = time.perf_counter() - start
+    
+    print(f"LSH参数: {stats['bands']} 段 × {stats['rows']} 行，候选对 {stats['candidatePairs']} 个，"
+          f"相似度不低于 {args.threshold} 的藏品对 {stats['similarPairs']} 个")
+    print(f"找到 {len(clusters)} 组近似重复的藏品，耗时 {elapsed:.2f} 秒")
+    for i, cluster in enumerate(clusters[:args.examples]):
+        print(f"  {i+1}. 相似度 {cluster['pairs'][0]['similarity']:.2f}: "
+              + "、".join(f"{name}（ID {artifact_id}）" for artifact_id, name in zip(cluster["ids"], cluster["names"])))
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"threshold": args.threshold, "stats": stats, "clusters": clusters}, f, ensure_ascii=False, indent=2)
+        print(f"聚类结果已保存到: {args.output}")
+
+if __name__ == "__main__":
+    main()
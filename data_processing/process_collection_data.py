@@ -1,16 +1,34 @@
 import pandas as pd
 import json
+import hashlib
 import re
 import os
 import argparse
+import glob
+import itertools
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from tqdm import tqdm
-import openai
 from dotenv import load_dotenv
-import ssl
-import certifi
-import httpx
-import random
+from stream_io import iter_records, write_records
+from dimensions import SIZE_FIELDS, parse_dimensions, build_size_index, save_size_index
+from collection_io import FORMAT_SUFFIXES, load_collection, save_collection
+from quiz_prompts import (
+    QUIZ_MODEL, QUIZ_TEMPERATURE, QUIZ_RESPONSE_FORMAT, QUIZ_BATCH_RESPONSE_FORMAT,
+    build_quiz_prompt, parse_quiz_response, build_batch_quiz_prompt, parse_batch_quiz_response,
+    quiz_problems, repair_fields, build_quiz_repair_prompt, quiz_repair_response_format, apply_quiz_repair
+)
+from async_quiz_generator import generate_quiz_data_async
+from llm_cache import add_cache_arguments, cache_from_args, cached_chat_completion
+from quiz_journal import QuizJournal
+from quiz_rules import QuizRuleEngine
+from http_clients import add_http_pool_arguments, configure_http_pool_from_args, get_openai_client
+from llm_metrics import add_metrics_arguments, export_metrics_from_args
+from prompt_budget import add_prompt_budget_arguments, configure_prompt_budget_from_args, default_prompt_stats
+from llm_batch import (
+    add_batch_job_arguments, backend_from_args, build_chat_request,
+    read_batch_results, run_batch_job, write_batch_requests
+)
 
 # 加载环境变量
 load_dotenv()
@@ -31,144 +49,304 @@ def extract_period_from_name(name):
         return match.group(1)
     return ""
 
-def process_collection_data(input_file, output_file):
-    """处理藏品数据并转换为JSON格式"""
-    print(f"正在处理藏品数据: {input_file}")
+# CSV列名到藏品字段的映射（需要clean_text处理的文本列）
+CSV_TEXT_COLUMNS = {
+    "description": "简介",
+    "dimensions": "尺寸信息",
+    "image": "图片URL",
+    "localImage": "本地图片路径",
+}
+
+def read_collection_csv(input_file, engine=None):
+    """读取藏品CSV文件，可选使用pyarrow引擎加速解析"""
+    if engine is None:
+        try:
+            import pyarrow  # noqa: F401
+            engine = "pyarrow"
+        except ImportError:
+            engine = "c"
     
-    # 读取CSV文件
-    df = pd.read_csv(input_file)
+    # 所有列按字符串读取，避免类型推断带来的额外开销
+    return pd.read_csv(input_file, dtype=str, engine=engine)
+
+def stable_artifact_ids(frame):
+    """根据名称和图片URL生成稳定的藏品ID，插入或删除CSV行不会改变其他藏品的ID"""
+    keys = frame["fullName"] + "\x1f" + frame["image"]
+    ids = pd.Series(
+        [hashlib.sha1(key.encode("utf-8")).hexdigest()[:12] for key in keys],
+        index=frame.index
+    )
+    
+    # 名称和图片完全相同的重复行，按出现顺序追加序号
+    occurrence = keys.groupby(keys).cumcount()
+    return ids.where(occurrence == 0, ids + "-" + (occurrence + 1).astype(str))
+
+def artifact_content_hashes(frame):
+    """计算每件藏品除ID外所有字段的内容哈希，用于判断藏品是否发生变化"""
+    fields = [column for column in frame.columns if column != "id"]
+    rows = frame[fields[0]].str.cat([frame[column].astype(str) for column in fields[1:]], sep="\x1f")
+    return pd.Series(
+        [hashlib.sha1(row.encode("utf-8")).hexdigest() for row in rows],
+        index=frame.index
+    )
+
+def build_artifact_frame(df, id_scheme="row"):
+    """
+    使用pandas列式字符串操作一次性构建藏品字段
     
-    # 清理数据
+    id_scheme为"row"时ID沿用CSV行号；为"stable"时ID由名称和图片URL生成。
+    """
     df = df.fillna("")
     
-    # 构建藏品数据
-    artifacts = []
+    # ID沿用CSV行号，跳过空名称行不影响其他藏品的ID
+    ids = pd.Series(df.index + 1, index=df.index).astype(str)
     
-    for idx, row in tqdm(df.iterrows(), total=len(df), desc="处理藏品"):
-        if not row['名称'] or pd.isna(row['名称']):
-            continue
-            
-        # 提取时期
-        period = extract_period_from_name(row['名称'])
-        
-        # 从名称中移除时期信息以得到干净的名称
-        clean_name = row['名称'].replace(f"【{period}】", "").strip() if period else row['名称']
-        
-        # 构建藏品对象
-        artifact = {
-            "id": str(idx + 1),  # 为每个藏品生成唯一ID
-            "name": clean_name,
-            "fullName": row['名称'],
-            "period": period,
-            "description": clean_text(row['简介']),
-            "dimensions": clean_text(row['尺寸信息']),
-            "image": clean_text(row['图片URL']),
-            "localImage": clean_text(row['本地图片路径']),
-            "interestingFacts": "",  # 这些字段可以后续手动添加或从描述中提取
-            "culturalContext": "",
-            "location": "苏州博物馆"  # 默认位置
-        }
-        
-        # 将藏品添加到列表
-        artifacts.append(artifact)
+    names = df['名称'].astype(str)
+    mask = names != ""
+    df, ids, names = df[mask], ids[mask], names[mask]
+    
+    # 提取时期，并从名称中移除时期信息以得到干净的名称（移除名称中所有与该时期相同的【时期】标记）
+    periods = names.str.extract(r'【(.*?)】', expand=False).fillna("")
+    clean_names = pd.Series(
+        [name.replace(f"【{period}】", "").strip() if period else name for name, period in zip(names, periods)],
+        index=names.index
+    )
+    
+    frame = pd.DataFrame({
+        "id": ids,
+        "name": clean_names,
+        "fullName": names,
+        "period": periods,
+    })
+    for field, column in CSV_TEXT_COLUMNS.items():
+        frame[field] = df[column].astype(str).str.strip()
+    
+    # 解析尺寸信息为数值字段（厘米），未找到的尺寸为None
+    sizes = parse_dimensions(frame["dimensions"])
+    frame[SIZE_FIELDS] = sizes.astype(object).where(sizes.notna(), None)
+    
+    frame["interestingFacts"] = ""  # 这些字段可以后续手动添加或从描述中提取
+    frame["culturalContext"] = ""
+    frame["location"] = "苏州博物馆"  # 默认位置
+    
+    if id_scheme == "stable":
+        frame["id"] = stable_artifact_ids(frame)
+    
+    return frame
+
+def is_sharded_input(input_path):
+    """判断输入是否为包含多个CSV文件的目录或通配符"""
+    return os.path.isdir(input_path) or glob.has_magic(str(input_path))
+
+def is_csv_input(input_path):
+    """判断输入是否为原始藏品CSV（单个文件、目录或通配符）"""
+    return str(input_path).endswith(".csv") or is_sharded_input(input_path)
+
+def resolve_input_files(input_path):
+    """将目录或通配符展开为按文件名排序的CSV文件列表"""
+    if is_sharded_input(input_path):
+        pattern = os.path.join(input_path, "*.csv") if os.path.isdir(input_path) else input_path
+        files = sorted(glob.glob(pattern))
+    else:
+        files = [input_path] if os.path.exists(input_path) else []
+    
+    if not files:
+        raise FileNotFoundError(f"未找到藏品CSV文件: {input_path}")
+    return files
+
+def _build_shard_frame(task):
+    """在子进程中处理单个CSV分片，返回分片的藏品数据和原始行数"""
+    input_file, csv_engine = task
+    df = read_collection_csv(input_file, engine=csv_engine)
+    return build_artifact_frame(df), len(df)
+
+def build_sharded_artifact_frame(input_path, id_scheme="row", csv_engine=None, max_workers=None):
+    """
+    使用多进程并行处理多个CSV分片并合并
+    
+    分片按文件名排序，行号ID按分片顺序累加偏移，
+    因此结果与把所有分片依次拼接成一个CSV后处理完全一致。
+    """
+    files = resolve_input_files(input_path)
+    print(f"共 {len(files)} 个CSV分片，使用多进程并行处理")
+    
+    tasks = [(input_file, csv_engine) for input_file in files]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = list(tqdm(executor.map(_build_shard_frame, tasks), total=len(tasks), desc="处理分片"))
+    
+    frames = []
+    offset = 0
+    for frame, row_count in results:
+        frame["id"] = (frame["id"].astype(int) + offset).astype(str)
+        offset += row_count
+        frames.append(frame)
+    
+    merged = pd.concat(frames, ignore_index=True)
+    # 稳定ID需要在合并后统一生成，以便区分跨分片的重复藏品
+    if id_scheme == "stable":
+        merged["id"] = stable_artifact_ids(merged)
+    return merged
+
+def load_artifact_frame(input_path, id_scheme="row", csv_engine=None, max_workers=None):
+    """读取单个CSV文件或多个CSV分片，返回藏品数据"""
+    if is_sharded_input(input_path):
+        return build_sharded_artifact_frame(input_path, id_scheme, csv_engine, max_workers)
+    
+    df = read_collection_csv(input_path, engine=csv_engine)
+    return build_artifact_frame(df, id_scheme=id_scheme)
+
+def process_collection_data(input_file, output_file, csv_engine=None, max_workers=None):
+    """处理藏品数据并转换为JSON格式"""
+    print(f"正在处理藏品数据: {input_file}")
+    
+    # 读取CSV文件并列式构建藏品数据
+    artifacts = load_artifact_frame(input_file, csv_engine=csv_engine, max_workers=max_workers).to_dict("records")
     
     # 构建最终的JSON结构
     collection_data = {
         "artifacts": artifacts
     }
     
-    # 保存为JSON文件
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(collection_data, f, ensure_ascii=False, indent=2)
+    # 按文件后缀保存为JSON或Parquet/Arrow文件
+    save_collection(collection_data, output_file, "artifacts")
+    
+    # 保存按尺寸排序的索引，供尺寸范围筛选和去重脚本使用
+    save_size_index(build_size_index(artifacts), Path(output_file).with_name("artifacts.size_index.json"))
     
     print(f"处理完成，已保存到: {output_file}")
     print(f"总共处理了 {len(artifacts)} 件藏品")
     
     return collection_data
 
-def generate_quiz_with_ai(artifact, api_key=None):
-    """使用OpenAI API为藏品生成更智能的问答题"""
-    # 优先使用传入的API密钥，其次使用环境变量中的密钥
-    if api_key:
-        openai.api_key = api_key
-    else:
-        # 从环境变量获取API密钥
-        openai.api_key = os.getenv("OPENAI_API_KEY")
+def load_manifest(manifest_file):
+    """读取藏品内容哈希清单，返回 {藏品ID: 内容哈希}"""
+    if not manifest_file or not os.path.exists(manifest_file):
+        return {}
+    with open(manifest_file, 'r', encoding='utf-8') as f:
+        return json.load(f).get("artifacts", {})
+
+def save_manifest(hashes, manifest_file):
+    """保存藏品内容哈希清单"""
+    with open(manifest_file, 'w', encoding='utf-8') as f:
+        json.dump({"artifacts": hashes}, f, ensure_ascii=False, indent=2)
+
+def process_collection_data_incremental(input_file, output_file, manifest_file, csv_engine=None, max_workers=None):
+    """
+    增量处理藏品数据
+    
+    使用稳定ID并与上次运行的内容哈希清单比较，除完整的藏品文件外，
+    另外输出只包含新增或变化藏品的 artifacts.delta 文件（格式与藏品文件相同），
+    以及记录新增、变化、删除ID的 artifacts.changes.json，供后续步骤只处理变化的藏品。
+    """
+    print(f"正在增量处理藏品数据: {input_file}")
+    
+    frame = load_artifact_frame(input_file, id_scheme="stable", csv_engine=csv_engine, max_workers=max_workers)
+    hashes = dict(zip(frame["id"], artifact_content_hashes(frame)))
+    
+    # 与上次的清单比较，找出新增、变化和删除的藏品
+    previous = load_manifest(manifest_file)
+    changes = {
+        "added": [artifact_id for artifact_id in hashes if artifact_id not in previous],
+        "changed": [artifact_id for artifact_id, content_hash in hashes.items()
+                    if artifact_id in previous and previous[artifact_id] != content_hash],
+        "removed": [artifact_id for artifact_id in previous if artifact_id not in hashes],
+    }
+    dirty_ids = set(changes["added"]) | set(changes["changed"])
+    
+    artifacts = frame.to_dict("records")
+    collection_data = {
+        "artifacts": artifacts
+    }
+    delta_data = {
+        "artifacts": [artifact for artifact in artifacts if artifact["id"] in dirty_ids]
+    }
+    
+    output_file = Path(output_file)
+    save_collection(collection_data, output_file, "artifacts")
+    save_collection(delta_data, output_file.with_name("artifacts.delta" + output_file.suffix), "artifacts")
+    with open(output_file.with_name("artifacts.changes.json"), 'w', encoding='utf-8') as f:
+        json.dump(changes, f, ensure_ascii=False, indent=2)
+    save_manifest(hashes, manifest_file)
+    save_size_index(build_size_index(artifacts), output_file.with_name("artifacts.size_index.json"))
+    
+    print(f"处理完成，已保存到: {output_file}")
+    print(f"总共 {len(artifacts)} 件藏品，新增 {len(changes['added'])} 件，"
+          f"变化 {len(changes['changed'])} 件，删除 {len(changes['removed'])} 件")
     
-    if not openai.api_key:
+    return collection_data, delta_data, changes
+
+def iter_artifacts(input_file, chunksize=10000, csv_engine="c"):
+    """分块读取藏品CSV文件（或多个CSV分片），逐个返回藏品数据，内存占用与文件大小无关"""
+    offset = 0
+    for shard_file in resolve_input_files(input_file):
+        # pyarrow引擎不支持chunksize，流式读取固定使用C引擎
+        reader = pd.read_csv(shard_file, dtype=str, engine=csv_engine, chunksize=chunksize)
+        row_count = 0
+        for chunk in reader:
+            # 分块读取时行索引是连续的，加上前面分片的行数后ID与一次性读取保持一致
+            chunk.index += offset
+            row_count += len(chunk)
+            yield from build_artifact_frame(chunk).to_dict("records")
+        offset += row_count
+
+def process_collection_data_stream(input_file, output_file, chunksize=10000):
+    """流式处理藏品数据，输出为NDJSON或增量写入的JSON数组"""
+    print(f"正在流式处理藏品数据: {input_file}")
+    
+    artifacts = tqdm(iter_artifacts(input_file, chunksize=chunksize), desc="处理藏品")
+    count = write_records(artifacts, output_file, "artifacts")
+    
+    print(f"处理完成，已保存到: {output_file}")
+    print(f"总共处理了 {count} 件藏品")
+    
+    return count
+
+def generate_quiz_with_ai(artifact, api_key=None, cache=None, base_url=None):
+    """
+    使用OpenAI API为藏品生成更智能的问答题，提供cache时相同的提示词直接使用缓存的响应
+    
+    base_url可以指向本地的OpenAI兼容服务，用于测试。
+    """
+    # 优先使用传入的API密钥，其次使用环境变量中的密钥
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    if not api_key:
         print("未提供OpenAI API密钥，无法生成AI问答题")
         return []
     
     print(f"开始为藏品 '{artifact['name']}' 生成AI问答题...")
     
     # 构建提示词 - 修改为只生成一个问题
-    prompt = """
-    你是一位专业的博物馆教育专家和文物研究员，需要根据博物馆藏品信息创建高质量的多选题问答。请基于以下苏州博物馆藏品信息，创建1个准确、教育性强且有深度的多选题问答：
-
-    【藏品信息】
-    名称：""" + artifact['name'] + """
-    全称：""" + artifact['fullName'] + """
-    时期：""" + artifact['period'] + """
-    描述：""" + artifact['description'] + """
-    尺寸：""" + artifact['dimensions'] + """
-    
-    【创建要求】
-    1. 问题类型：关于藏品历史背景、时代特征、材质、工艺或艺术特点的最富教育意义的问题
-    2. 问题难度：中等，适合博物馆参观者和文化爱好者
-    3. 选项设计：
-       - 所有选项必须合理、有说服力，不要出现明显不合理的选项
-       - 错误选项应基于常见误解或相似概念，具有一定迷惑性
-       - 正确答案必须准确无误，严格基于提供的藏品信息
-    4. 答案解释：解释应详细且具有教育意义，可包含额外的相关历史或文化背景知识
-    
-    【输出格式】
-    请严格按照以下JSON格式输出：
-    {
-      "quizzes": [
-        {
-          "question": "关于[藏品名称]的详细问题",
-          "options": [
-            {"id": "a", "text": "选项A详细内容"},
-            {"id": "b", "text": "选项B详细内容"},
-            {"id": "c", "text": "选项C详细内容"},
-            {"id": "d", "text": "选项D详细内容"}
-          ],
-          "correctAnswer": "正确选项ID",
-          "explanation": "详细的解释，包含教育信息和背景知识"
-        }
-      ]
-    }
-    """
+    prompt = build_quiz_prompt(artifact)
     
+    result_text = None
     try:
         print(f"调用OpenAI API...")
-        # 调用OpenAI API - 使用最新的API格式
-        client = openai.OpenAI(api_key=openai.api_key)
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7
+        # 调用OpenAI API - 使用共享连接池的客户端，避免每件藏品重新建立连接
+        client = get_openai_client(api_key, base_url)
+        result_text = cached_chat_completion(
+            client,
+            cache,
+            QUIZ_MODEL,
+            prompt,
+            QUIZ_TEMPERATURE,
+            validate=lambda text: parse_quiz_response(text, artifact),
+            pipeline="quiz",
+            response_format=QUIZ_RESPONSE_FORMAT
         )
         
         # 解析结果
-        result_text = response.choices[0].message.content
         print(f"API响应内容: {result_text[:100]}...")  # 打印前100个字符以便调试
         
-        # 清理响应文本，移除可能的markdown代码块标记
-        result_text = result_text.replace('```json', '').replace('```', '').strip()
-        
-        result = json.loads(result_text)
-        print(f"成功解析JSON结果，获取到 {len(result.get('quizzes', []))} 个问答题")
+        quizzes = parse_quiz_response(result_text, artifact)
+        print(f"成功解析JSON结果，获取到 {len(quizzes)} 个问答题")
         
-        # 添加artifactId和id
-        for i, quiz in enumerate(result.get("quizzes", [])):
-            quiz["artifactId"] = artifact["id"]
-            quiz["id"] = f"quiz_{artifact['id']}_{i+1}"
-        
-        return result.get("quizzes", [])
+        # 不合格的题目只重新生成有问题的字段，修复失败的题目丢弃
+        quizzes = [repair_quiz_with_ai(client, cache, artifact, quiz) for quiz in quizzes]
+        return [quiz for quiz in quizzes if quiz is not None]
     except json.JSONDecodeError as e:
         print(f"JSON解析错误: {e}")
-        print(f"API返回的原始文本: {result_text}")
+        if result_text is not None:
+            print(f"API返回的原始文本: {result_text}")
         return []
     except Exception as e:
         print(f"生成藏品 '{artifact['name']}' 的问答题时出错: {e}")
@@ -176,11 +354,144 @@ def generate_quiz_with_ai(artifact, api_key=None):
         traceback.print_exc()
         return []
 
-def generate_quiz_data(collection_data, output_file, use_ai=False, api_key=None, limit=None):
-    """为每个藏品生成问答题数据"""
-    print("正在生成问答题数据...")
+def repair_quiz_with_ai(client, cache, artifact, quiz):
+    """
+    检查问答题，不合格时请模型只重新生成有问题的字段
     
-    quizzes = []
+    Returns:
+        合格或修复成功的问答题，修复失败时返回None
+    """
+    problems = quiz_problems(quiz)
+    if not problems:
+        return quiz
+    
+    fields = repair_fields(problems)
+    print(f"藏品 '{artifact['name']}' 的问答题字段不合格: {', '.join(problems)}，请求修复...")
+    try:
+        result_text = cached_chat_completion(
+            client,
+            cache,
+            QUIZ_MODEL,
+            build_quiz_repair_prompt(artifact, quiz, fields),
+            QUIZ_TEMPERATURE,
+            validate=lambda text: apply_quiz_repair(quiz, text, fields),
+            pipeline="quiz-repair",
+            response_format=quiz_repair_response_format(fields)
+        )
+        return apply_quiz_repair(quiz, result_text, fields)
+    except Exception as e:
+        print(f"修复藏品 '{artifact['name']}' 的问答题失败: {e}")
+        return None
+
+def generate_quiz_batch_with_ai(artifacts, api_key=None, cache=None, base_url=None):
+    """
+    一次请求为多个藏品生成问答题
+    
+    Returns:
+        {藏品ID: 问答题列表}，请求失败或结果不合格的藏品不在结果中
+    """
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        print("未提供OpenAI API密钥，无法生成AI问答题")
+        return {}
+    
+    print(f"开始为 {len(artifacts)} 件藏品批量生成AI问答题...")
+    prompt = build_batch_quiz_prompt(artifacts)
+    
+    try:
+        client = get_openai_client(api_key, base_url)
+        result_text = cached_chat_completion(
+            client,
+            cache,
+            QUIZ_MODEL,
+            prompt,
+            QUIZ_TEMPERATURE,
+            validate=lambda text: parse_batch_quiz_response(text, artifacts),
+            pipeline="quiz-batch",
+            response_format=QUIZ_BATCH_RESPONSE_FORMAT
+        )
+        partial = {}
+        quizzes_by_id = parse_batch_quiz_response(result_text, artifacts, partial)
+        
+        # 部分字段不合格的藏品先尝试修复，修复失败的再由调用方单独请求
+        artifacts_by_id = {artifact["id"]: artifact for artifact in artifacts}
+        for artifact_id, quizzes in partial.items():
+            repaired = [repair_quiz_with_ai(client, cache, artifacts_by_id[artifact_id], quiz) for quiz in quizzes]
+            if all(quiz is not None for quiz in repaired):
+                quizzes_by_id[artifact_id] = repaired
+        print(f"批量请求成功生成 {len(quizzes_by_id)}/{len(artifacts)} 件藏品的问答题")
+        return quizzes_by_id
+    except Exception as e:
+        print(f"批量生成问答题时出错: {e}")
+        return {}
+
+def iter_batches(items, batch_size):
+    """将可迭代对象按batch_size分批，逐批返回列表"""
+    iterator = iter(items)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def iter_quizzes(artifacts, use_ai=False, api_key=None, cache=None, journal=None, batch_size=1,
+                 rules=None, tiered=False, base_url=None):
+    """
+    逐个藏品生成问答题，逐个返回题目
+    
+    提供journal时，日志中已有的藏品直接使用记录的结果，新生成的问答题在完成后立即写入日志。
+    AI模式下batch_size大于1时每次请求为一批藏品生成问答题，批量结果中缺失或不合格的藏品改为单独请求。
+    不使用AI时用rules（QuizRuleEngine）生成规则题；tiered为True时先生成规则题，
+    只有未通过质量检查的藏品才调用大模型。rules为None时边生成边统计候选池。
+    """
+    online = rules is None
+    if online:
+        rules = QuizRuleEngine()
+    
+    for batch in iter_batches(artifacts, batch_size if use_ai else 1):
+        rule_results = {}
+        for artifact in batch:
+            if online:
+                rules.add(artifact)
+            if (use_ai and not tiered) or (journal is not None and artifact in journal):
+                continue
+            quizzes, passed = rules.generate(artifact)
+            if passed or not use_ai:
+                rule_results[artifact["id"]] = quizzes
+        
+        batch_results = {}
+        if len(batch) > 1:
+            pending = [
+                artifact for artifact in batch
+                if artifact["description"] and artifact["id"] not in rule_results
+                and not (journal is not None and artifact in journal)
+            ]
+            if len(pending) > 1:
+                batch_results = generate_quiz_batch_with_ai(pending, api_key, cache, base_url)
+        
+        for artifact in batch:
+            if journal is not None and artifact in journal:
+                yield from journal.get(artifact)
+                continue
+            
+            # 规则题通过质量检查（或不使用AI）时直接使用规则题
+            if artifact["id"] in rule_results:
+                quizzes = rule_results[artifact["id"]]
+            elif artifact["id"] in batch_results:
+                quizzes = batch_results[artifact["id"]]
+            else:
+                # 使用AI生成问答题 - 每个藏品一个问题
+                quizzes = generate_quiz_with_ai(artifact, api_key, cache, base_url) if artifact["description"] else []
+            
+            # 只记录成功生成的结果，失败的藏品在恢复运行时会重试
+            if journal is not None and quizzes:
+                journal.record(artifact, quizzes)
+            yield from quizzes
+
+def generate_quiz_data(collection_data, output_file, use_ai=False, api_key=None, limit=None, cache=None,
+                       journal=None, batch_size=1, rules=None, tiered=False, base_url=None):
+    """为每个藏品生成问答题数据，rules为None时用全部藏品统计规则题的候选池"""
+    print("正在生成问答题数据...")
     
     # 如果设置了limit，只处理指定数量的藏品
     artifacts_to_process = collection_data["artifacts"]
@@ -188,99 +499,373 @@ def generate_quiz_data(collection_data, output_file, use_ai=False, api_key=None,
         artifacts_to_process = artifacts_to_process[:limit]
         print(f"限制处理前 {limit} 件藏品")
     
-    # 检查是否使用AI生成问答题
-    if use_ai:
-        # 使用AI生成问答题 - 每个藏品一个问题
-        for artifact in tqdm(artifacts_to_process, desc="生成问答题"):
-            if artifact["description"]:
-                ai_quizzes = generate_quiz_with_ai(artifact, api_key)
-                quizzes.extend(ai_quizzes)
-    else:
-        # 使用原来的简单逻辑生成问答题 - 每个藏品一个问题
-        for artifact in tqdm(artifacts_to_process, desc="生成问答题"):
-            # 为每个藏品只生成一个问题
-            if artifact["description"]:
-                # 问题: 关于藏品时期或特征，根据描述随机选择
-                if len(artifact["description"]) > 20 and random.random() > 0.5:
-                    # 从描述中提取一个特征作为问题
-                    description = artifact["description"]
-                    quiz = {
-                        "id": f"quiz_{artifact['id']}_1",
-                        "artifactId": artifact["id"],
-                        "question": f"关于{artifact['name']}，以下哪一项描述是正确的？",
-                        "options": [
-                            {"id": "a", "text": description[:min(50, len(description))] + "..."},
-                            {"id": "b", "text": "由黄金制成"},
-                            {"id": "c", "text": "产自西域"},
-                            {"id": "d", "text": "为皇家专用器物"}
-                        ],
-                        "correctAnswer": "a",
-                        "explanation": f"正确描述：{description}"
-                    }
-                else:
-                    # 关于藏品时期的问题
-                    quiz = {
-                        "id": f"quiz_{artifact['id']}_1",
-                        "artifactId": artifact["id"],
-                        "question": f"{artifact['name']}是哪个时期的藏品？",
-                        "options": [
-                            {"id": "a", "text": f"{artifact['period']}"},
-                            {"id": "b", "text": "汉代"},
-                            {"id": "c", "text": "唐代"},
-                            {"id": "d", "text": "宋代"}
-                        ],
-                        "correctAnswer": "a",
-                        "explanation": f"{artifact['name']}是{artifact['period']}时期的藏品。"
-                    }
-                quizzes.append(quiz)
+    resumed = journal.count(artifacts_to_process) if journal is not None else 0
+    if resumed:
+        print(f"从日志恢复了 {resumed} 件藏品的问答题，跳过这些藏品")
+    
+    if rules is None:
+        rules = QuizRuleEngine(collection_data["artifacts"])
+    
+    quizzes = list(iter_quizzes(
+        tqdm(artifacts_to_process, desc="生成问答题"), use_ai, api_key, cache, journal, batch_size, rules, tiered,
+        base_url
+    ))
     
     # 构建最终的JSON结构
     quiz_data = {
         "quizzes": quizzes
     }
     
-    # 保存为JSON文件
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(quiz_data, f, ensure_ascii=False, indent=2)
+    # 按文件后缀保存为JSON或Parquet/Arrow文件
+    save_collection(quiz_data, output_file, "quizzes")
     
     print(f"问答题生成完成，已保存到: {output_file}")
     print(f"总共生成了 {len(quizzes)} 道题目")
     
     return quiz_data
 
-if __name__ == "__main__":
+def stream_quiz_data(artifacts, output_file, use_ai=False, api_key=None, limit=None, cache=None, journal=None,
+                     batch_size=1, rules=None, tiered=False, base_url=None):
+    """从藏品流生成问答题并增量写入文件，返回生成的题目数"""
+    print("正在流式生成问答题数据...")
+    
+    # 如果设置了limit，只处理指定数量的藏品
+    if limit and limit > 0:
+        artifacts = itertools.islice(artifacts, limit)
+        print(f"限制处理前 {limit} 件藏品")
+    
+    quizzes = iter_quizzes(
+        tqdm(artifacts, desc="生成问答题"), use_ai, api_key, cache, journal, batch_size, rules, tiered, base_url
+    )
+    count = write_records(quizzes, output_file, "quizzes")
+    
+    print(f"问答题生成完成，已保存到: {output_file}")
+    print(f"总共生成了 {count} 道题目")
+    
+    return count
+
+def merge_quiz_data(collection_data, delta_data, changes, output_file, use_ai=False, api_key=None, cache=None,
+                    journal=None, batch_size=1, rules=None, tiered=False, base_url=None):
+    """
+    只为新增或变化的藏品生成问答题，并合并到已有的问答题文件中
+    
+    合并后的问答题按collection_data（全部藏品）中的藏品顺序排列，与全量生成的文件顺序相同。
+    """
+    print("正在增量更新问答题数据...")
+    
+    quizzes = []
+    if os.path.exists(output_file):
+        quizzes = load_collection(output_file, "quizzes").get("quizzes", [])
+    
+    # 移除变化和删除藏品的旧问答题
+    stale_ids = set(changes["changed"]) | set(changes["removed"])
+    quizzes = [quiz for quiz in quizzes if quiz["artifactId"] not in stale_ids]
+    
+    new_quizzes = list(iter_quizzes(
+        tqdm(delta_data["artifacts"], desc="生成问答题"), use_ai, api_key, cache, journal, batch_size, rules, tiered,
+        base_url
+    ))
+    quizzes.extend(new_quizzes)
+    
+    # 同一藏品的问答题保持原有顺序
+    order = {artifact["id"]: position for position, artifact in enumerate(collection_data["artifacts"])}
+    quizzes.sort(key=lambda quiz: order.get(quiz["artifactId"], len(order)))
+    
+    quiz_data = {
+        "quizzes": quizzes
+    }
+    
+    save_collection(quiz_data, output_file, "quizzes")
+    
+    print(f"问答题增量更新完成，已保存到: {output_file}")
+    print(f"新生成 {len(new_quizzes)} 道题目，总共 {len(quizzes)} 道题目")
+    
+    return quiz_data
+
+def generate_quiz_data_batch_job(collection_data, output_file, backend, batch_dir, limit=None, cache=None,
+                                 poll_interval=30, rules=None, client=None, api_key=None, base_url=None):
+    """
+    以离线批量任务方式生成问答题
+    
+    所有提示词写入JSONL请求文件后作为一个批量任务提交，任务完成后解析结果写入问答题文件。
+    与逐条生成相同，字段不合格的题目用client请求修复；请求失败、结果缺失或无法解析的藏品改为单独请求（使用api_key和base_url），
+    仍然失败的才计为失败。能解析的响应同时写入cache，之后逐条调用时可以直接命中。
+    提供rules时规则题通过质量检查的藏品直接使用规则题，不写入批量请求。
+    """
+    print("正在以批量任务方式生成问答题数据...")
+    
+    artifacts_to_process = collection_data["artifacts"]
+    if limit and limit > 0 and limit < len(artifacts_to_process):
+        artifacts_to_process = artifacts_to_process[:limit]
+        print(f"限制处理前 {limit} 件藏品")
+    artifacts_to_process = [artifact for artifact in artifacts_to_process if artifact["description"]]
+    
+    rule_results = {}
+    if rules is not None:
+        for artifact in artifacts_to_process:
+            quizzes, passed = rules.generate(artifact)
+            if passed:
+                rule_results[artifact["id"]] = quizzes
+    ai_artifacts = [artifact for artifact in artifacts_to_process if artifact["id"] not in rule_results]
+    
+    batch_dir = Path(batch_dir)
+    requests_file = batch_dir / "quiz_requests.jsonl"
+    results_file = batch_dir / "quiz_results.jsonl"
+    # 保留提示词，写入缓存时不再重复构建
+    prompts = {artifact["id"]: build_quiz_prompt(artifact) for artifact in ai_artifacts}
+    count = write_batch_requests(
+        (
+            build_chat_request(
+                artifact["id"], QUIZ_MODEL, prompts[artifact["id"]], QUIZ_TEMPERATURE,
+                response_format=QUIZ_RESPONSE_FORMAT
+            )
+            for artifact in ai_artifacts
+        ),
+        requests_file
+    )
+    print(f"已生成 {count} 条批量请求: {requests_file}")
+    
+    run_batch_job(backend, requests_file, results_file, poll_interval)
+    results = read_batch_results(results_file)
+    
+    quizzes = []
+    failed = 0
+    for artifact in artifacts_to_process:
+        if artifact["id"] in rule_results:
+            quizzes.extend(rule_results[artifact["id"]])
+            continue
+        result_text, error = results.get(str(artifact["id"]), (None, "结果中缺少该藏品"))
+        try:
+            if result_text is None:
+                raise ValueError(error)
+            artifact_quizzes = parse_quiz_response(result_text, artifact)
+        except Exception as e:
+            print(f"藏品 '{artifact['name']}' 的批量结果无效: {e}，改为单独请求")
+            artifact_quizzes = generate_quiz_with_ai(artifact, api_key, cache, base_url)
+        else:
+            if cache is not None:
+                cache.set(QUIZ_MODEL, QUIZ_TEMPERATURE, prompts[artifact["id"]], result_text,
+                          {"response_format": QUIZ_RESPONSE_FORMAT})
+            # 不合格的题目只重新生成有问题的字段，任何一道修复失败时该藏品计为失败
+            repaired = [repair_quiz_with_ai(client, cache, artifact, quiz) for quiz in artifact_quizzes]
+            artifact_quizzes = repaired if all(quiz is not None for quiz in repaired) else []
+        
+        if not artifact_quizzes:
+            failed += 1
+            continue
+        quizzes.extend(artifact_quizzes)
+    
+    quiz_data = {
+        "quizzes": quizzes
+    }
+    save_collection(quiz_data, output_file, "quizzes")
+    
+    print(f"问答题生成完成，已保存到: {output_file}")
+    print(f"总共生成了 {len(quizzes)} 道题目，{failed} 件藏品失败")
+    
+    return quiz_data
+
+def generate_from_args(args, output_dir, cache=None, journal=None):
+    """
+    按命令行参数选择流式、增量或完整处理，生成藏品和问答题文件
+    
+    Returns:
+        使用的QuizRuleEngine，不使用规则题时为None
+    """
+    suffix = FORMAT_SUFFIXES[args.format]
+    
+    # 不使用AI或分层生成时需要规则题
+    use_rules = not args.use_ai or args.tiered
+    
+    # 流式模式：藏品和问答题都不在内存中完整保存
+    if args.stream:
+        artifacts_file = args.input
+        if is_csv_input(args.input):
+            artifacts_file = output_dir / "artifacts.ndjson"
+            process_collection_data_stream(args.input, artifacts_file, chunksize=args.chunksize)
+        
+        # 先读一遍藏品文件统计规则题的候选池，候选池只保存名称、时期和介绍的第一句
+        rules = None
+        if use_rules:
+            rules = QuizRuleEngine(iter_records(artifacts_file, "artifacts"), seed=args.quiz_seed)
+        
+        stream_quiz_data(
+            iter_records(artifacts_file, "artifacts"),
+            output_dir / "quizzes.ndjson",
+            use_ai=args.use_ai,
+            api_key=args.api_key,
+            limit=args.limit,
+            cache=cache,
+            journal=journal,
+            batch_size=args.batch_size,
+            rules=rules,
+            tiered=args.tiered,
+            base_url=args.base_url
+        )
+        return rules
+    
+    # 增量模式：根据内容哈希清单只处理新增或变化的藏品
+    if args.incremental:
+        full_data, delta_data, changes = process_collection_data_incremental(
+            args.input,
+            output_dir / f"artifacts{suffix}",
+            output_dir / "artifacts.manifest.json",
+            csv_engine=args.csv_engine,
+            max_workers=args.workers
+        )
+        rules = QuizRuleEngine(full_data["artifacts"], seed=args.quiz_seed) if use_rules else None
+        merge_quiz_data(
+            full_data,
+            delta_data,
+            changes,
+            output_dir / f"quizzes{suffix}",
+            use_ai=args.use_ai,
+            api_key=args.api_key,
+            cache=cache,
+            journal=journal,
+            batch_size=args.batch_size,
+            rules=rules,
+            tiered=args.tiered,
+            base_url=args.base_url
+        )
+        return rules
+    
+    # 输入为CSV时先处理原始藏品数据
+    if args.input and is_csv_input(args.input):
+        collection_data = process_collection_data(
+            args.input,
+            output_dir / f"artifacts{suffix}",
+            csv_engine=args.csv_engine,
+            max_workers=args.workers
+        )
+    else:
+        # 读取藏品数据
+        try:
+            collection_data = load_collection(args.input, "artifacts")
+            print(f"已读取藏品数据: {args.input}")
+            print(f"总共读取了 {len(collection_data.get('artifacts', []))} 件藏品")
+        except FileNotFoundError:
+            print(f"错误: 找不到藏品文件 {args.input}")
+            exit(1)
+        except json.JSONDecodeError:
+            print(f"错误: 藏品文件 {args.input} 不是有效的JSON格式")
+            exit(1)
+    
+    # 规则题的候选池由全部藏品统计
+    rules = QuizRuleEngine(collection_data["artifacts"], seed=args.quiz_seed) if use_rules else None
+    
+    # 生成问答题数据
+    if args.use_ai and args.batch_job:
+        batch_dir = Path(args.batch_dir or output_dir / "batch")
+        client = get_openai_client(args.api_key, args.base_url)
+        generate_quiz_data_batch_job(
+            collection_data,
+            output_dir / f"quizzes{suffix}",
+            backend_from_args(args, client, batch_dir),
+            batch_dir,
+            limit=args.limit,
+            cache=cache,
+            poll_interval=args.poll_interval,
+            rules=rules,
+            client=client,
+            api_key=args.api_key,
+            base_url=args.base_url
+        )
+    elif args.use_ai and args.concurrency > 1:
+        generate_quiz_data_async(
+            collection_data,
+            output_dir / f"quizzes{suffix}",
+            api_key=args.api_key,
+            base_url=args.base_url,
+            concurrency=args.concurrency,
+            rate_limit=args.rate_limit,
+            limit=args.limit,
+            cache=cache,
+            journal=journal,
+            batch_size=args.batch_size,
+            rules=rules
+        )
+    else:
+        generate_quiz_data(
+            collection_data,
+            output_dir / f"quizzes{suffix}",
+            use_ai=args.use_ai,
+            api_key=args.api_key,
+            limit=args.limit,
+            cache=cache,
+            journal=journal,
+            batch_size=args.batch_size,
+            rules=rules,
+            tiered=args.tiered,
+            base_url=args.base_url
+        )
+    return rules
+
+def main():
     # 解析命令行参数
     parser = argparse.ArgumentParser(description="生成博物馆藏品问答题")
-    parser.add_argument("--input", help="输入artifacts.json文件路径")
+    parser.add_argument("--input", help="输入藏品文件路径（JSON/Parquet/Arrow），或原始藏品CSV文件路径（可以是包含多个CSV的目录或通配符）")
     parser.add_argument("--output-dir", default="cleaned_data", help="输出目录")
     parser.add_argument("--use-ai", action="store_true", help="是否使用AI生成问答题")
     parser.add_argument("--api-key", help="OpenAI API密钥")
     parser.add_argument("--limit", type=int, help="限制处理的藏品数量，用于测试")
+    parser.add_argument("--csv-engine", choices=["pyarrow", "c", "python"], help="CSV解析引擎，默认优先使用pyarrow")
+    parser.add_argument("--stream", action="store_true", help="流式处理，藏品和问答题以NDJSON格式逐条写入")
+    parser.add_argument("--chunksize", type=int, default=10000, help="流式处理时每次读取的CSV行数")
+    parser.add_argument("--concurrency", type=int, default=1, help="AI生成问答题时的并发请求数，大于1时使用异步并发生成")
+    parser.add_argument("--rate-limit", type=float, help="AI生成问答题时每秒最多发出的请求数")
+    parser.add_argument("--batch-size", type=int, default=1, help="AI生成问答题时每次请求包含的藏品数，大于1时使用批量提示词")
+    parser.add_argument("--resume", action="store_true", help="从上次中断的位置继续生成问答题，跳过日志中已完成的藏品")
+    parser.add_argument("--base-url", help="OpenAI兼容接口地址，可指向本地测试服务")
+    parser.add_argument("--tiered", action="store_true", help="与--use-ai同时使用：先用规则生成问答题，只有未通过质量检查的藏品才调用大模型")
+    parser.add_argument("--quiz-seed", type=int, default=0, help="规则问答题的随机数种子，相同的种子生成相同的题目")
+    add_batch_job_arguments(parser)
+    add_http_pool_arguments(parser)
+    add_metrics_arguments(parser)
+    add_prompt_budget_arguments(parser)
+    add_cache_arguments(parser)
+    parser.add_argument("--format", choices=list(FORMAT_SUFFIXES), default="json", help="藏品和问答题中间文件的格式，发布前再导出为JSON")
+    parser.add_argument("--workers", type=int, help="处理多个CSV分片时的最大进程数，默认为CPU核数")
+    parser.add_argument("--incremental", action="store_true", help="增量处理：使用稳定ID，只为新增或变化的藏品生成问答题")
     
     args = parser.parse_args()
+    configure_http_pool_from_args(args)
+    configure_prompt_budget_from_args(args)
     
     # 创建输出目录
     output_dir = Path(args.output_dir)
     output_dir.mkdir(exist_ok=True)
     
-    # 读取藏品数据
+    # AI生成问答题时使用LLM响应缓存，相同的提示词不会重复调用API
+    cache = cache_from_args(args) if args.use_ai else None
+    
+    # AI生成时每完成一件藏品就写入日志，中断后可以使用--resume从中断的位置继续；
+    # 规则题生成很快且结果固定，不需要日志。日志记录生成方式，方式不同的日志不会被恢复
+    journal = None
+    if args.use_ai:
+        journal_settings = {
+            "mode": "tiered" if args.tiered else "ai",
+            "model": QUIZ_MODEL,
+            "quizSeed": args.quiz_seed if args.tiered else None,
+        }
+        journal = QuizJournal(output_dir / "quizzes.journal.ndjson", resume=args.resume, settings=journal_settings)
+    elif args.resume:
+        print("--resume只在使用--use-ai时有效，规则问答题将全部重新生成")
+    
+    # 各模式共用同一个收尾流程，流式和增量模式同样打印汇总并导出指标
     try:
-        with open(args.input, 'r', encoding='utf-8') as f:
-            collection_data = json.load(f)
-        print(f"已读取藏品数据: {args.input}")
-        print(f"总共读取了 {len(collection_data.get('artifacts', []))} 件藏品")
-    except FileNotFoundError:
-        print(f"错误: 找不到藏品文件 {args.input}")
-        exit(1)
-    except json.JSONDecodeError:
-        print(f"错误: 藏品文件 {args.input} 不是有效的JSON格式")
-        exit(1)
+        rules = generate_from_args(args, output_dir, cache, journal)
+    finally:
+        if journal is not None:
+            journal.close()
     
-    # 生成问答题数据
-    generate_quiz_data(
-        collection_data,
-        output_dir / "quizzes.json",
-        use_ai=args.use_ai,
-        api_key=args.api_key,
-        limit=args.limit
-    ) 
\ No newline at end of file
+    if rules is not None:
+        print(rules.summary())
+    if cache is not None:
+        print(cache.summary())
+    if args.use_ai:
+        print(default_prompt_stats.summary())
+        export_metrics_from_args(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import math
+import re
+import threading
+
+# 藏品长文本字段共用的默认token预算，0表示不压缩提示词
+DEFAULT_FIELD_BUDGET = 300
+
+# 值包含在另一个字段中时省略的字段，如名称通常已包含在全称中
+REDUNDANT_FIELDS = {"name": "fullName"}
+
+# 参与预算分配的长文本字段，其余字段（名称、时期、尺寸等）保持原样
+LONG_FIELDS = ("description", "culturalContext", "interestingFacts")
+
+# 中日韩文字和全角标点，按每个字符约1个token估算
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+_SENTENCE_PATTERN = re.compile(r"[^。！？；!?;\n]+[。！？；!?;]*")
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+_settings = {"field_budget": DEFAULT_FIELD_BUDGET}
+_encoding = None
+
+def configure_prompt_budget(field_budget=None):
+    """
+    修改提示词压缩参数，需要在构建提示词之前调用
+    
+    Args:
+        field_budget: 长文本字段共用的token预算，0表示不压缩
+    """
+    if field_budget is not None:
+        _settings["field_budget"] = max(0, field_budget)
+
+def prompt_compaction_enabled():
+    return _settings["field_budget"] > 0
+
+def _get_encoding():
+    """安装了tiktoken时使用其分词器精确计数，否则返回None"""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            # 未安装tiktoken，或离线环境下无法下载词表
+            _encoding = False
+    return _encoding or None
+
+def estimate_tokens(text):
+    """估算文本的token数：中文每字约1个token，其他字符约4个一个token"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+def compact_whitespace(text):
+    """去掉每行的缩进和空行，提示词中的缩进只会浪费token"""
+    return "\n".join(line.strip() for line in text.splitlines() if line.strip())
+
+def split_sentences(text):
+    """按中英文句末标点和换行切分句子，保留标点"""
+    return [sentence.strip() for sentence in _SENTENCE_PATTERN.findall(text) if sentence.strip()]
+
+def truncate_text(text, max_tokens):
+    """
+    将文本截断到max_tokens以内
+    
+    优先保留开头的完整句子（藏品介绍的前几句通常信息量最大），
+    第一句就超出预算时按字符截断，被截断的文本以省略号结尾。
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    
+    kept = ""
+    for sentence in split_sentences(text):
+        if estimate_tokens(kept + sentence + "…") > max_tokens:
+            break
+        kept += sentence
+    if kept:
+        return kept + "…"
+    
+    # 按预算占比估算截断位置，再逐步缩短直到满足预算
+    end = max(1, len(text) * max_tokens // max(estimate_tokens(text), 1))
+    while end > 1 and estimate_tokens(text[:end] + "…") > max_tokens:
+        end -= 1
+    return text[:end] + "…"
+
+def _allocate_budget(lengths, budget):
+    """
+    按需分配预算：较短的字段拿到全部所需，剩余预算由较长的字段平分
+    
+    Returns:
+        与lengths对应的各字段预算
+    """
+    allocation = [0] * len(lengths)
+    remaining = budget
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    for position, i in enumerate(order):
+        share = remaining // (len(order) - position)
+        allocation[i] = min(lengths[i], share)
+        remaining -= allocation[i]
+    return allocation
+
+def compact_fields(artifact, fields, budget=None):
+    """
+    压缩藏品字段：规范空白、省略重复字段和重复句子、将长文本字段截断到预算以内
+    
+    Args:
+        artifact: 藏品数据
+        fields: [(字段名, 标签)]，按在提示词中出现的顺序
+        budget: 长文本字段共用的token预算，默认使用 configure_prompt_budget 的设置，0表示不截断
+    
+    Returns:
+        [(标签, 值)]，空字段和重复字段不在结果中
+    """
+    budget = _settings["field_budget"] if budget is None else budget
+    values = {
+        key: _WHITESPACE_PATTERN.sub(" ", str(artifact.get(key) or "")).strip()
+        for key, _ in fields
+    }
+    
+    kept = []
+    seen_values = set()
+    seen_sentences = set()
+    for key, label in fields:
+        value = values[key]
+        container = REDUNDANT_FIELDS.get(key)
+        if not value or value in seen_values or (container and value in values.get(container, "")):
+            continue
+        seen_values.add(value)
+        
+        if key in LONG_FIELDS:
+            # 文化背景、趣闻常常重复介绍中的句子，只保留第一次出现的
+            sentences = [sentence for sentence in split_sentences(value) if sentence not in seen_sentences]
+            seen_sentences.update(sentences)
+            value = "".join(sentences)
+            if not value:
+                continue
+        kept.append([key, label, value])
+    
+    if budget > 0:
+        long_items = [item for item in kept if item[0] in LONG_FIELDS]
+        allocation = _allocate_budget([estimate_tokens(item[2]) for item in long_items], budget)
+        for item, item_budget in zip(long_items, allocation):
+            item[2] = truncate_text(item[2], item_budget)
+    
+    return [(label, value) for _, label, value in kept if value]
+
+class PromptStats:
+    """统计压缩前后提示词的token数（线程安全）"""
+    
+    def __init__(self):
+        self.prompts = 0
+        self.original_tokens = 0
+        self.compacted_tokens = 0
+        self._lock = threading.Lock()
+    
+    def record(self, original, compacted):
+        """记录一个提示词压缩前后的文本"""
+        original_tokens = estimate_tokens(original)
+        compacted_tokens = estimate_tokens(compacted)
+        with self._lock:
+            self.prompts += 1
+            self.original_tokens += original_tokens
+            self.compacted_tokens += compacted_tokens
+    
+    def to_dict(self):
+        with self._lock:
+            saved = self.original_tokens - self.compacted_tokens
+            return {
+                "prompts": self.prompts,
+                "originalTokens": self.original_tokens,
+                "compactedTokens": self.compacted_tokens,
+                "savedTokens": saved,
+                "savedRatio": round(saved / self.original_tokens, 4) if self.original_tokens else 0.0,
+            }
+    
+    def summary(self):
+        """返回压缩效果的简短说明"""
+        stats = self.to_dict()
+        if not stats["prompts"]:
+            return "本次运行没有构建大模型提示词"
+        return (
+            f"提示词压缩: {stats['prompts']} 个提示词，约 {stats['originalTokens']} → {stats['compactedTokens']} 个token，"
+            f"节省 {stats['savedTokens']} 个（{stats['savedRatio']:.1%}）"
+        )
+
+# 进程内默认的提示词统计，各提示词构建函数都会记录到这里
+default_prompt_stats = PromptStats()
+
+def record_compaction(original, compacted):
+    """去掉压缩后提示词的缩进，记录节省的token并返回压缩后的提示词"""
+    compacted = compact_whitespace(compacted)
+    default_prompt_stats.record(original, compacted)
+    return compacted
+
+def add_prompt_budget_arguments(parser):
+    """为命令行添加提示词预算参数"""
+    parser.add_argument("--prompt-budget", type=int, default=DEFAULT_FIELD_BUDGET,
+                        help=f"提示词中藏品长文本字段的token预算，默认为{DEFAULT_FIELD_BUDGET}，0表示不压缩提示词")
+
+def configure_prompt_budget_from_args(args):
+    """根据命令行参数配置提示词预算"""
+    configure_prompt_budget(args.prompt_budget)
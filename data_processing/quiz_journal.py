@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+def artifact_content_hash(artifact):
+    """藏品全部字段的内容哈希，藏品内容变化后日志中的旧结果不再使用"""
+    content = json.dumps(artifact, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+class QuizJournal:
+    """
+    问答题生成日志（NDJSON）
+    
+    第一行记录生成设置 {"settings": {...}}，之后每完成一件藏品就追加一行
+    {"artifactId": ..., "contentHash": ..., "quizzes": [...]} 并立即写入磁盘。
+    程序中断后使用resume模式重新打开，设置相同时已记录且内容未变的藏品可以直接取回结果而不必重新生成；
+    设置不同（例如上次只用规则生成）的日志不会被恢复。
+    """
+    
+    def __init__(self, path, resume=False, durable=True, settings=None):
+        """
+        打开日志文件
+        
+        Args:
+            path: 日志文件路径
+            resume: 为True时读取已有日志并在其后追加，否则清空重新记录
+            durable: 为True时每条记录后调用fsync，保证断电或崩溃时不丢失已完成的结果
+            settings: 生成设置（如模式、模型），与日志中记录的不同时丢弃已有日志
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.durable = durable
+        self.settings = settings or {}
+        self.entries = {}
+        
+        if resume and self.path.exists() and self._load():
+            self._file = open(self.path, 'a', encoding='utf-8')
+        else:
+            self._file = open(self.path, 'w', encoding='utf-8')
+            self._write({"settings": self.settings})
+    
+    def _load(self):
+        """
+        读取已有日志，丢弃崩溃时写了一半的最后一行
+        
+        Returns:
+            日志的生成设置与本次相同时返回True，否则返回False，此时日志需要重新记录
+        """
+        valid_size = 0
+        with open(self.path, 'rb') as f:
+            header = f.readline()
+            try:
+                settings = json.loads(header)["settings"] if header.endswith(b"\n") else None
+            except (json.JSONDecodeError, KeyError, TypeError):
+                settings = None
+            if settings != self.settings:
+                print(f"日志 {self.path} 的生成设置与本次不同（{settings} / {self.settings}），不恢复其中的结果")
+                return False
+            valid_size = len(header)
+            
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                self.entries[entry["artifactId"]] = (entry["contentHash"], entry["quizzes"])
+                valid_size += len(line)
+        
+        # 截掉不完整的尾部，避免新记录接在半行后面
+        if valid_size < self.path.stat().st_size:
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_size)
+        return True
+    
+    def _write(self, entry):
+        self._file.write(json.dumps(entry, ensure_ascii=False))
+        self._file.write("\n")
+        self._file.flush()
+        if self.durable:
+            os.fsync(self._file.fileno())
+    
+    def __contains__(self, artifact):
+        """藏品已记录且记录后内容没有变化"""
+        entry = self.entries.get(artifact["id"])
+        return entry is not None and entry[0] == artifact_content_hash(artifact)
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def count(self, artifacts):
+        """可以从日志恢复的藏品数"""
+        return sum(1 for artifact in artifacts if artifact in self)
+    
+    def get(self, artifact):
+        """返回已记录的问答题列表"""
+        return self.entries[artifact["id"]][1]
+    
+    def record(self, artifact, quizzes):
+        """记录一件藏品的问答题"""
+        content_hash = artifact_content_hash(artifact)
+        self.entries[artifact["id"]] = (content_hash, quizzes)
+        self._write({"artifactId": artifact["id"], "contentHash": content_hash, "quizzes": quizzes})
+    
+    def close(self):
+        self._file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,329 @@
+import json
+import re
+
+from prompt_budget import compact_fields, compact_whitespace, prompt_compaction_enabled, record_compaction
+
+# 问答题生成使用的模型和温度
+QUIZ_MODEL = "gpt-4o-mini"
+QUIZ_TEMPERATURE = 0.7
+
+# 选项ID
+QUIZ_OPTION_IDS = ["a", "b", "c", "d"]
+
+# 单道问答题的JSON Schema
+QUIZ_ITEM_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "question": {"type": "string"},
+        "options": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "string", "enum": QUIZ_OPTION_IDS},
+                    "text": {"type": "string"}
+                },
+                "required": ["id", "text"],
+                "additionalProperties": False
+            }
+        },
+        "correctAnswer": {"type": "string", "enum": QUIZ_OPTION_IDS},
+        "explanation": {"type": "string"}
+    },
+    "required": ["question", "options", "correctAnswer", "explanation"],
+    "additionalProperties": False
+}
+
+# 单藏品请求的响应格式，模型按JSON Schema输出（Structured Outputs）
+QUIZ_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "quiz_response",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {"quizzes": {"type": "array", "items": QUIZ_ITEM_SCHEMA}},
+            "required": ["quizzes"],
+            "additionalProperties": False
+        }
+    }
+}
+
+# 批量请求的键是藏品ID，无法用严格的JSON Schema描述，只要求输出JSON对象
+QUIZ_BATCH_RESPONSE_FORMAT = {"type": "json_object"}
+
+_TRAILING_COMMA_PATTERN = re.compile(r",\s*([}\]])")
+
+# 问答题的创建要求，单藏品和批量提示词共用
+QUIZ_REQUIREMENTS = """
+    【创建要求】
+    1. 问题类型：关于藏品历史背景、时代特征、材质、工艺或艺术特点的最富教育意义的问题
+    2. 问题难度：中等，适合博物馆参观者和文化爱好者
+    3. 选项设计：
+       - 所有选项必须合理、有说服力，不要出现明显不合理的选项
+       - 错误选项应基于常见误解或相似概念，具有一定迷惑性
+       - 正确答案必须准确无误，严格基于提供的藏品信息
+    4. 答案解释：解释应详细且具有教育意义，可包含额外的相关历史或文化背景知识
+    """
+
+# 单道问答题的JSON格式
+QUIZ_ITEM_FORMAT = """{
+          "question": "关于[藏品名称]的详细问题",
+          "options": [
+            {"id": "a", "text": "选项A详细内容"},
+            {"id": "b", "text": "选项B详细内容"},
+            {"id": "c", "text": "选项C详细内容"},
+            {"id": "d", "text": "选项D详细内容"}
+          ],
+          "correctAnswer": "正确选项ID",
+          "explanation": "详细的解释，包含教育信息和背景知识"
+        }"""
+
+# 提示词中的藏品字段及标签
+QUIZ_ARTIFACT_FIELDS = [
+    ("name", "名称"),
+    ("fullName", "全称"),
+    ("period", "时期"),
+    ("description", "描述"),
+    ("dimensions", "尺寸"),
+]
+
+def _artifact_info(artifact):
+    """藏品信息部分的提示词"""
+    return """
+    名称：""" + artifact['name'] + """
+    全称：""" + artifact['fullName'] + """
+    时期：""" + artifact['period'] + """
+    描述：""" + artifact['description'] + """
+    尺寸：""" + artifact['dimensions'] + """
+    """
+
+def _compact_artifact_info(artifact):
+    """压缩后的藏品信息：省略重复和空字段，长文本截断到token预算以内"""
+    return "\n" + "\n".join(f"{label}：{value}" for label, value in compact_fields(artifact, QUIZ_ARTIFACT_FIELDS)) + "\n"
+
+def _quiz_prompt(artifact_info):
+    return """
+    你是一位专业的博物馆教育专家和文物研究员，需要根据博物馆藏品信息创建高质量的多选题问答。请基于以下苏州博物馆藏品信息，创建1个准确、教育性强且有深度的多选题问答：
+    
+    【藏品信息】""" + artifact_info + QUIZ_REQUIREMENTS + """
+    【输出格式】
+    请严格按照以下JSON格式输出：
+    {
+      "quizzes": [
+        """ + QUIZ_ITEM_FORMAT + """
+      ]
+    }
+    """
+
+def build_quiz_prompt(artifact):
+    """构建为单个藏品生成一道多选题的提示词，启用压缩时返回压缩后的提示词"""
+    original = _quiz_prompt(_artifact_info(artifact))
+    if not prompt_compaction_enabled():
+        return original
+    return record_compaction(original, _quiz_prompt(_compact_artifact_info(artifact)))
+
+def _batch_quiz_prompt(artifacts, artifact_info):
+    artifact_blocks = "".join(
+        """
+    【藏品 """ + str(artifact['id']) + """】""" + artifact_info(artifact)
+        for artifact in artifacts
+    )
+    return """
+    你是一位专业的博物馆教育专家和文物研究员，需要根据博物馆藏品信息创建高质量的多选题问答。请基于以下""" + str(len(artifacts)) + """件苏州博物馆藏品的信息，为每件藏品各创建1个准确、教育性强且有深度的多选题问答：
+    """ + artifact_blocks + QUIZ_REQUIREMENTS + """
+    【输出格式】
+    请严格按照以下JSON格式输出，"results"的键为【藏品 ID】中的藏品ID，每件藏品都必须出现：
+    {
+      "results": {
+        "藏品ID": {
+          "quizzes": [
+            """ + QUIZ_ITEM_FORMAT.replace("\n", "\n    ") + """
+          ]
+        }
+      }
+    }
+    """
+
+def build_batch_quiz_prompt(artifacts):
+    """
+    构建一次为多个藏品各生成一道多选题的提示词
+    
+    创建要求只出现一次，响应按藏品ID分组，便于拆分和逐个校验。
+    """
+    original = _batch_quiz_prompt(artifacts, _artifact_info)
+    if not prompt_compaction_enabled():
+        return original
+    return record_compaction(original, _batch_quiz_prompt(artifacts, _compact_artifact_info))
+
+def clean_response_text(result_text):
+    """清理响应文本，移除可能的markdown代码块标记"""
+    return result_text.replace('```json', '').replace('```', '').strip()
+
+def load_response_json(result_text):
+    """
+    解析模型返回的JSON，先在本地修复常见的格式问题：代码块标记、JSON前后的说明文字、多余的结尾逗号
+    
+    Raises:
+        json.JSONDecodeError: 修复后仍然不是有效的JSON
+    """
+    text = clean_response_text(result_text)
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as e:
+        error = e
+    
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        raise error
+    try:
+        return json.loads(_TRAILING_COMMA_PATTERN.sub(r"\1", text[start:end + 1]))
+    except json.JSONDecodeError:
+        raise error
+
+def parse_quiz_response(result_text, artifact):
+    """
+    解析模型返回的问答题JSON，并为每道题添加artifactId和id
+    
+    Raises:
+        json.JSONDecodeError: 响应不是有效的JSON
+    """
+    result = load_response_json(result_text)
+    quizzes = result.get("quizzes", [])
+    
+    # 添加artifactId和id
+    for i, quiz in enumerate(quizzes):
+        quiz["artifactId"] = artifact["id"]
+        quiz["id"] = f"quiz_{artifact['id']}_{i+1}"
+    
+    return quizzes
+
+def quiz_problems(quiz):
+    """
+    检查问答题：题目非空、4个ID不重复且内容非空的选项、正确答案是其中一个选项、解释非空
+    
+    Returns:
+        不合格的字段列表，如 ["correctAnswer", "explanation"]，合格时为空列表
+    """
+    if not isinstance(quiz, dict):
+        return ["question", "options", "correctAnswer", "explanation"]
+    
+    problems = []
+    if not isinstance(quiz.get("question"), str) or not quiz["question"].strip():
+        problems.append("question")
+    
+    options = quiz.get("options")
+    valid_options = isinstance(options, list) and len(options) == 4 and all(
+        isinstance(option, dict) and isinstance(option.get("text"), str) and option["text"].strip()
+        for option in options
+    )
+    option_ids = [option.get("id") for option in options] if valid_options else []
+    if not valid_options or len(set(option_ids)) != 4:
+        problems.append("options")
+    if quiz.get("correctAnswer") not in option_ids:
+        problems.append("correctAnswer")
+    
+    if not isinstance(quiz.get("explanation"), str) or not quiz["explanation"].strip():
+        problems.append("explanation")
+    return problems
+
+def is_valid_quiz(quiz):
+    """问答题的各字段是否都合格，见 quiz_problems"""
+    return not quiz_problems(quiz)
+
+# 修复时各字段的说明和JSON Schema
+QUIZ_REPAIR_FIELDS = {
+    "question": ("题目（question）", QUIZ_ITEM_SCHEMA["properties"]["question"]),
+    "options": ("4个选项（options，ID依次为a、b、c、d）", QUIZ_ITEM_SCHEMA["properties"]["options"]),
+    "correctAnswer": ("正确答案的选项ID（correctAnswer）", QUIZ_ITEM_SCHEMA["properties"]["correctAnswer"]),
+    "explanation": ("答案解释（explanation）", QUIZ_ITEM_SCHEMA["properties"]["explanation"]),
+}
+
+def repair_fields(problems):
+    """需要重新生成的字段：选项不合格时正确答案也要随选项一起重新生成"""
+    fields = set(problems)
+    if "options" in fields:
+        fields.add("correctAnswer")
+    return [field for field in QUIZ_REPAIR_FIELDS if field in fields]
+
+def build_quiz_repair_prompt(artifact, quiz, fields):
+    """构建只重新生成问答题中不合格字段的提示词，其余字段原样提供给模型作为上下文"""
+    current = {key: quiz.get(key) for key in QUIZ_REPAIR_FIELDS if key not in fields}
+    return compact_whitespace("""
+    你是一位专业的博物馆教育专家。下面是根据藏品信息创建的一道多选题，其中部分字段缺失或不合格，请只重新生成这些字段：""" + "、".join(QUIZ_REPAIR_FIELDS[field][0] for field in fields) + """
+    
+    【藏品信息】""" + _compact_artifact_info(artifact) + """
+    【已有字段】
+    """ + json.dumps(current, ensure_ascii=False) + """
+    
+    要求：正确答案必须准确无误，严格基于提供的藏品信息；选项须为4个合理、有迷惑性的选项；解释应详细且具有教育意义。
+    只返回包含""" + "、".join(fields) + """字段的JSON对象。
+    """)
+
+def quiz_repair_response_format(fields):
+    """修复请求的响应格式，只包含需要重新生成的字段"""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "quiz_repair",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {field: QUIZ_REPAIR_FIELDS[field][1] for field in fields},
+                "required": list(fields),
+                "additionalProperties": False
+            }
+        }
+    }
+
+def apply_quiz_repair(quiz, result_text, fields):
+    """
+    将修复响应中的字段合并到问答题，返回新的问答题
+    
+    Raises:
+        json.JSONDecodeError: 响应不是有效的JSON
+        ValueError: 合并后问答题仍不合格
+    """
+    repair = load_response_json(result_text)
+    repaired = dict(quiz)
+    for field in fields:
+        if isinstance(repair, dict) and field in repair:
+            repaired[field] = repair[field]
+    problems = quiz_problems(repaired)
+    if problems:
+        raise ValueError(f"修复后仍不合格的字段: {', '.join(problems)}")
+    return repaired
+
+def parse_batch_quiz_response(result_text, artifacts, partial=None):
+    """
+    解析批量提示词的响应，按藏品拆分问答题
+    
+    Args:
+        partial: 提供字典时，有问答题但部分字段不合格的藏品以 {藏品ID: 问答题列表} 放入其中，供调用方修复
+    
+    Returns:
+        {藏品ID: 问答题列表}，只包含各字段都合格的藏品；缺失或不合格的藏品不在结果中，
+        由调用方修复或改用单藏品请求重新生成
+    
+    Raises:
+        json.JSONDecodeError: 响应不是有效的JSON
+    """
+    result = load_response_json(result_text)
+    results = result.get("results", {}) if isinstance(result, dict) else {}
+    
+    quizzes_by_id = {}
+    for artifact in artifacts:
+        entry = results.get(str(artifact["id"]))
+        quizzes = entry.get("quizzes") if isinstance(entry, dict) else None
+        if not quizzes or not all(isinstance(quiz, dict) for quiz in quizzes):
+            continue
+        
+        for i, quiz in enumerate(quizzes):
+            quiz["artifactId"] = artifact["id"]
+            quiz["id"] = f"quiz_{artifact['id']}_{i+1}"
+        if all(is_valid_quiz(quiz) for quiz in quizzes):
+            quizzes_by_id[artifact["id"]] = quizzes
+        elif partial is not None:
+            partial[artifact["id"]] = quizzes
+    
+    return quizzes_by_id
@@ -0,0 +1,263 @@
+import random
+import re
+from collections import Counter
+
+from quiz_prompts import QUIZ_OPTION_IDS, quiz_problems
+
+# 材质词，较长的词排在前面，避免“青铜”被识别为“铜”
+MATERIAL_TERMS = [
+    "青铜", "紫砂", "象牙", "犀角", "玛瑙", "水晶", "琉璃", "翡翠", "珐琅",
+    "铜", "铁", "锡", "金", "银", "玉", "瓷", "陶", "木", "竹", "漆", "石", "骨", "丝", "绢", "纸",
+]
+
+# 描述中表示材质的写法，如“木胎”“铜质”“纸制”
+_MATERIAL_PATTERN = re.compile("(" + "|".join(MATERIAL_TERMS) + ")(?:质|胎|制)")
+_SENTENCE_PATTERN = re.compile(r"[^。！？；]+[。！？；]?")
+
+# 干扰项只从最常见的若干个候选中选取，冷门的候选（如只出现一次的年号）容易被一眼排除
+POOL_TOP_N = 12
+
+# 规则题型，按藏品的随机数决定尝试顺序
+QUESTION_TYPES = ("period", "artifact_of_period", "material")
+
+# 以其他藏品的介绍作为干扰项的描述题区分度不稳定，只在其他题型都不可用时使用，且不算通过质量检查
+FALLBACK_QUESTION_TYPE = "description"
+
+def _period_overlaps(a, b):
+    """两个时期是否互相包含，如“宋”和“北宋”、“清”和“清 康熙”"""
+    return a in b or b in a
+
+def _first_sentence(text, max_length=60):
+    match = _SENTENCE_PATTERN.search(text or "")
+    sentence = match.group(0).strip() if match else ""
+    return sentence if len(sentence) <= max_length else sentence[:max_length] + "..."
+
+def _own_text(artifact):
+    return artifact.get("name", "") + (artifact.get("description") or "")
+
+def description_material(artifact):
+    """从描述中找出藏品的材质（名称中没有出现的），没有时返回None"""
+    for material in _MATERIAL_PATTERN.findall(artifact.get("description") or ""):
+        if material not in artifact.get("name", ""):
+            return material
+    return None
+
+class QuizRuleEngine:
+    """
+    规则问答题生成器
+    
+    干扰项从整个藏品目录预先统计的候选池中选取：目录中的其他时期、其他藏品的名称、
+    其他藏品描述中出现的材质。每件藏品使用由seed和藏品ID派生的随机数，
+    重复运行生成完全相同的题目。生成的题目经过质量检查，未通过的藏品可以交给大模型生成。
+    
+    Args:
+        artifacts: 用于统计候选池的藏品，通常是整个目录
+        seed: 随机数种子
+    """
+    
+    def __init__(self, artifacts=(), seed=0):
+        self.seed = seed
+        self.periods = Counter()
+        self.materials = Counter()
+        self.names_by_period = {}
+        self.sentences = []
+        self._sentence_pool = None
+        self._period_names = {}
+        self.stats = Counter()
+        for artifact in artifacts:
+            self.add(artifact)
+    
+    def add(self, artifact):
+        """将藏品加入候选池"""
+        period = (artifact.get("period") or "").strip()
+        if period:
+            self.periods[period] += 1
+            self.names_by_period.setdefault(period, []).append(artifact["name"])
+            self._period_names = {}
+        text = _own_text(artifact)
+        for material in MATERIAL_TERMS:
+            if material in text:
+                self.materials[material] += 1
+        sentence = _first_sentence(artifact.get("description"))
+        if sentence:
+            self.sentences.append(sentence)
+            self._sentence_pool = None
+    
+    def _rng(self, artifact, purpose=""):
+        # 字符串种子的哈希与PYTHONHASHSEED无关，每次运行结果相同
+        return random.Random(f"{self.seed}:{artifact['id']}:{purpose}")
+    
+    @staticmethod
+    def _top(counter):
+        return [value for value, _ in sorted(counter.items(), key=lambda item: (-item[1], item[0]))[:POOL_TOP_N]]
+    
+    def _names_in_period(self, period):
+        """时期（及与其互相包含的时期）中所有藏品的名称，这些名称作为干扰项时同样是正确答案"""
+        names = self._period_names.get(period)
+        if names is None:
+            names = {
+                name for other, other_names in self.names_by_period.items() if _period_overlaps(other, period)
+                for name in other_names
+            }
+            self._period_names[period] = names
+        return names
+    
+    def _build_quiz(self, artifact, question, correct, distractors, explanation, rng):
+        """组装问答题，正确答案的位置随机"""
+        texts = [correct] + distractors
+        rng.shuffle(texts)
+        options = [{"id": option_id, "text": text} for option_id, text in zip(QUIZ_OPTION_IDS, texts)]
+        return {
+            "id": f"quiz_{artifact['id']}_1",
+            "artifactId": artifact["id"],
+            "question": question,
+            "options": options,
+            "correctAnswer": QUIZ_OPTION_IDS[texts.index(correct)],
+            "explanation": explanation,
+        }
+    
+    def period_quiz(self, artifact, rng):
+        """藏品是哪个时期的"""
+        period = (artifact.get("period") or "").strip()
+        if not period:
+            return None
+        own_text = _own_text(artifact)
+        candidates = [
+            other for other in self._top(self.periods)
+            if not _period_overlaps(other, period) and other not in own_text
+        ]
+        if len(candidates) < 3:
+            return None
+        return self._build_quiz(
+            artifact,
+            f"{artifact['name']}是哪个时期的藏品？",
+            period,
+            rng.sample(candidates, 3),
+            f"{artifact['name']}是{period}时期的藏品。{_first_sentence(artifact.get('description'))}",
+            rng
+        )
+    
+    def artifact_of_period_quiz(self, artifact, rng):
+        """哪件藏品属于某个时期"""
+        period = (artifact.get("period") or "").strip()
+        if not period:
+            return None
+        other_periods = [other for other in self._top(self.periods) if not _period_overlaps(other, period)]
+        if len(other_periods) < 3:
+            return None
+        excluded = self._names_in_period(period) | {artifact["name"]}
+        distractors = []
+        for other in rng.sample(other_periods, 3):
+            # 与本时期藏品同名的藏品不能作为干扰项，否则会有多个正确答案
+            names = [name for name in self.names_by_period[other] if name not in excluded]
+            if not names:
+                return None
+            distractors.append(rng.choice(names))
+        return self._build_quiz(
+            artifact,
+            f"以下哪件藏品属于{period}时期？",
+            artifact["name"],
+            distractors,
+            f"{artifact['name']}是{period}时期的藏品，其余藏品分别属于其他时期。",
+            rng
+        )
+    
+    def material_quiz(self, artifact, rng):
+        """藏品的材质（只使用名称中没有出现、描述中明确写出的材质）"""
+        material = description_material(artifact)
+        if not material:
+            return None
+        own_text = _own_text(artifact)
+        candidates = [
+            other for other in self._top(self.materials)
+            if other not in material and material not in other and other not in own_text
+        ]
+        if len(candidates) < 3:
+            return None
+        sentence = next(
+            (sentence for sentence in _SENTENCE_PATTERN.findall(artifact["description"]) if material in sentence),
+            ""
+        ).strip()
+        return self._build_quiz(
+            artifact,
+            f"{artifact['name']}的主体是什么材质？",
+            material,
+            rng.sample(candidates, 3),
+            f"根据藏品介绍：{sentence}",
+            rng
+        )
+    
+    def description_quiz(self, artifact, rng):
+        """哪一项是对藏品的正确描述，干扰项为其他藏品介绍的第一句"""
+        correct = _first_sentence(artifact.get("description"))
+        if self._sentence_pool is None:
+            self._sentence_pool = sorted(set(self.sentences))
+        candidates = [sentence for sentence in self._sentence_pool if sentence != correct]
+        if not correct or len(candidates) < 3:
+            return None
+        return self._build_quiz(
+            artifact,
+            f"关于{artifact['name']}，以下哪一项描述是正确的？",
+            correct,
+            rng.sample(candidates, 3),
+            f"正确描述：{artifact['description']}",
+            rng
+        )
+    
+    def quality_problems(self, quiz, artifact):
+        """
+        规则题的质量检查
+        
+        Returns:
+            问题列表，为空表示通过：结构合格、选项互不相同、题目不泄露答案、
+            干扰项没有出现在藏品自身的名称和描述中（避免出现两个看似正确的选项）
+        """
+        problems = list(quiz_problems(quiz))
+        texts = [option["text"] for option in quiz.get("options", [])]
+        if len(set(texts)) != len(texts):
+            problems.append("duplicate_options")
+        
+        correct = next((option["text"] for option in quiz["options"] if option["id"] == quiz["correctAnswer"]), "")
+        if correct and correct in quiz["question"]:
+            problems.append("answer_in_question")
+        
+        own_text = _own_text(artifact)
+        if any(text in own_text for text in texts if text != correct):
+            problems.append("ambiguous_distractor")
+        return problems
+    
+    def generate(self, artifact):
+        """
+        为藏品生成一道规则题
+        
+        Returns:
+            (问答题列表, 是否通过质量检查)。按随机顺序尝试各题型，返回第一道通过检查的题目；
+            都未通过时返回第一道结构合格的题目（或描述题、空列表）和False
+        """
+        if not artifact.get("description"):
+            return [], False
+        
+        rng = self._rng(artifact)
+        question_types = list(QUESTION_TYPES)
+        rng.shuffle(question_types)
+        
+        fallback = None
+        for question_type in question_types:
+            quiz = getattr(self, f"{question_type}_quiz")(artifact, self._rng(artifact, question_type))
+            if quiz is None:
+                continue
+            if not self.quality_problems(quiz, artifact):
+                self.stats["passed"] += 1
+                return [quiz], True
+            if fallback is None and not quiz_problems(quiz):
+                fallback = quiz
+        
+        self.stats["failed"] += 1
+        if fallback is None:
+            quiz = self.description_quiz(artifact, self._rng(artifact, FALLBACK_QUESTION_TYPE))
+            fallback = quiz if quiz is not None and not quiz_problems(quiz) else None
+        return ([fallback] if fallback else []), False
+    
+    def summary(self):
+        """返回规则题的质量检查情况"""
+        return f"规则问答题通过质量检查 {self.stats['passed']} 件，未通过 {self.stats['failed']} 件"
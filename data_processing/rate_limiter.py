@@ -0,0 +1,146 @@
+import asyncio
+import email.utils
+import random
+import threading
+import time
+
+# 表示服务器正在限流的状态码
+THROTTLE_STATUS_CODES = {429, 503}
+
+def parse_retry_after(value):
+    """
+    解析Retry-After响应头
+    
+    Returns:
+        需要等待的秒数，值可以是秒数或HTTP日期；无法解析时返回None
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+def backoff_delay(attempt, base_delay=1.0, max_delay=60.0):
+    """第attempt次（从0开始）重试前的等待时间：指数增长，在[上限/2, 上限]之间随机抖动"""
+    delay = min(max_delay, base_delay * 2 ** attempt)
+    return random.uniform(delay / 2, delay)
+
+class AdaptiveRateLimiter:
+    """
+    自适应限速器（线程安全）
+    
+    没有遇到限流时不等待；收到429/503后，所有请求暂停到Retry-After或指数退避（带随机抖动）到期，
+    之后按逐渐缩短的间隔发出请求：每次成功后间隔乘以ramp_up_factor，直到恢复全速。
+    
+    Args:
+        base_delay: 第一次限流后的退避时间（秒）
+        max_delay: 退避时间和请求间隔的上限（秒）
+        min_interval: 限流后的最小请求间隔（秒），再次限流时加倍
+        ramp_up_factor: 每次成功后请求间隔的缩小比例
+    """
+    
+    def __init__(self, base_delay=0.5, max_delay=60.0, min_interval=0.1, ramp_up_factor=0.5):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.min_interval = min_interval
+        self.ramp_up_factor = ramp_up_factor
+        self.interval = 0.0
+        self.blocked_until = 0.0
+        self.next_slot = 0.0
+        self.failures = 0
+        self.throttled = 0
+        self.waited = 0.0
+        self._lock = threading.Lock()
+    
+    def reserve(self):
+        """预约下一个请求的发送时间，返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self.blocked_until, self.next_slot)
+            self.next_slot = start + self.interval
+            wait = start - now
+            self.waited += wait
+            return wait
+    
+    def acquire(self):
+        """等待到可以发送下一个请求"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+    
+    async def acquire_async(self):
+        """acquire 的异步版本"""
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+    
+    def record(self, status_code, retry_after=None):
+        """
+        根据响应调整发送速度
+        
+        Args:
+            status_code: 响应状态码
+            retry_after: 服务器要求等待的秒数（Retry-After）
+        """
+        with self._lock:
+            now = time.monotonic()
+            if status_code in THROTTLE_STATUS_CODES:
+                self.throttled += 1
+                # 同一轮退避期间并发请求收到的限流响应不再加倍退避
+                if now >= self.blocked_until:
+                    self.failures += 1
+                    self.interval = min(self.max_delay, max(self.min_interval, self.interval * 2))
+                wait = backoff_delay(self.failures - 1, self.base_delay, self.max_delay)
+                if retry_after is not None:
+                    wait = max(wait, retry_after)
+                self.blocked_until = max(self.blocked_until, now + wait)
+            elif status_code < 500:
+                # 服务器正常响应（包括4xx客户端错误），逐步恢复全速
+                self.failures = 0
+                self.interval *= self.ramp_up_factor
+                if self.interval < self.min_interval / 4:
+                    self.interval = 0.0
+    
+    def summary(self):
+        """返回限流情况的简短说明"""
+        return f"遇到限流 {self.throttled} 次，累计等待 {self.waited:.1f} 秒"
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(host):
+    """返回某个主机共用的限速器，不同主机之间互不影响"""
+    with _limiters_lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            limiter = _limiters[host] = AdaptiveRateLimiter()
+        return limiter
+
+def rate_limit_summary():
+    """返回遇到过限流的各主机的限流情况，没有遇到限流时返回None"""
+    with _limiters_lock:
+        lines = [f"{host}: {limiter.summary()}" for host, limiter in _limiters.items() if limiter.throttled]
+    return "\n".join(lines) or None
+
+def wait_for_rate_limit(request):
+    """HTTP请求钩子：按目标主机的限速器等待"""
+    get_rate_limiter(request.url.host).acquire()
+
+def note_rate_limit(response):
+    """HTTP响应钩子：将响应状态和Retry-After反馈给目标主机的限速器"""
+    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+    get_rate_limiter(response.request.url.host).record(response.status_code, retry_after)
+
+async def wait_for_rate_limit_async(request):
+    """wait_for_rate_limit 的异步版本，用于httpx.AsyncClient"""
+    await get_rate_limiter(request.url.host).acquire_async()
+
+async def note_rate_limit_async(response):
+    """note_rate_limit 的异步版本，用于httpx.AsyncClient"""
+    note_rate_limit(response)
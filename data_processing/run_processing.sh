@@ -20,6 +20,9 @@ echo "使用数据文件: ${CSV_FILE}"
 # 如果要使用AI生成问答题，取消下面这行的注释，并确保设置了正确的API密钥
 # python3 process_collection_data.py --input "${CSV_FILE}" --output-dir ../cleaned_data --use-ai
 
+# 如果数据按展厅或部门分成多个CSV文件，可以直接指定目录，多进程并行处理
+# python3 process_collection_data.py --input "${PROJECT_DIR}/exports" --output-dir ../cleaned_data --workers 8
+
 # 3. 测试版本：只处理少量数据进行测试
 python3 process_collection_data.py --input "${CSV_FILE}" --output-dir ../cleaned_data --limit 5
 
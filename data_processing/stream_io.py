@@ -0,0 +1,61 @@
+import json
+from pathlib import Path
+
+# 被视为NDJSON（每行一个JSON对象）的文件后缀
+NDJSON_SUFFIXES = {".ndjson", ".jsonl"}
+
+def is_ndjson(path):
+    """根据文件后缀判断是否为NDJSON文件"""
+    return Path(path).suffix.lower() in NDJSON_SUFFIXES
+
+def iter_ndjson(path):
+    """逐行读取NDJSON文件，逐个返回记录"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+def write_ndjson(records, path):
+    """将记录逐条写入NDJSON文件，返回写入的记录数"""
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False))
+            f.write("\n")
+            count += 1
+    return count
+
+def write_json_array(records, path, key):
+    """
+    将记录增量写入 {key: [...]} 结构的JSON文件，返回写入的记录数
+    
+    输出格式与 json.dump(..., ensure_ascii=False, indent=2) 完全一致，
+    但不需要在内存中保存完整列表。
+    """
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("{\n  " + json.dumps(key) + ": [")
+        for record in records:
+            text = json.dumps(record, ensure_ascii=False, indent=2)
+            f.write(",\n" if count else "\n")
+            f.write("\n".join("    " + line for line in text.split("\n")))
+            count += 1
+        f.write("\n  ]\n}" if count else "]\n}")
+    return count
+
+def write_records(records, path, key):
+    """根据文件后缀选择NDJSON或JSON数组格式写入记录"""
+    if is_ndjson(path):
+        return write_ndjson(records, path)
+    return write_json_array(records, path, key)
+
+def iter_records(path, key):
+    """读取NDJSON文件或 {key: [...]} 结构的JSON文件，逐个返回记录"""
+    if is_ndjson(path):
+        yield from iter_ndjson(path)
+        return
+    
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    yield from data.get(key, [])
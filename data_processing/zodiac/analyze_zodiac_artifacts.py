@@ -2,13 +2,28 @@
 
 import json
 import argparse
+import itertools
 import os
+import sys
 from pathlib import Path
 from tqdm import tqdm
-import openai
-import time
 from dotenv import load_dotenv
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from stream_io import is_ndjson, iter_ndjson
+from llm_cache import add_cache_arguments, cache_from_args, cached_chat_completion
+from http_clients import add_http_pool_arguments, configure_http_pool_from_args, get_openai_client
+from llm_metrics import add_metrics_arguments, export_metrics_from_args
+from prompt_budget import (
+    add_prompt_budget_arguments, compact_fields, configure_prompt_budget_from_args,
+    default_prompt_stats, prompt_compaction_enabled, record_compaction
+)
+from rate_limiter import rate_limit_summary
+from llm_batch import (
+    add_batch_job_arguments, backend_from_args, build_chat_request,
+    read_batch_results, run_batch_job, write_batch_requests
+)
+
 # 加载环境变量
 load_dotenv()
 
@@ -51,20 +66,23 @@ def get_openai_api_key():
         raise ValueError("未找到OPENAI_API_KEY环境变量，请设置API密钥")
     return api_key
 
-# 使用GPT分析藏品与生肖的关系
-def analyze_artifact_with_gpt(artifact, client):
-    """使用GPT分析藏品与生肖的关系"""
-    # 构建藏品信息文本
-    artifact_info = f"""
-藏品名称: {artifact.get('name', '')}
-完整名称: {artifact.get('fullName', '')}
-朝代: {artifact.get('period', '')}
-描述: {artifact.get('description', '')}
-尺寸信息: {artifact.get('dimensions', '')}
-文化背景: {artifact.get('culturalContext', '')}
-有趣事实: {artifact.get('interestingFacts', '')}
-"""
+# 生肖分析使用的模型、温度和响应格式
+ZODIAC_MODEL = "gpt-4o-mini"  # 或者使用其他可用模型
+ZODIAC_TEMPERATURE = 0.1  # 低温度以获得更确定的回答
+ZODIAC_RESPONSE_FORMAT = {"type": "json_object"}
+
+# 提示词中的藏品字段及标签
+ZODIAC_ARTIFACT_FIELDS = [
+    ("name", "藏品名称"),
+    ("fullName", "完整名称"),
+    ("period", "朝代"),
+    ("description", "描述"),
+    ("dimensions", "尺寸信息"),
+    ("culturalContext", "文化背景"),
+    ("interestingFacts", "有趣事实"),
+]
 
+def _zodiac_prompt(artifact_info):
     # 构建严格且简洁的prompt
     prompt = f"""请分析以下博物馆藏品是否与中国十二生肖（鼠、牛、虎、兔、龙、蛇、马、羊、猴、鸡、狗、猪）有直接关联。
 
@@ -90,48 +108,154 @@ def analyze_artifact_with_gpt(artifact, client):
 
 只返回JSON格式，不要有任何其他文字。
 """
+    return prompt
+
+def build_zodiac_prompt(artifact):
+    """构建分析藏品与生肖关系的提示词，启用压缩时返回压缩后的提示词"""
+    # 构建藏品信息文本
+    artifact_info = f"""
+藏品名称: {artifact.get('name', '')}
+完整名称: {artifact.get('fullName', '')}
+朝代: {artifact.get('period', '')}
+描述: {artifact.get('description', '')}
+尺寸信息: {artifact.get('dimensions', '')}
+文化背景: {artifact.get('culturalContext', '')}
+有趣事实: {artifact.get('interestingFacts', '')}
+"""
+    original = _zodiac_prompt(artifact_info)
+    if not prompt_compaction_enabled():
+        return original
+    
+    compact_info = "\n".join(f"{label}: {value}" for label, value in compact_fields(artifact, ZODIAC_ARTIFACT_FIELDS))
+    return record_compaction(original, _zodiac_prompt(compact_info))
 
+def failed_analysis(artifact, error):
+    """分析失败时使用的结果"""
+    print(f"分析藏品 '{artifact.get('name', '')}' 时出错: {error}")
+    return {"related_zodiacs": [], "confidence": 0, "reasoning": f"分析失败: {str(error)}"}
+
+# 使用GPT分析藏品与生肖的关系
+def analyze_artifact_with_gpt(artifact, client, cache=None):
+    """使用GPT分析藏品与生肖的关系，提供cache时相同的提示词直接使用缓存的响应"""
+    prompt = build_zodiac_prompt(artifact)
+    
     try:
-        # 调用GPT API
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",  # 或者使用其他可用模型
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.1,  # 低温度以获得更确定的回答
-            response_format={"type": "json_object"}
+        # 调用GPT API（优先使用缓存）
+        result_text = cached_chat_completion(
+            client,
+            cache,
+            ZODIAC_MODEL,
+            prompt,
+            ZODIAC_TEMPERATURE,
+            validate=json.loads,
+            pipeline="zodiac",
+            response_format=ZODIAC_RESPONSE_FORMAT
         )
         
         # 解析响应
-        result = json.loads(response.choices[0].message.content)
+        result = json.loads(result_text)
         return result
     except Exception as e:
-        print(f"分析藏品 '{artifact.get('name', '')}' 时出错: {e}")
-        return {"related_zodiacs": [], "confidence": 0, "reasoning": f"分析失败: {str(e)}"}
+        return failed_analysis(artifact, e)
+
+def analyze_zodiac_batch_job(artifacts, backend, batch_dir, cache=None, poll_interval=30, client=None):
+    """
+    以离线批量任务方式分析藏品与生肖的关系
+    
+    请求失败、结果缺失或无法解析的藏品用client单独请求一次，仍然失败的才使用失败结果。
+    
+    Returns:
+        {藏品ID: 分析结果}，成功的响应同时写入cache
+    """
+    batch_dir = Path(batch_dir)
+    requests_file = batch_dir / "zodiac_requests.jsonl"
+    results_file = batch_dir / "zodiac_results.jsonl"
+    # 保留提示词，写入缓存时不再重复构建
+    prompts = {artifact["id"]: build_zodiac_prompt(artifact) for artifact in artifacts}
+    count = write_batch_requests(
+        (
+            build_chat_request(
+                artifact["id"], ZODIAC_MODEL, prompts[artifact["id"]], ZODIAC_TEMPERATURE,
+                response_format=ZODIAC_RESPONSE_FORMAT
+            )
+            for artifact in artifacts
+        ),
+        requests_file
+    )
+    print(f"已生成 {count} 条批量请求: {requests_file}")
+    
+    run_batch_job(backend, requests_file, results_file, poll_interval)
+    results = read_batch_results(results_file)
+    
+    analyses = {}
+    for artifact in artifacts:
+        result_text, error = results.get(str(artifact["id"]), (None, "结果中缺少该藏品"))
+        try:
+            if result_text is None:
+                raise ValueError(error)
+            analyses[artifact["id"]] = json.loads(result_text)
+        except Exception as e:
+            print(f"藏品 '{artifact.get('name', '')}' 的批量结果无效: {e}，改为单独请求")
+            analyses[artifact["id"]] = analyze_artifact_with_gpt(artifact, client, cache)
+            continue
+        
+        if cache is not None:
+            cache.set(ZODIAC_MODEL, ZODIAC_TEMPERATURE, prompts[artifact["id"]], result_text,
+                      {"response_format": ZODIAC_RESPONSE_FORMAT})
+    
+    return analyses
+
+def analyze_zodiac_artifacts(artifacts, output_file, api_key=None, confidence_threshold=0.7, batch_size=10,
+                             previous_result=None, stale_ids=None, cache=None, batch_results=None, base_url=None):
+    """
+    分析藏品数据，标记与生肖相关的藏品
 
-def analyze_zodiac_artifacts(artifacts, output_file, api_key=None, confidence_threshold=0.7, batch_size=10):
-    """分析藏品数据，标记与生肖相关的藏品"""
+    提供previous_result时为增量分析：保留上次结果中未变化藏品的分析结果，
+    移除stale_ids（变化或删除的藏品）的旧结果，只分析传入的藏品。
+    提供batch_results（批量任务的分析结果）时直接使用，不再逐条调用API。
+    base_url可以指向本地的OpenAI兼容服务，用于测试。
+    """
     print("正在分析与生肖相关的藏品...")
     
     # 初始化OpenAI客户端
-    if not api_key:
-        api_key = get_openai_api_key()
-    
-    client = openai.OpenAI(api_key=api_key)
+    client = None
+    if batch_results is None:
+        if not api_key:
+            api_key = get_openai_api_key()
+        client = get_openai_client(api_key, base_url)
     
     # 初始化结果字典
     zodiac_artifacts = {zodiac: [] for zodiac in ZODIAC_CHINESE_NAMES.keys()}
     artifacts_with_zodiac = []
+    total_artifacts = 0
+    
+    # 增量分析时沿用上次未变化藏品的结果
+    if previous_result:
+        stale_ids = set(stale_ids or [])
+        for zodiac, ids in previous_result.get("zodiacArtifacts", {}).items():
+            zodiac_artifacts[zodiac] = [artifact_id for artifact_id in ids if artifact_id not in stale_ids]
+        artifacts_with_zodiac = [
+            item for item in previous_result.get("artifactsWithZodiac", [])
+            if item["id"] not in stale_ids
+        ]
+        total_artifacts = previous_result.get("stats", {}).get("totalArtifacts", 0) - len(stale_ids)
     
-    # 分批处理藏品
-    total_batches = (len(artifacts) + batch_size - 1) // batch_size
+    # 分批处理藏品，藏品可以是列表，也可以是流式读取的迭代器
+    total_batches = (len(artifacts) + batch_size - 1) // batch_size if hasattr(artifacts, "__len__") else None
+    artifacts_iter = iter(artifacts)
     
-    for batch_idx in tqdm(range(total_batches), desc="处理藏品批次"):
-        start_idx = batch_idx * batch_size
-        end_idx = min(start_idx + batch_size, len(artifacts))
-        current_batch = artifacts[start_idx:end_idx]
+    for batch_idx in tqdm(itertools.count(), total=total_batches, desc="处理藏品批次"):
+        current_batch = list(itertools.islice(artifacts_iter, batch_size))
+        if not current_batch:
+            break
+        total_artifacts += len(current_batch)
         
-        for artifact in tqdm(current_batch, desc=f"批次 {batch_idx+1}/{total_batches} 分析", leave=False):
-            # 使用GPT分析藏品
-            analysis_result = analyze_artifact_with_gpt(artifact, client)
+        for artifact in tqdm(current_batch, desc=f"批次 {batch_idx+1}/{total_batches or '?'} 分析", leave=False):
+            # 批量任务已有结果时直接使用，否则使用GPT分析藏品
+            if batch_results is not None:
+                analysis_result = batch_results[artifact["id"]]
+            else:
+                analysis_result = analyze_artifact_with_gpt(artifact, client, cache)
             
             # 检查置信度
             if analysis_result.get("confidence", 0) >= confidence_threshold:
@@ -157,9 +281,6 @@ def analyze_zodiac_artifacts(artifacts, output_file, api_key=None, confidence_th
                         "confidence": analysis_result.get("confidence", 0),
                         "reasoning": analysis_result.get("reasoning", "")
                     })
-            
-            # 避免API速率限制
-            time.sleep(0.5)
     
     # 去除重复的ID
     for zodiac in zodiac_artifacts:
@@ -170,7 +291,7 @@ def analyze_zodiac_artifacts(artifacts, output_file, api_key=None, confidence_th
         "zodiacArtifacts": zodiac_artifacts,
         "artifactsWithZodiac": artifacts_with_zodiac,
         "stats": {
-            "totalArtifacts": len(artifacts),
+            "totalArtifacts": total_artifacts,
             "totalZodiacArtifacts": len(artifacts_with_zodiac),
             "countByZodiac": {zodiac: len(ids) for zodiac, ids in zodiac_artifacts.items()}
         }
@@ -195,14 +316,23 @@ def analyze_zodiac_artifacts(artifacts, output_file, api_key=None, confidence_th
 
 def main():
     parser = argparse.ArgumentParser(description="分析博物馆藏品中与生肖相关的藏品")
-    parser.add_argument("--input", default="public/data/artifacts.json", help="藏品数据JSON文件路径")
+    parser.add_argument("--input", default="public/data/artifacts.json", help="藏品数据JSON或NDJSON文件路径")
     parser.add_argument("--output", default="data_processing/zodiac/data/zodiac_artifacts.json", help="生肖相关藏品输出JSON文件路径")
     parser.add_argument("--api-key", help="OpenAI API密钥，如不提供则从环境变量获取")
     parser.add_argument("--confidence", type=float, default=0.7, help="置信度阈值，默认为0.7")
     parser.add_argument("--batch-size", type=int, default=10, help="批处理大小，默认为10")
     parser.add_argument("--sample", type=int, help="仅分析指定数量的样本藏品（用于测试）")
+    add_cache_arguments(parser)
+    add_batch_job_arguments(parser)
+    add_http_pool_arguments(parser)
+    add_metrics_arguments(parser)
+    add_prompt_budget_arguments(parser)
+    parser.add_argument("--base-url", help="OpenAI兼容接口地址，可指向本地测试服务")
+    parser.add_argument("--changes", help="增量处理生成的artifacts.changes.json，只分析新增或变化的藏品并合并到已有结果")
     
     args = parser.parse_args()
+    configure_http_pool_from_args(args)
+    configure_prompt_budget_from_args(args)
     
     # 检查输入文件是否存在
     if not os.path.exists(args.input):
@@ -211,29 +341,77 @@ def main():
     
     # 加载藏品数据
     try:
-        with open(args.input, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        artifacts = data.get("artifacts", [])
-        print(f"成功加载藏品数据，共 {len(artifacts)} 件藏品")
-        
-        # 如果指定了样本数量
-        if args.sample and args.sample > 0 and args.sample < len(artifacts):
-            import random
-            artifacts = random.sample(artifacts, args.sample)
-            print(f"随机选择 {args.sample} 件藏品进行分析（测试模式）")
+        if is_ndjson(args.input):
+            # NDJSON藏品文件按行流式读取，不一次性加载到内存
+            artifacts = iter_ndjson(args.input)
+            print(f"流式读取藏品数据: {args.input}")
+            if args.sample:
+                print("流式读取时不支持随机抽样，将分析全部藏品")
+        else:
+            with open(args.input, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            artifacts = data.get("artifacts", [])
+            print(f"成功加载藏品数据，共 {len(artifacts)} 件藏品")
+            
+            # 如果指定了样本数量
+            if args.sample and args.sample > 0 and args.sample < len(artifacts):
+                import random
+                artifacts = random.sample(artifacts, args.sample)
+                print(f"随机选择 {args.sample} 件藏品进行分析（测试模式）")
             
     except Exception as e:
         print(f"加载藏品数据失败: {e}")
         return
     
+    # 增量分析：只分析新增或变化的藏品，并与已有结果合并
+    previous_result = None
+    stale_ids = None
+    if args.changes and os.path.exists(args.output):
+        with open(args.changes, 'r', encoding='utf-8') as f:
+            changes = json.load(f)
+        with open(args.output, 'r', encoding='utf-8') as f:
+            previous_result = json.load(f)
+        
+        dirty_ids = set(changes["added"]) | set(changes["changed"])
+        stale_ids = set(changes["changed"]) | set(changes["removed"])
+        artifacts = (artifact for artifact in artifacts if artifact["id"] in dirty_ids)
+        print(f"增量分析: {len(dirty_ids)} 件新增或变化的藏品，{len(changes['removed'])} 件已删除")
+    
+    cache = cache_from_args(args)
+    
+    # 批量任务模式：先一次性提交全部分析请求，完成后再汇总结果
+    batch_results = None
+    if args.batch_job:
+        artifacts = list(artifacts)
+        batch_dir = Path(args.batch_dir or Path(args.output).parent / "batch")
+        client = get_openai_client(args.api_key or get_openai_api_key(), args.base_url)
+        batch_results = analyze_zodiac_batch_job(
+            artifacts,
+            backend_from_args(args, client, batch_dir),
+            batch_dir,
+            cache=cache,
+            poll_interval=args.poll_interval,
+            client=client
+        )
+    
     # 分析生肖相关藏品
     analyze_zodiac_artifacts(
         artifacts, 
         args.output, 
         api_key=args.api_key, 
         confidence_threshold=args.confidence,
-        batch_size=args.batch_size
+        batch_size=args.batch_size,
+        previous_result=previous_result,
+        stale_ids=stale_ids,
+        cache=cache,
+        batch_results=batch_results,
+        base_url=args.base_url
     )
+    
+    print(default_prompt_stats.summary())
+    export_metrics_from_args(args)
+    if rate_limit_summary():
+        print(rate_limit_summary())
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+import json
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data_processing'))
+from collection_io import FORMAT_SUFFIXES, load_collection, save_collection
+from name_dedup import NameDeduplicator
+from catalog_index import CatalogIndex
+from image_hashes import ImageHashIndex, link_duplicate_images
+from fix_duplicate_artifacts import append_missing_quizzes
+from fix_remaining_duplicates import rename_quiz_references, validate_artifacts_quizzes_mapping
+
+def dedup_collection(artifacts_data, quizzes_data, verbose=True, image_index=None, catalog=None):
+    """
+    一次完成重名修复、补充缺失测验和更新测验中的名称引用，直接修改传入的数据
+    
+    步骤顺序与依次运行 fix_duplicate_artifacts.py 和 fix_remaining_duplicates.py 相同：第一轮改名后补充缺失的测验，
+    再进行后两轮改名，最后更新测验中的名称引用，因此两种方式的输出完全一致。
+    提供image_index（ImageHashIndex）时，使用相同图片的藏品的localImage指向同一个保留文件。
+    提供catalog（CatalogIndex）时，改名和添加的测验同步更新到索引中。
+    
+    Returns:
+        NameDeduplicator，其中包含审计日志
+    """
+    if catalog is None:
+        catalog = CatalogIndex(artifacts_data, quizzes_data)
+    deduplicator = NameDeduplicator(artifacts_data['artifacts'], verbose=verbose, catalog=catalog)
+    print(f"总藏品数量: {len(artifacts_data['artifacts'])}")
+    print(f"重复名称的藏品数量: {len(deduplicator.duplicates)}")
+    
+    deduplicator.fix_by_period()
+    append_missing_quizzes(artifacts_data, quizzes_data, catalog)
+    deduplicator.fix_by_features()
+    deduplicator.fix_by_number()
+    print(deduplicator.summary())
+    print(f"修复后，重复名称的藏品数量: {len(deduplicator.duplicates)}")
+    
+    if image_index is not None:
+        linked = link_duplicate_images(artifacts_data['artifacts'], image_index)
+        print(f"{linked} 件藏品的图片与其他藏品相同，已指向同一个图片文件")
+    
+    updated_count = rename_quiz_references(artifacts_data, quizzes_data)
+    print(f"已更新 {updated_count} 处测验中的藏品名称引用")
+    return deduplicator
+
+def main():
+    parser = argparse.ArgumentParser(description="一次完成藏品重名修复、补充缺失的测验并同步到public目录")
+    parser.add_argument("--format", choices=list(FORMAT_SUFFIXES), default="json", help="cleaned_data中间文件的格式")
+    parser.add_argument("--audit-log", default="cleaned_data/artifacts_dedup_audit.json", help="改名审计日志的保存路径")
+    parser.add_argument("--quiet", action="store_true", help="不逐条打印改名记录")
+    parser.add_argument("--image-index", help="image_hashes.py生成的图片哈希索引，提供时合并相同的图片")
+    args = parser.parse_args()
+    suffix = FORMAT_SUFFIXES[args.format]
+    
+    # 文件路径
+    input_artifacts_file = f'cleaned_data/artifacts{suffix}'
+    final_artifacts_file = f'cleaned_data/artifacts_final{suffix}'
+    
+    input_quizzes_file = f'cleaned_data/quizzes{suffix}'
+    final_quizzes_file = f'cleaned_data/quizzes_final{suffix}'
+    
+    public_dir = 'public/data'
+    
+    # 1. 藏品和测验数据各读取一次
+    artifacts_data = load_collection(input_artifacts_file, "artifacts")
+    quizzes_data = load_collection(input_quizzes_file, "quizzes")
+    
+    # 2. 在内存中完成全部修复
+    start = time.perf_counter()
+    image_index = ImageHashIndex(args.image_index) if args.image_index else None
+    catalog = CatalogIndex(artifacts_data, quizzes_data)
+    deduplicator = dedup_collection(
+        artifacts_data, quizzes_data, verbose=not args.quiet, image_index=image_index, catalog=catalog
+    )
+    print(f"修复耗时 {time.perf_counter() - start:.3f} 秒")
+    
+    # 3. 验证藏品和测验的对应关系（直接查询索引，不再重新遍历数据）
+    validation_result = validate_artifacts_quizzes_mapping(artifacts_data, quizzes_data, catalog)
+    
+    # 4. 每个文件只写入一次
+    save_collection(artifacts_data, final_artifacts_file, "artifacts")
+    save_collection(quizzes_data, final_quizzes_file, "quizzes")
+    deduplicator.save_audit(args.audit_log)
+    print(f"已保存修复后的数据到: {final_artifacts_file}、{final_quizzes_file}")
+    print(f"改名审计日志已保存到: {args.audit_log}")
+    
+    # 5. 同步到public目录（发布时始终输出JSON）
+    if validation_result:
+        for key, data in (("artifacts", artifacts_data), ("quizzes", quizzes_data)):
+            with open(os.path.join(public_dir, f'{key}.json'), 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+        print(f"数据已同步到public目录")
+        print("数据修复和同步完成!")
+    else:
+        print("数据验证失败，请解决上述问题后再同步到public目录")
+
+if __name__ == "__main__":
+    main()
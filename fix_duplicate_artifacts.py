@@ -1,109 +1,63 @@
 #!/usr/bin/env python3
 
 import json
-from collections import defaultdict
+import argparse
 import os
+import sys
 
-# 加载藏品数据
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data_processing'))
+from collection_io import FORMAT_SUFFIXES, load_collection, save_collection
+from name_dedup import NameDeduplicator
+from catalog_index import CatalogIndex
+
+# 加载藏品数据（JSON或Parquet/Arrow中间文件）
 def load_artifacts(file_path):
-    with open(file_path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    return load_collection(file_path, "artifacts")
 
-# 保存藏品数据
+# 保存藏品数据，格式由文件后缀决定
 def save_artifacts(data, file_path):
-    with open(file_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    save_collection(data, file_path, "artifacts")
     print(f"已保存修复后的数据到: {file_path}")
 
 def fix_duplicate_names(input_file, output_file):
     # 加载原始数据
     artifacts_data = load_artifacts(input_file)
     
-    # 检查藏品名称重复
-    name_to_artifacts = defaultdict(list)
-    for artifact in artifacts_data['artifacts']:
-        name_to_artifacts[artifact['name']].append(artifact)
-    
-    # 查找重复名称
-    duplicate_names = {name: artifacts for name, artifacts in name_to_artifacts.items() if len(artifacts) > 1}
+    # 名称索引只建立一次，改名时增量更新
+    deduplicator = NameDeduplicator(artifacts_data['artifacts'])
     
     print(f"总藏品数量: {len(artifacts_data['artifacts'])}")
-    print(f"重复名称的藏品数量: {len(duplicate_names)}")
-    
-    # 修复特殊情况
-    for artifact in artifacts_data['artifacts']:
-        if artifact['name'] == '名称':
-            # 使用fullName作为name
-            if artifact['fullName']:
-                print(f"修复: ID {artifact['id']} 将'名称'更改为 '{artifact['fullName']}'")
-                artifact['name'] = artifact['fullName'].replace('【', '').replace('】', '')
-    
-    # 修复其他重复名称
-    for name, artifacts in duplicate_names.items():
-        if name == '名称':
-            continue  # 已在上面处理过
-            
-        for i, artifact in enumerate(artifacts):
-            # 跳过第一个实例，只修改重复项
-            if i == 0:
-                continue
-                
-            # 使用朝代或尺寸来区分
-            period = artifact.get('period', '')
-            dimensions = artifact.get('dimensions', '')
-            
-            if period and period in artifact['name']:
-                # 如果名称中已包含朝代，则添加编号
-                new_name = f"{artifact['name']}{i+1}"
-            elif period:
-                # 添加朝代作为区分
-                new_name = f"{artifact['name']}（{period}）"
-            elif dimensions:
-                # 使用尺寸作为区分
-                size_part = dimensions.split(' ')[1:3] if len(dimensions.split(' ')) > 2 else [dimensions]
-                size_str = ' '.join(size_part)
-                new_name = f"{artifact['name']}（{size_str}）"
-            else:
-                # 最后手段是添加编号
-                new_name = f"{artifact['name']}{i+1}"
-                
-            print(f"修复: ID {artifact['id']} 将'{name}'更改为 '{new_name}'")
-            artifact['name'] = new_name
+    print(f"重复名称的藏品数量: {len(deduplicator.duplicates)}")
+    
+    # 修复占位名称，并按朝代或尺寸区分重复名称
+    deduplicator.fix_by_period()
     
     # 保存修复后的数据
     save_artifacts(artifacts_data, output_file)
     
-    # 再次检查是否还有重复
-    name_to_artifacts = defaultdict(list)
-    for artifact in artifacts_data['artifacts']:
-        name_to_artifacts[artifact['name']].append(artifact)
-    
-    remaining_duplicates = {name: artifacts for name, artifacts in name_to_artifacts.items() if len(artifacts) > 1}
-    print(f"修复后，重复名称的藏品数量: {len(remaining_duplicates)}")
+    print(f"修复后，重复名称的藏品数量: {len(deduplicator.duplicates)}")
     
     return artifacts_data
 
-def add_missing_quizzes(artifacts_data, quizzes_file, output_file):
-    # 加载测验数据
-    with open(quizzes_file, 'r', encoding='utf-8') as f:
-        quizzes_data = json.load(f)
+def append_missing_quizzes(artifacts_data, quizzes_data, catalog=None):
+    """
+    为没有测验的藏品添加通用测验，直接修改quizzes_data，返回添加的测验数
     
-    # 找出没有测验的藏品ID
-    artifact_ids = {a['id'] for a in artifacts_data['artifacts']}
-    quiz_artifact_ids = {q['artifactId'] for q in quizzes_data['quizzes']}
-    artifacts_without_quiz = artifact_ids - quiz_artifact_ids
+    提供catalog（CatalogIndex）时直接使用其中没有测验的藏品，并通过它添加测验
+    """
+    if catalog is None:
+        catalog = CatalogIndex(artifacts_data, quizzes_data)
+    artifacts_without_quiz = len(catalog.artifacts_without_quiz)
     
-    print(f"\n无测验的藏品数量: {len(artifacts_without_quiz)}")
+    print(f"\n无测验的藏品数量: {artifacts_without_quiz}")
     
     if not artifacts_without_quiz:
         print("所有藏品都有对应的测验，无需添加")
-        return quizzes_data
-    
-    # 为缺少测验的藏品创建通用测验
-    id_to_artifact = {a['id']: a for a in artifacts_data['artifacts']}
+        return 0
     
-    for artifact_id in artifacts_without_quiz:
-        artifact = id_to_artifact[artifact_id]
+    # 按藏品顺序添加，每次运行的输出顺序相同
+    for artifact in [a for a in artifacts_data['artifacts'] if a['id'] in catalog.artifacts_without_quiz]:
+        artifact_id = artifact['id']
         new_quiz = {
             "question": f"关于{artifact['period'] if artifact['period'] else ''}《{artifact['name']}》的特点，以下哪项描述是正确的？",
             "options": [
@@ -130,26 +84,32 @@ def add_missing_quizzes(artifacts_data, quizzes_file, output_file):
             "id": f"quiz_{artifact_id}_1"
         }
         
-        quizzes_data['quizzes'].append(new_quiz)
+        catalog.add_quiz(new_quiz)
         print(f"为藏品ID {artifact_id} ({artifact['name']}) 添加了测验")
     
-    # 保存更新后的测验数据
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(quizzes_data, f, ensure_ascii=False, indent=2)
+    return artifacts_without_quiz
+
+def add_missing_quizzes(artifacts_data, quizzes_file, output_file):
+    # 加载测验数据
+    quizzes_data = load_collection(quizzes_file, "quizzes")
+    
+    append_missing_quizzes(artifacts_data, quizzes_data)
+    
+    # 没有添加测验时同样保存，下一步始终读取本次的测验数据
+    save_collection(quizzes_data, output_file, "quizzes")
     
     print(f"已保存更新后的测验数据到: {output_file}")
     return quizzes_data
 
 def sync_to_public(cleaned_artifacts_file, cleaned_quizzes_file, public_dir):
-    """将处理好的数据同步到public目录"""
+    """将处理好的数据同步到public目录，public目录中始终为JSON格式"""
     # 复制处理好的藏品数据到public目录
     artifacts_data = load_artifacts(cleaned_artifacts_file)
     public_artifacts_file = os.path.join(public_dir, 'artifacts.json')
     save_artifacts(artifacts_data, public_artifacts_file)
     
     # 复制处理好的测验数据到public目录
-    with open(cleaned_quizzes_file, 'r', encoding='utf-8') as f:
-        quizzes_data = json.load(f)
+    quizzes_data = load_collection(cleaned_quizzes_file, "quizzes")
     
     public_quizzes_file = os.path.join(public_dir, 'quizzes.json')
     with open(public_quizzes_file, 'w', encoding='utf-8') as f:
@@ -158,12 +118,17 @@ def sync_to_public(cleaned_artifacts_file, cleaned_quizzes_file, public_dir):
     print(f"数据已同步到public目录")
 
 def main():
+    parser = argparse.ArgumentParser(description="修复重复名称藏品并补充缺失的测验")
+    parser.add_argument("--format", choices=list(FORMAT_SUFFIXES), default="json", help="cleaned_data中间文件的格式")
+    args = parser.parse_args()
+    suffix = FORMAT_SUFFIXES[args.format]
+    
     # 文件路径
-    input_artifacts_file = 'cleaned_data/artifacts.json'
-    fixed_artifacts_file = 'cleaned_data/artifacts_fixed.json'
+    input_artifacts_file = f'cleaned_data/artifacts{suffix}'
+    fixed_artifacts_file = f'cleaned_data/artifacts_fixed{suffix}'
     
-    input_quizzes_file = 'cleaned_data/quizzes.json'
-    fixed_quizzes_file = 'cleaned_data/quizzes_fixed.json'
+    input_quizzes_file = f'cleaned_data/quizzes{suffix}'
+    fixed_quizzes_file = f'cleaned_data/quizzes_fixed{suffix}'
     
     public_dir = 'public/data'
     
@@ -1,17 +1,16 @@
-import openai
 import os
+import sys
 import json
 
-def generate_quiz_with_ai(artifact, api_key=None):
-    """使用OpenAI API为藏品生成更智能的问答题"""
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data_processing'))
+from llm_cache import cached_chat_completion
+from http_clients import get_openai_client
+
+def generate_quiz_with_ai(artifact, api_key=None, cache=None):
+    """使用OpenAI API为藏品生成更智能的问答题，提供cache时相同的提示词直接使用缓存的响应"""
     # 优先使用传入的API密钥，其次使用环境变量中的密钥
-    if api_key:
-        openai.api_key = api_key
-    else:
-        # 从环境变量获取API密钥
-        openai.api_key = os.getenv("OPENAI_API_KEY")
-    
-    if not openai.api_key:
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    if not api_key:
         print("未提供OpenAI API密钥，无法生成AI问答题")
         return []
     
@@ -55,17 +54,21 @@ def generate_quiz_with_ai(artifact, api_key=None):
     }}
     """
     
+    result_text = None
     try:
         print(f"调用OpenAI API...")
         # 调用OpenAI API
-        response = openai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7
+        result_text = cached_chat_completion(
+            get_openai_client(api_key),
+            cache,
+            "gpt-4o-mini",
+            prompt,
+            0.7,
+            validate=json.loads,
+            pipeline="quiz"
         )
         
         # 解析结果
-        result_text = response.choices[0].message.content
         print(f"API响应内容: {result_text[:100]}...")  # 打印前100个字符以便调试
         
         result = json.loads(result_text)
@@ -79,7 +82,8 @@ def generate_quiz_with_ai(artifact, api_key=None):
         return result.get("quizzes", [])
     except json.JSONDecodeError as e:
         print(f"JSON解析错误: {e}")
-        print(f"API返回的原始文本: {result_text}")
+        if result_text is not None:
+            print(f"API返回的原始文本: {result_text}")
         return []
     except Exception as e:
         print(f"生成藏品 '{artifact['name']}' 的问答题时出错: {e}")
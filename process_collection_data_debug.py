@@ -10,6 +10,13 @@ from tqdm import tqdm
 import openai
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data_processing'))
+from llm_cache import add_cache_arguments, cache_from_args, cached_chat_completion
+from http_clients import get_openai_client
+from llm_metrics import add_metrics_arguments, export_metrics_from_args
+# CSV读取和藏品字段构建与正式流程共用同一实现
+from process_collection_data import read_collection_csv, build_artifact_frame
+
 # 配置详细日志记录
 import logging
 logging.basicConfig(
@@ -40,53 +47,23 @@ def extract_period_from_name(name):
         return match.group(1)
     return ""
 
-def process_collection_data(input_file, output_file):
+def process_collection_data(input_file, output_file, csv_engine=None):
     """处理藏品数据并转换为JSON格式"""
     logger.info(f"正在处理藏品数据: {input_file}")
     
     try:
         # 读取CSV文件
         logger.debug(f"尝试读取CSV文件: {input_file}")
-        df = pd.read_csv(input_file)
+        df = read_collection_csv(input_file, engine=csv_engine)
         logger.info(f"成功读取CSV文件，共 {len(df)} 行数据")
     except Exception as e:
         logger.error(f"读取CSV文件失败: {e}")
         traceback.print_exc()
         return {"artifacts": []}
     
-    # 清理数据
-    df = df.fillna("")
-    
-    # 构建藏品数据
-    artifacts = []
-    
-    for idx, row in tqdm(df.iterrows(), total=len(df), desc="处理藏品"):
-        if not row['名称'] or pd.isna(row['名称']):
-            continue
-            
-        # 提取时期
-        period = extract_period_from_name(row['名称'])
-        
-        # 从名称中移除时期信息以得到干净的名称
-        clean_name = row['名称'].replace(f"【{period}】", "").strip() if period else row['名称']
-        
-        # 构建藏品对象
-        artifact = {
-            "id": str(idx + 1),  # 为每个藏品生成唯一ID
-            "name": clean_name,
-            "fullName": row['名称'],
-            "period": period,
-            "description": clean_text(row['简介']),
-            "dimensions": clean_text(row['尺寸信息']),
-            "image": clean_text(row['图片URL']),
-            "localImage": clean_text(row['本地图片路径']),
-            "interestingFacts": "",  # 这些字段可以后续手动添加或从描述中提取
-            "culturalContext": "",
-            "location": "苏州博物馆"  # 默认位置
-        }
-        
-        # 将藏品添加到列表
-        artifacts.append(artifact)
+    # 列式构建藏品数据
+    artifacts = build_artifact_frame(df).to_dict("records")
+    logger.debug(f"跳过 {len(df) - len(artifacts)} 行空名称数据")
     
     # 构建最终的JSON结构
     collection_data = {
@@ -117,8 +94,7 @@ def test_openai_connection():
     logger.debug(f"API密钥前10个字符: {api_key[:10]}...")
     
     try:
-        openai.api_key = api_key
-        response = openai.chat.completions.create(
+        response = get_openai_client(api_key).chat.completions.create(
             model="gpt-4o-mini",
             messages=[{"role": "user", "content": "简单的测试信息"}],
             max_tokens=10
@@ -130,20 +106,19 @@ def test_openai_connection():
         traceback.print_exc()
         return False
 
-def generate_quiz_with_ai(artifact, api_key=None):
-    """使用OpenAI API为藏品生成更智能的问答题"""
+def generate_quiz_with_ai(artifact, api_key=None, cache=None):
+    """使用OpenAI API为藏品生成更智能的问答题，提供cache时相同的提示词直接使用缓存的响应"""
     logger.info(f"为藏品 '{artifact['name']}' 生成AI问答题...")
     
     # 优先使用传入的API密钥，其次使用环境变量中的密钥
     if api_key:
-        openai.api_key = api_key
         logger.debug("使用传入的API密钥")
     else:
         # 从环境变量获取API密钥
-        openai.api_key = os.getenv("OPENAI_API_KEY")
+        api_key = os.getenv("OPENAI_API_KEY")
         logger.debug("使用环境变量中的API密钥")
     
-    if not openai.api_key:
+    if not api_key:
         logger.error("未提供OpenAI API密钥，无法生成AI问答题")
         return []
     
@@ -195,14 +170,18 @@ def generate_quiz_with_ai(artifact, api_key=None):
     try:
         # 调用OpenAI API
         logger.info("调用OpenAI API...")
-        response = openai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7
+        # 只有能解析为JSON的响应才会写入缓存，无法解析的响应仍然返回，在下面记录原始文本
+        result_text = cached_chat_completion(
+            get_openai_client(api_key),
+            cache,
+            "gpt-4o-mini",
+            prompt,
+            0.7,
+            validate=json.loads,
+            pipeline="quiz"
         )
         
         # 获取结果
-        result_text = response.choices[0].message.content
         logger.debug(f"API响应内容前100个字符: {result_text[:100]}...")
         
         # 解析JSON
@@ -227,7 +206,7 @@ def generate_quiz_with_ai(artifact, api_key=None):
         traceback.print_exc()
         return []
 
-def generate_quiz_data(collection_data, output_file, use_ai=False, api_key=None, limit=None):
+def generate_quiz_data(collection_data, output_file, use_ai=False, api_key=None, limit=None, cache=None):
     """为每个藏品生成问答题数据"""
     logger.info("正在生成问答题数据...")
     
@@ -262,7 +241,7 @@ def generate_quiz_data(collection_data, output_file, use_ai=False, api_key=None,
         for artifact in tqdm(artifacts_to_process, desc="生成问答题"):
             if artifact.get("description"):
                 logger.debug(f"为藏品 '{artifact['name']}' 生成AI问答题")
-                ai_quizzes = generate_quiz_with_ai(artifact, api_key)
+                ai_quizzes = generate_quiz_with_ai(artifact, api_key, cache)
                 if ai_quizzes:
                     logger.debug(f"成功生成 {len(ai_quizzes)} 个问答题")
                     quizzes.extend(ai_quizzes)
@@ -343,6 +322,9 @@ if __name__ == "__main__":
     parser.add_argument("--use-ai", action="store_true", help="是否使用AI生成问答题")
     parser.add_argument("--api-key", help="OpenAI API密钥")
     parser.add_argument("--limit", type=int, help="限制处理的藏品数量，用于测试")
+    add_cache_arguments(parser)
+    add_metrics_arguments(parser)
+    parser.add_argument("--csv-engine", choices=["pyarrow", "c", "python"], help="CSV解析引擎，默认优先使用pyarrow")
     
     args = parser.parse_args()
     
@@ -359,16 +341,24 @@ if __name__ == "__main__":
     # 处理藏品数据
     collection_data = process_collection_data(
         args.input, 
-        output_dir / "artifacts.json"
+        output_dir / "artifacts.json",
+        csv_engine=args.csv_engine
     )
     
-    # 生成问答题数据
+    # 生成问答题数据，AI模式下使用LLM响应缓存
+    cache = cache_from_args(args) if args.use_ai else None
     generate_quiz_data(
         collection_data,
         output_dir / "quizzes.json",
         use_ai=args.use_ai,
         api_key=args.api_key,
-        limit=args.limit
+        limit=args.limit,
+        cache=cache
     )
     
+    if cache is not None:
+        logger.info(cache.summary())
+    if args.use_ai:
+        export_metrics_from_args(args)
+    
     logger.info("=== 藏品数据处理程序完成 ===") 
\ No newline at end of file